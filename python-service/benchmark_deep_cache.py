@@ -0,0 +1,200 @@
+"""
+DeepCache Benchmark
+
+Times the same seeded generation with and without DeepCache (deep_cache.py)
+at each image size and reports the speedup, plus the mean pixel difference to
+the uncached image as a rough quality check. Runs on CPU by default, the way
+our CPU nodes serve requests.
+
+Usage:
+    python benchmark_deep_cache.py
+    python benchmark_deep_cache.py --sizes 512,1024 --steps 25 --intervals 2,3,5
+    python benchmark_deep_cache.py --device cuda --branch 1 --csv deep_cache.csv
+"""
+
+import argparse
+import csv
+import logging
+import os
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+
+from deep_cache import DeepCache
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = "a premium product showcase on a marble table, soft studio lighting, minimal design"
+DEFAULT_NEGATIVE = "blurry, low quality, distorted, text, watermark"
+
+
+def load_pipeline(model: str, device: str) -> StableDiffusionPipeline:
+    """Load the pipeline the way the service does (same scheduler and dtype)"""
+    torch_dtype = torch.float16 if device == "cuda" else torch.float32
+    pipe = StableDiffusionPipeline.from_pretrained(
+        model,
+        torch_dtype=torch_dtype,
+        safety_checker=None,
+        requires_safety_checker=False
+    )
+    pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+    pipe = pipe.to(device)
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+
+def run_once(pipe: StableDiffusionPipeline, size: int, steps: int, seed: int, device: str, deep_cache: Optional[DeepCache] = None):
+    """Generate one image, returning (seconds, image as a float array, DeepCache stats)"""
+    generator = torch.Generator(device=device).manual_seed(seed)
+    start = time.perf_counter()
+    with deep_cache if deep_cache is not None else nullcontext(), torch.no_grad():
+        image = pipe(DEFAULT_PROMPT, negative_prompt=DEFAULT_NEGATIVE, width=size, height=size,
+                     num_inference_steps=steps, guidance_scale=8.5, generator=generator).images[0]
+    elapsed = time.perf_counter() - start
+    return elapsed, np.asarray(image, dtype=np.float32), deep_cache.stats() if deep_cache is not None else None
+
+
+def benchmark_size(pipe: StableDiffusionPipeline, size: int, steps: int, intervals: List[int], branch: int,
+                   runs: int, seed: int, device: str) -> List[Dict[str, Any]]:
+    """Baseline plus one row per DeepCache interval at one image size"""
+    # Warm-up: first call pays allocator and kernel selection costs
+    run_once(pipe, size, 2, seed, device)
+
+    baseline_times = []
+    baseline_image = None
+    for _ in range(runs):
+        elapsed, baseline_image, _ = run_once(pipe, size, steps, seed, device)
+        baseline_times.append(elapsed)
+    baseline = min(baseline_times)
+    results = [{
+        "size": size, "steps": steps, "interval": 1, "branch": None, "seconds": baseline,
+        "sec_per_step": baseline / steps, "speedup": 1.0, "cached_steps": 0, "mean_abs_diff": 0.0,
+    }]
+    logger.info(f"  {size}px baseline: {baseline:.1f}s ({baseline / steps:.2f}s/step)")
+
+    for interval in intervals:
+        times = []
+        image = None
+        stats = None
+        for _ in range(runs):
+            elapsed, image, stats = run_once(pipe, size, steps, seed, device, DeepCache(pipe.unet, interval=interval, branch=branch))
+            times.append(elapsed)
+        seconds = min(times)
+        diff = float(np.abs(image - baseline_image).mean())
+        results.append({
+            "size": size, "steps": steps, "interval": interval, "branch": branch, "seconds": seconds,
+            "sec_per_step": seconds / steps, "speedup": baseline / seconds,
+            "cached_steps": stats["cached_steps"], "mean_abs_diff": diff,
+        })
+        logger.info(f"  {size}px interval {interval}: {seconds:.1f}s ({baseline / seconds:.2f}x, mean |diff| {diff:.1f}/255)")
+    return results
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print the speedup table"""
+    logger.info(f"\n{'size':>6} {'interval':>8} {'seconds':>9} {'s/step':>7} {'speedup':>8} {'cached':>7} {'|diff|':>7}")
+    logger.info("=" * 60)
+    for result in results:
+        logger.info(
+            f"{result['size']:>6} {result['interval']:>8} {result['seconds']:>8.1f}s "
+            f"{result['sec_per_step']:>7.2f} {result['speedup']:>7.2f}x {result['cached_steps']:>7} "
+            f"{result['mean_abs_diff']:>7.1f}"
+        )
+    logger.info("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the DeepCache speedup against uncached generation"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=os.getenv("SD_MODEL", "runwayml/stable-diffusion-v1-5"),
+        help="Model to benchmark (default: SD_MODEL or runwayml/stable-diffusion-v1-5)"
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cpu",
+        choices=["cpu", "cuda"],
+        help="Device to run on (default: cpu)"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="512,1024",
+        help="Comma-separated square image sizes (default: 512,1024)"
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=25,
+        help="Inference steps per image (default: 25)"
+    )
+    parser.add_argument(
+        "--intervals",
+        type=str,
+        default="2,3,5",
+        help="Comma-separated DeepCache intervals to compare (default: 2,3,5)"
+    )
+    parser.add_argument(
+        "--branch",
+        type=int,
+        default=0,
+        help="DeepCache branch (0 = shallowest, fastest; default: 0)"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=1,
+        help="Runs per configuration; the fastest is reported (default: 1)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=1234,
+        help="Seed shared by all runs (default: 1234)"
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        help="Optional path to write the results as CSV"
+    )
+
+    args = parser.parse_args()
+
+    if args.device == "cuda" and not torch.cuda.is_available():
+        logger.error("❌ CUDA is not available")
+        return 1
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    intervals = sorted({int(i) for i in args.intervals.split(",") if i.strip() and int(i) > 1})
+
+    logger.info(f"📦 Loading {args.model} on {args.device}...")
+    pipe = load_pipeline(args.model, args.device)
+
+    results = []
+    for size in sizes:
+        logger.info(f"⏱️  {size}x{size}, {args.steps} steps")
+        results.extend(benchmark_size(pipe, size, args.steps, intervals, args.branch, args.runs, args.seed, args.device))
+
+    print_report(results)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        logger.info(f"✅ Wrote {len(results)} rows to {args.csv}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
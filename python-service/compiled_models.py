@@ -0,0 +1,183 @@
+"""
+Compiled Models Module
+torch.compile of the UNet and VAE decoder, with resolution buckets and a persistent compile cache
+
+Compiled graphs are specialized to their input shapes, so requests are
+snapped to a small set of resolution buckets (snap_to_bucket) and every
+bucket compiles once; the image is resized to the requested size afterwards.
+Inductor's FX graph cache is kept in TORCH_COMPILE_CACHE_DIR, so a restarted
+service loads the compiled kernels from disk instead of compiling again.
+
+The compiled UNet is a separate wrapper around the shared UNet (same
+weights): jobs opt in by putting it on their job pipeline
+(schedulers.job_pipeline), so jobs that patch the UNet (mixed-adapter
+batches, DeepCache, ToMe, attention processor changes) keep running eagerly
+instead of triggering recompiles. The graphs are traced against the UNet's
+module layout at startup; once PEFT has wrapped any of its layers for a
+LoRA (resident adapters, or the layers delta fusing computed its deltas
+with), every job runs eagerly (can_compile() is False). The VAE decoder is
+never patched and is compiled in place.
+"""
+
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch._dynamo
+import torch._dynamo.utils
+from diffusers import StableDiffusionPipeline
+
+logger = logging.getLogger(__name__)
+
+TORCH_COMPILE_ENABLED = os.getenv("TORCH_COMPILE_ENABLED", "false").lower() == "true"
+# Inductor mode: "default", "reduce-overhead" (CUDA graphs, GPU only) or "max-autotune-no-cudagraphs"
+TORCH_COMPILE_MODE = os.getenv("TORCH_COMPILE_MODE", "default")
+TORCH_COMPILE_CACHE_DIR = os.getenv("TORCH_COMPILE_CACHE_DIR", "compile_cache")
+# Compile every reachable bucket at startup (cached compiles make this fast after the first run)
+TORCH_COMPILE_WARMUP = os.getenv("TORCH_COMPILE_WARMUP", "true").lower() == "true"
+
+DEFAULT_BUCKETS = "512x512,512x384,384x512,512x288,288x512,768x768,1024x1024"
+
+
+def parse_buckets(spec: str) -> List[Tuple[int, int]]:
+    """
+    Parse "WxH,WxH,..." into (width, height) pairs (multiples of 8)
+
+    Raises:
+        ValueError: If an entry is malformed or not a multiple of 8
+    """
+    buckets = []
+    for entry in spec.split(","):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        width, _, height = entry.partition("x")
+        width, height = int(width), int(height)
+        if width % 8 or height % 8 or width <= 0 or height <= 0:
+            raise ValueError(f"Resolution bucket {entry} must be positive multiples of 8")
+        buckets.append((width, height))
+    if not buckets:
+        raise ValueError("No resolution buckets configured")
+    return buckets
+
+
+TORCH_COMPILE_BUCKETS = parse_buckets(os.getenv("TORCH_COMPILE_BUCKETS", DEFAULT_BUCKETS))
+
+
+def snap_to_bucket(width: int, height: int, buckets: Optional[List[Tuple[int, int]]] = None) -> Tuple[int, int]:
+    """Bucket with the closest aspect ratio to width x height, then the closest area"""
+    buckets = buckets or TORCH_COMPILE_BUCKETS
+
+    def distance(bucket: Tuple[int, int]) -> Tuple[float, float]:
+        aspect = abs(math.log((bucket[0] / bucket[1]) / (width / height)))
+        area = abs(math.log((bucket[0] * bucket[1]) / (width * height)))
+        return round(aspect, 2), area
+    return min(buckets, key=distance)
+
+
+def configure_compile_cache(cache_dir: str = TORCH_COMPILE_CACHE_DIR):
+    """Keep inductor's compiled graphs and kernels in cache_dir across restarts"""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(cache_dir))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    try:
+        import torch._inductor.config as inductor_config
+        inductor_config.fx_graph_cache = True
+    except (ImportError, AttributeError):
+        logger.warning("[COMPILE] This torch version has no FX graph cache, compiles won't persist")
+
+
+class CompiledModels:
+    """
+    Compiled UNet and VAE decoder of a pipeline
+
+    Usage:
+        compiled = CompiledModels(pipe)
+        job_pipe = job_pipeline(pipe, "dpmpp_2m")
+        job_pipe.unet = compiled.unet
+    """
+
+    def __init__(self, pipe: StableDiffusionPipeline, mode: str = TORCH_COMPILE_MODE,
+                 buckets: Optional[List[Tuple[int, int]]] = None):
+        self.mode = mode
+        self.buckets = buckets or TORCH_COMPILE_BUCKETS
+        configure_compile_cache()
+        # One graph per bucket and batch shape (with/without CFG, num_images)
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, 8 * len(self.buckets))
+        self.unet = torch.compile(pipe.unet, mode=mode, dynamic=False)
+        pipe.vae.decoder.forward = torch.compile(pipe.vae.decoder.forward, mode=mode, dynamic=False)
+        self._unet = pipe.unet
+        self.warmed_buckets: List[Tuple[int, int]] = []
+        self.compiled_jobs = 0
+        self.eager_jobs = 0
+        # Graphs compiled before the first request (warm-up); later ones are recompiles
+        self._baseline_graphs = self._compiled_graphs()
+        logger.info(f"[COMPILE] Compiling UNet and VAE decoder lazily (mode {mode}, {len(self.buckets)} buckets, cache {TORCH_COMPILE_CACHE_DIR})")
+
+    def warmup(self, job_pipe: StableDiffusionPipeline, buckets: List[Tuple[int, int]], steps: int = 2):
+        """
+        Compile each bucket ahead of the first request with a short generation
+
+        Args:
+            job_pipe: Job pipeline using self.unet
+            buckets: Buckets to compile (the ones requests can reach on this device)
+            steps: Denoising steps per warm-up generation
+        """
+        for width, height in buckets:
+            start = time.time()
+            try:
+                with torch.no_grad():
+                    job_pipe("", width=width, height=height, num_inference_steps=steps, output_type="latent")
+                    latents = torch.zeros(
+                        1, job_pipe.vae.config.latent_channels, height // 8, width // 8,
+                        device=job_pipe.vae.device, dtype=job_pipe.vae.dtype
+                    )
+                    job_pipe.vae.decode(latents)
+                self.warmed_buckets.append((width, height))
+                logger.info(f"[COMPILE] {width}x{height} ready in {time.time() - start:.1f}s")
+            except Exception as e:
+                logger.warning(f"[COMPILE] Warm-up of {width}x{height} failed: {str(e)}")
+        self._baseline_graphs = self._compiled_graphs()
+
+    @staticmethod
+    def _compiled_graphs() -> Optional[int]:
+        """Graphs dynamo has compiled in this process (None if this torch doesn't count them)"""
+        try:
+            return int(torch._dynamo.utils.counters["stats"]["unique_graphs"])
+        except (AttributeError, KeyError, TypeError):
+            return None
+
+    def can_compile(self) -> bool:
+        """
+        Whether the UNet still has the module layout the graphs were traced with
+
+        PEFT replaces LoRA target layers with wrappers (lora_A/lora_B) that stay
+        until the adapters are unloaded; every adapter set change would fail
+        dynamo's guards and recompile.
+        """
+        return not any(hasattr(module, "lora_A") for module in self._unet.modules())
+
+    def record_job(self, compiled: bool):
+        """Count a generation as run on the compiled or the eager UNet"""
+        if compiled:
+            self.compiled_jobs += 1
+        else:
+            self.eager_jobs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Compile statistics for the health endpoints"""
+        graphs = self._compiled_graphs()
+        return {
+            "enabled": True,
+            "mode": self.mode,
+            "buckets": [f"{w}x{h}" for w, h in self.buckets],
+            "warmed_buckets": [f"{w}x{h}" for w, h in self.warmed_buckets],
+            "compiled_graphs": graphs,
+            # Graphs compiled after warm-up: should stay at 0 in steady state
+            "recompiles": graphs - self._baseline_graphs if graphs is not None and self._baseline_graphs is not None else None,
+            "compiled_jobs": self.compiled_jobs,
+            "eager_jobs": self.eager_jobs,
+        }
@@ -0,0 +1,124 @@
+"""
+DeepCache Module
+Reuses the deep UNet features across denoising steps (DeepCache, Ma et al. 2023)
+
+The high-level features computed by the deep blocks of the UNet change slowly
+between adjacent steps, while the shallow blocks carry the fine detail. While
+a DeepCache is active the UNet runs fully only every `interval` steps; on the
+steps in between only the shallow branch runs (conv_in, the first
+`branch + 1` down blocks, the last `branch + 1` up blocks and conv_out). The
+up block above the branch is fed the deep output cached at the last full step.
+
+Skipped blocks return their cached outputs, so the UNet's own forward runs
+unchanged and the skip connections the shallow up blocks need are always
+fresh. On SD 1.5 with branch 0 a cached step costs roughly a fifth of a full
+one.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch.nn as nn
+from diffusers import UNet2DConditionModel
+
+logger = logging.getLogger(__name__)
+
+
+class DeepCache:
+    """
+    Context manager that makes a UNet skip its deep blocks on most steps
+
+    Any change of the input batch (shape, device or dtype) forces a full step,
+    e.g. when classifier-free guidance is truncated mid-loop. The UNet must
+    not be used by another job while the cache is active: the cache is keyed
+    by shape only, so that job would get this job's deep features (main.py
+    runs it under pipeline_lock).
+
+    Usage:
+        with DeepCache(pipe.unet, interval=3):
+            images = pipe(prompt, ...).images
+    """
+
+    def __init__(self, unet: UNet2DConditionModel, interval: int = 3, branch: int = 0):
+        if interval < 1:
+            raise ValueError("DeepCache interval must be at least 1")
+        if not 0 <= branch < len(unet.down_blocks) - 1:
+            raise ValueError(f"DeepCache branch must be between 0 and {len(unet.down_blocks) - 2}")
+        self.unet = unet
+        self.interval = interval
+        self.branch = branch
+        self.full_steps = 0
+        self.cached_steps = 0
+        self._calls = 0
+        self._full = True
+        self._input_key: Optional[Tuple[Any, ...]] = None
+        self._outputs: Dict[str, Any] = {}
+        # (module, instance forward it had before patching, if any)
+        self._patched: List[Tuple[nn.Module, Any]] = []
+        self._hook = None
+
+    def _deep_blocks(self) -> List[Tuple[str, nn.Module]]:
+        split = self.branch + 1
+        blocks = [(f"down_blocks.{i}", block) for i, block in enumerate(self.unet.down_blocks) if i >= split]
+        if getattr(self.unet, "mid_block", None) is not None:
+            blocks.append(("mid_block", self.unet.mid_block))
+        up_count = len(self.unet.up_blocks)
+        blocks.extend((f"up_blocks.{i}", block) for i, block in enumerate(self.unet.up_blocks) if i < up_count - split)
+        return blocks
+
+    def __enter__(self) -> "DeepCache":
+        for name, module in self._deep_blocks():
+            original = module.forward
+            self._patched.append((module, module.__dict__.get("forward")))
+            module.forward = self._make_forward(name, original)
+        self._hook = self.unet.register_forward_pre_hook(self._pre_forward, with_kwargs=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._hook is not None:
+            self._hook.remove()
+            self._hook = None
+        for module, instance_forward in self._patched:
+            if instance_forward is not None:
+                module.forward = instance_forward
+            else:
+                # Drop the instance attribute so the class forward is used again
+                del module.forward
+        self._patched.clear()
+        self._outputs.clear()
+        logger.info(f"[DEEPCACHE] {self.full_steps} full / {self.cached_steps} cached UNet steps")
+        return False
+
+    def _pre_forward(self, module: nn.Module, args: tuple, kwargs: dict):
+        """Decide before each UNet call whether the deep blocks run or replay their cache"""
+        sample = args[0] if args else kwargs["sample"]
+        input_key = (tuple(sample.shape), sample.device, sample.dtype)
+        if input_key != self._input_key:
+            self._input_key = input_key
+            self._calls = 0
+        self._full = self._calls % self.interval == 0 or not self._outputs
+        self._calls += 1
+        if self._full:
+            self.full_steps += 1
+        else:
+            self.cached_steps += 1
+        return None
+
+    def _make_forward(self, name: str, original):
+        def forward(*args, **kwargs):
+            if self._full:
+                output = original(*args, **kwargs)
+                self._outputs[name] = output
+                return output
+            return self._outputs[name]
+        return forward
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.full_steps + self.cached_steps
+        return {
+            "interval": self.interval,
+            "branch": self.branch,
+            "full_steps": self.full_steps,
+            "cached_steps": self.cached_steps,
+            "cached_fraction": self.cached_steps / total if total > 0 else 0.0,
+        }
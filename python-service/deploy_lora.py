@@ -3,23 +3,44 @@ LoRA Deployment Script
 
 Automates the deployment of trained LoRA files to the service.
 
+Each deployment is stored in a versioned subdirectory named by content hash
+(loras/<brand_id>/versions/<hash>/) and published with an atomic symlink/rename,
+so the running service never reads a half-written file. Redeploying identical
+bytes skips the copy.
+
+Adapters are converted once to the canonical format (PEFT keys, serving dtype,
+alpha folded in; see lora_convert.py) so the service loads them without any
+per-request conversion. This needs torch/diffusers; without them, or with
+--no-normalize, the file is deployed as is.
+
 Usage:
     python deploy_lora.py --lora-file output/apple_brand_style.safetensors --brand-id apple
     python deploy_lora.py --lora-file output/apple_brand_style.safetensors --brand-id apple --metadata brand_dna.json
+    python deploy_lora.py --bulk-dir output/ --jobs 4    # deploys output/<brand_id>.safetensors files
+    python deploy_lora.py --lora-file kohya_lora.safetensors --brand-id apple --dtype fp32   # CPU serving
 """
 
 import argparse
 import os
-import shutil
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 import logging
 
+from lora_inspect import inspect_lora
+from lora_store import hash_file, store_version, publish_version, read_manifest, write_json_atomic
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 # Default LoRA directory (matches lora_manager.py)
 LORA_BASE_DIR = os.getenv("LORA_BASE_DIR", "loras")
+# dtype the service runs the pipeline in (fp16 on GPU, fp32 on CPU)
+LORA_SERVING_DTYPE = os.getenv("LORA_SERVING_DTYPE", "fp16")
+
+# safetensors dtype names of the serving dtypes
+SAFETENSORS_DTYPES = {"fp16": "F16", "bf16": "BF16", "fp32": "F32"}
 
 
 def normalize_brand_id(brand_id: str) -> str:
@@ -39,11 +60,75 @@ def normalize_brand_id(brand_id: str) -> str:
     return normalized
 
 
+def record_deployment_metadata(brand_dir: Path, normalized_id: str, version_info: dict):
+    """Record the deployed version's hash, size and rank in lora_metadata.json"""
+    metadata_path = brand_dir / "lora_metadata.json"
+    metadata = {}
+    if metadata_path.exists():
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"⚠️  Existing {metadata_path} is invalid JSON, rewriting it")
+    
+    now = datetime.now().isoformat()
+    metadata.update(version_info)
+    metadata["brand_id"] = normalized_id
+    metadata["updated_at"] = now
+    metadata.setdefault("created_at", now)
+    write_json_atomic(str(metadata_path), metadata)
+
+
+def canonicalize_for_deploy(lora_file: Path, brand_dir: Path, inspection: dict, dtype: str):
+    """
+    Convert an adapter to the canonical format next to the brand directory.
+    
+    Args:
+        lora_file: Path to the trained LoRA file
+        brand_dir: Brand directory the temporary canonical file is written to
+        inspection: Header inspection of lora_file
+        dtype: Serving dtype (fp16, bf16 or fp32)
+        
+    Returns:
+        Tuple of (file to deploy, conversion report); the file is lora_file
+        itself (and the report None) if no conversion was done
+    """
+    if inspection["canonical"] and inspection["dtype"] == SAFETENSORS_DTYPES.get(dtype):
+        logger.info(f"⏭️  Already in canonical format ({dtype})")
+        return lora_file, None
+    
+    try:
+        from lora_convert import canonicalize_lora_file
+    except ImportError as e:
+        logger.warning(f"⚠️  Skipping conversion to canonical format ({e}), deploying file as is")
+        return lora_file, None
+    
+    canonical_file = brand_dir / f".{lora_file.stem}.canonical.tmp.{os.getpid()}"
+    try:
+        report = canonicalize_lora_file(str(lora_file), str(canonical_file), dtype, inspection["format"])
+    except ValueError as e:
+        canonical_file.unlink(missing_ok=True)
+        logger.warning(f"⚠️  Could not convert to canonical format ({e}), deploying file as is")
+        return lora_file, None
+    
+    logger.info(f"✅ Converted {inspection['format']} adapter to canonical format:")
+    logger.info(f"   {report['layers']} layers, {report['tensors_in']} → {report['tensors_out']} tensors, "
+                f"{report['alphas_folded']} alphas folded, {report['dropped_keys']} unused keys dropped")
+    logger.info(f"   {inspection['dtype']} → {dtype}, {report['source_bytes'] / (1024 * 1024):.2f} MB → "
+                f"{report['target_bytes'] / (1024 * 1024):.2f} MB")
+    return canonical_file, report
+
+
 def deploy_lora(
     lora_file: Path,
     brand_id: str,
     metadata_file: Path = None,
-    target_name: str = "style.safetensors"
+    target_name: str = "style.safetensors",
+    show_next_steps: bool = True,
+    normalize: bool = True,
+    dtype: str = LORA_SERVING_DTYPE,
+    source_name: str = None,
+    source_sha256: str = None
 ) -> bool:
     """
     Deploy a LoRA file to the service.
@@ -53,6 +138,12 @@ def deploy_lora(
         brand_id: Brand identifier
         metadata_file: Optional path to brand metadata JSON
         target_name: Target filename (default: style.safetensors)
+        show_next_steps: Print the post-deployment instructions
+        normalize: Convert to the canonical format before deploying
+        dtype: Serving dtype for the canonical format (fp16, bf16 or fp32)
+        source_name: Name recorded as source_file (default: lora_file)
+        source_sha256: Hash of the file as received, recorded so identical
+                       re-uploads can be skipped before conversion
         
     Returns:
         True if successful, False otherwise
@@ -78,20 +169,58 @@ def deploy_lora(
     brand_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"📁 Created directory: {brand_dir}")
     
-    # Copy LoRA file
+    # Validate the safetensors header before touching the live file
+    try:
+        inspection = inspect_lora(str(lora_file))
+    except ValueError as e:
+        logger.error(f"❌ Not a valid safetensors file: {e}")
+        return False
+    rank = inspection["rank"]
+    
+    deploy_file, conversion = lora_file, None
+    if normalize:
+        deploy_file, conversion = canonicalize_for_deploy(lora_file, brand_dir, inspection, dtype)
+    
+    # Store under versions/<content hash>/ and publish atomically
     target_file = brand_dir / target_name
     try:
-        shutil.copy2(lora_file, target_file)
-        logger.info(f"✅ Copied LoRA file:")
-        logger.info(f"   From: {lora_file}")
-        logger.info(f"   To:   {target_file}")
+        sha256 = hash_file(str(deploy_file))
+        manifest = read_manifest(str(brand_dir))
+        version_id, version_path, copied = store_version(str(brand_dir), str(deploy_file), target_name, sha256)
+        size_bytes = os.path.getsize(version_path)
+        
+        if copied:
+            logger.info(f"✅ Stored LoRA version {version_id}:")
+            logger.info(f"   From: {lora_file}")
+            logger.info(f"   To:   {version_path}")
+        else:
+            logger.info(f"⏭️  Version {version_id} already stored, skipping copy")
+        logger.info(f"   Size: {size_bytes / (1024 * 1024):.2f} MB, rank: {rank}")
+        
+        version_info = {
+            "version": version_id,
+            "sha256": sha256,
+            "size_bytes": size_bytes,
+            "rank": rank,
+            "source_file": source_name or str(lora_file),
+            "source_sha256": source_sha256 or (sha256 if deploy_file == lora_file else hash_file(str(lora_file))),
+            "source_format": inspection["format"],
+            "canonical": conversion is not None or inspection["canonical"],
+            "dtype": dtype if conversion else inspection["dtype"]
+        }
+        if manifest and manifest.get("current") == version_id and target_file.exists():
+            logger.info(f"⏭️  Version {version_id} is already live")
+        else:
+            method = publish_version(str(brand_dir), version_id, target_name, version_info)
+            logger.info(f"✅ Published {target_file} → version {version_id} ({method})")
         
-        # Show file size
-        file_size_mb = target_file.stat().st_size / (1024 * 1024)
-        logger.info(f"   Size: {file_size_mb:.2f} MB")
+        record_deployment_metadata(brand_dir, normalized_id, {**version_info, "deployed_at": datetime.now().isoformat()})
     except Exception as e:
-        logger.error(f"❌ Failed to copy LoRA file: {e}")
+        logger.error(f"❌ Failed to deploy LoRA file: {e}")
         return False
+    finally:
+        if deploy_file != lora_file:
+            deploy_file.unlink(missing_ok=True)
     
     # Copy metadata if provided
     if metadata_file and metadata_file.exists():
@@ -117,6 +246,9 @@ def deploy_lora(
     elif metadata_file:
         logger.warning(f"⚠️  Metadata file not found: {metadata_file}")
     
+    if not show_next_steps:
+        return True
+    
     # Verify deployment
     logger.info("\n" + "=" * 60)
     logger.info("✅ Deployment Complete!")
@@ -126,8 +258,9 @@ def deploy_lora(
     if metadata_file and metadata_file.exists():
         logger.info(f"Metadata: {brand_dir / 'brand_metadata.json'}")
     logger.info("\n📋 Next Steps:")
-    logger.info("1. Restart the Python service:")
-    logger.info("   python main.py")
+    logger.info("1. A running service picks up the new file automatically (no restart needed).")
+    logger.info("   To reload right away:")
+    logger.info(f"   curl -X POST http://localhost:8000/lora/{normalized_id}/reload")
     logger.info("\n2. Test your LoRA:")
     logger.info(f'   curl -X POST http://localhost:8000/generate-async \\')
     logger.info(f'     -H "Content-Type: application/json" \\')
@@ -170,6 +303,13 @@ def list_deployed_loras():
         else:
             logger.info(f"   ⚠️  No LoRA files found")
         
+        # Show stored versions
+        manifest = read_manifest(str(brand_dir))
+        if manifest:
+            for version_id, info in manifest.get("versions", {}).items():
+                marker = "→" if version_id == manifest.get("current") else " "
+                logger.info(f"   {marker} version {version_id} (rank: {info.get('rank')}, published: {info.get('published_at')})")
+        
         # Check for metadata
         metadata_file = brand_dir / "brand_metadata.json"
         if metadata_file.exists():
@@ -187,6 +327,59 @@ def list_deployed_loras():
     logger.info("=" * 60)
 
 
+def deploy_bulk(
+    bulk_dir: Path,
+    target_name: str = "style.safetensors",
+    jobs: int = 4,
+    normalize: bool = True,
+    dtype: str = LORA_SERVING_DTYPE
+) -> bool:
+    """
+    Deploy every <brand_id>.safetensors file in a directory, in parallel.
+    
+    A <brand_id>.json next to an adapter is deployed as its brand metadata.
+    
+    Args:
+        bulk_dir: Directory containing adapter files named by brand_id
+        target_name: Target filename (default: style.safetensors)
+        jobs: Number of adapters deployed concurrently
+        normalize: Convert to the canonical format before deploying
+        dtype: Serving dtype for the canonical format
+        
+    Returns:
+        True if all deployments succeeded, False otherwise
+    """
+    lora_files = sorted(bulk_dir.glob("*.safetensors"))
+    if not lora_files:
+        logger.error(f"❌ No .safetensors files found in {bulk_dir}")
+        return False
+    
+    logger.info(f"📦 Deploying {len(lora_files)} LoRAs from {bulk_dir} ({jobs} at a time)")
+    
+    def deploy_one(lora_file: Path) -> bool:
+        metadata_file = lora_file.with_suffix(".json")
+        return deploy_lora(
+            lora_file=lora_file,
+            brand_id=lora_file.stem,
+            metadata_file=metadata_file if metadata_file.exists() else None,
+            target_name=target_name,
+            show_next_steps=False,
+            normalize=normalize,
+            dtype=dtype
+        )
+    
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(deploy_one, lora_files))
+    
+    failed = [f.stem for f, ok in zip(lora_files, results) if not ok]
+    logger.info("=" * 60)
+    logger.info(f"✅ Deployed {len(lora_files) - len(failed)}/{len(lora_files)} LoRAs")
+    if failed:
+        logger.error(f"❌ Failed: {', '.join(failed)}")
+    logger.info("=" * 60)
+    return not failed
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Deploy trained LoRA files to the image generation service"
@@ -217,6 +410,29 @@ def main():
         action="store_true",
         help="List all deployed LoRAs"
     )
+    parser.add_argument(
+        "--bulk-dir",
+        type=str,
+        help="Deploy every <brand_id>.safetensors file in this directory"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Number of parallel deployments in bulk mode (default: 4)"
+    )
+    parser.add_argument(
+        "--no-normalize",
+        action="store_true",
+        help="Deploy the file as is instead of converting it to the canonical format"
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        choices=list(SAFETENSORS_DTYPES),
+        default=LORA_SERVING_DTYPE,
+        help=f"Serving dtype of the canonical format (default: {LORA_SERVING_DTYPE}, use fp32 for CPU serving)"
+    )
     
     args = parser.parse_args()
     
@@ -225,9 +441,20 @@ def main():
         list_deployed_loras()
         return 0
     
+    # Bulk mode
+    if args.bulk_dir:
+        success = deploy_bulk(
+            Path(args.bulk_dir),
+            target_name=args.target_name,
+            jobs=args.jobs,
+            normalize=not args.no_normalize,
+            dtype=args.dtype
+        )
+        return 0 if success else 1
+    
     # Deploy mode
     if not args.lora_file or not args.brand_id:
-        parser.error("--lora-file and --brand-id are required (or use --list)")
+        parser.error("--lora-file and --brand-id are required (or use --list / --bulk-dir)")
     
     lora_file = Path(args.lora_file)
     metadata_file = Path(args.metadata) if args.metadata else None
@@ -236,7 +463,9 @@ def main():
         lora_file=lora_file,
         brand_id=args.brand_id,
         metadata_file=metadata_file,
-        target_name=args.target_name
+        target_name=args.target_name,
+        normalize=not args.no_normalize,
+        dtype=args.dtype
     )
     
     return 0 if success else 1
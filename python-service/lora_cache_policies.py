@@ -0,0 +1,413 @@
+"""
+LoRA Cache Eviction Policies
+Pluggable eviction policies for the adapter cache in lora_manager.py
+
+All policies track keys only (the cache owns the values) and share one interface:
+- access(key): record a lookup, returns True on a hit
+- admit(key): insert a key after a miss, returns the keys evicted to make room
+  (W-TinyLFU may reject the new key itself, in which case it is in the list)
+- evict(): force out one victim (used for byte budgets), returns its key
+- remove(key) / clear() / keys()
+
+Available policies: lru, lfu (with aging), arc, wtinylfu
+"""
+
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Type
+
+
+class CachePolicy:
+    """Base class for adapter cache eviction policies"""
+
+    name = "base"
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+
+    def __contains__(self, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> List[Hashable]:
+        raise NotImplementedError
+
+    def access(self, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def admit(self, key: Hashable) -> List[Hashable]:
+        raise NotImplementedError
+
+    def evict(self) -> Optional[Hashable]:
+        raise NotImplementedError
+
+    def remove(self, key: Hashable):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUPolicy(CachePolicy):
+    """Least recently used (the original OrderedDict behaviour)"""
+
+    name = "lru"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._entries: OrderedDict = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[Hashable]:
+        return list(self._entries.keys())
+
+    def access(self, key: Hashable) -> bool:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True
+        return False
+
+    def admit(self, key: Hashable) -> List[Hashable]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return []
+        evicted = []
+        while len(self._entries) >= self.capacity:
+            evicted.append(self.evict())
+        self._entries[key] = True
+        return evicted
+
+    def evict(self) -> Optional[Hashable]:
+        if not self._entries:
+            return None
+        key, _ = self._entries.popitem(last=False)
+        return key
+
+    def remove(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class LFUPolicy(CachePolicy):
+    """
+    Least frequently used with aging
+
+    All counts are halved every aging_interval accesses so brands that were
+    popular once don't stay pinned forever. Ties go to the least recently used.
+    """
+
+    name = "lfu"
+
+    def __init__(self, capacity: int, aging_interval: Optional[int] = None):
+        super().__init__(capacity)
+        self.aging_interval = aging_interval or self.capacity * 10
+        # Key -> [count, last access tick]
+        self._entries: Dict[Hashable, List[int]] = {}
+        self._tick = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[Hashable]:
+        return list(self._entries.keys())
+
+    def _advance(self):
+        self._tick += 1
+        if self._tick % self.aging_interval == 0:
+            for entry in self._entries.values():
+                entry[0] //= 2
+
+    def access(self, key: Hashable) -> bool:
+        self._advance()
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry[0] += 1
+        entry[1] = self._tick
+        return True
+
+    def admit(self, key: Hashable) -> List[Hashable]:
+        if key in self._entries:
+            return []
+        evicted = []
+        while len(self._entries) >= self.capacity:
+            evicted.append(self.evict())
+        self._entries[key] = [1, self._tick]
+        return evicted
+
+    def evict(self) -> Optional[Hashable]:
+        if not self._entries:
+            return None
+        victim = min(self._entries, key=lambda k: (self._entries[k][0], self._entries[k][1]))
+        del self._entries[victim]
+        return victim
+
+    def remove(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._tick = 0
+
+
+class ARCPolicy(CachePolicy):
+    """
+    Adaptive Replacement Cache (Megiddo & Modha)
+
+    Splits the cache between recently-seen-once (T1) and seen-repeatedly (T2)
+    keys and keeps ghost lists (B1/B2) of recent evictions to adapt the split,
+    so one-off scans of the long tail can't flush the frequently used brands.
+    """
+
+    name = "arc"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._t1: OrderedDict = OrderedDict()
+        self._t2: OrderedDict = OrderedDict()
+        self._b1: OrderedDict = OrderedDict()
+        self._b2: OrderedDict = OrderedDict()
+        self._p = 0.0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._t1 or key in self._t2
+
+    def keys(self) -> List[Hashable]:
+        return list(self._t1.keys()) + list(self._t2.keys())
+
+    def access(self, key: Hashable) -> bool:
+        if key in self._t1:
+            del self._t1[key]
+            self._t2[key] = True
+            return True
+        if key in self._t2:
+            self._t2.move_to_end(key)
+            return True
+        return False
+
+    def _replace(self, key: Hashable) -> Optional[Hashable]:
+        """Move one resident key to its ghost list, returns the evicted key"""
+        if len(self._t1) + len(self._t2) < self.capacity:
+            return None
+        if self._t1 and (len(self._t1) > self._p or (key in self._b2 and len(self._t1) == self._p)):
+            victim, _ = self._t1.popitem(last=False)
+            self._b1[victim] = True
+        elif self._t2:
+            victim, _ = self._t2.popitem(last=False)
+            self._b2[victim] = True
+        else:
+            victim, _ = self._t1.popitem(last=False)
+            self._b1[victim] = True
+        return victim
+
+    def admit(self, key: Hashable) -> List[Hashable]:
+        if key in self:
+            return []
+        evicted = []
+        c = self.capacity
+        if key in self._b1:
+            self._p = min(c, self._p + max(len(self._b2) / len(self._b1), 1))
+            evicted.append(self._replace(key))
+            del self._b1[key]
+            self._t2[key] = True
+        elif key in self._b2:
+            self._p = max(0.0, self._p - max(len(self._b1) / len(self._b2), 1))
+            evicted.append(self._replace(key))
+            del self._b2[key]
+            self._t2[key] = True
+        else:
+            total = len(self._t1) + len(self._t2) + len(self._b1) + len(self._b2)
+            if len(self._t1) + len(self._b1) >= c:
+                if len(self._t1) < c:
+                    self._b1.popitem(last=False)
+                    evicted.append(self._replace(key))
+                else:
+                    victim, _ = self._t1.popitem(last=False)
+                    evicted.append(victim)
+            elif total >= c:
+                if total >= 2 * c:
+                    self._b2.popitem(last=False)
+                evicted.append(self._replace(key))
+            self._t1[key] = True
+        return [k for k in evicted if k is not None]
+
+    def evict(self) -> Optional[Hashable]:
+        if not self._t1 and not self._t2:
+            return None
+        if self._t1 and (len(self._t1) >= self._p or not self._t2):
+            victim, _ = self._t1.popitem(last=False)
+            self._b1[victim] = True
+        else:
+            victim, _ = self._t2.popitem(last=False)
+            self._b2[victim] = True
+        return victim
+
+    def remove(self, key: Hashable):
+        for entries in (self._t1, self._t2, self._b1, self._b2):
+            entries.pop(key, None)
+
+    def clear(self):
+        for entries in (self._t1, self._t2, self._b1, self._b2):
+            entries.clear()
+        self._p = 0.0
+
+
+class FrequencySketch:
+    """
+    Count-min sketch with periodic halving, as used by TinyLFU
+
+    Hashing uses crc32 rather than hash() so results are stable across
+    processes (the offline simulator relies on this).
+    """
+
+    def __init__(self, capacity: int, depth: int = 4):
+        self.width = max(16, capacity * 4)
+        self.depth = depth
+        self.sample_size = max(10, capacity * 10)
+        self._rows = [[0] * self.width for _ in range(depth)]
+        self._additions = 0
+
+    def _indexes(self, key: Hashable):
+        data = repr(key).encode("utf-8")
+        for row in range(self.depth):
+            yield row, zlib.crc32(data, row * 0x9E3779B1 & 0xFFFFFFFF) % self.width
+
+    def increment(self, key: Hashable):
+        for row, index in self._indexes(key):
+            self._rows[row][index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            for counters in self._rows:
+                for index in range(self.width):
+                    counters[index] //= 2
+            self._additions //= 2
+
+    def estimate(self, key: Hashable) -> int:
+        return min(self._rows[row][index] for row, index in self._indexes(key))
+
+
+class WTinyLFUPolicy(CachePolicy):
+    """
+    Window TinyLFU (Einziger et al., as in Caffeine)
+
+    New keys enter a small LRU window. Keys leaving the window only get into
+    the main segmented-LRU area if the frequency sketch says they are used more
+    often than the main area's victim, so one-off brands are rejected instead
+    of displacing hot ones.
+    """
+
+    name = "wtinylfu"
+
+    def __init__(self, capacity: int, window_ratio: float = 0.01, protected_ratio: float = 0.8):
+        super().__init__(capacity)
+        self.window_capacity = max(1, int(self.capacity * window_ratio))
+        self.main_capacity = self.capacity - self.window_capacity
+        self.protected_capacity = max(1, int(self.main_capacity * protected_ratio))
+        self._window: OrderedDict = OrderedDict()
+        self._probation: OrderedDict = OrderedDict()
+        self._protected: OrderedDict = OrderedDict()
+        self._sketch = FrequencySketch(self.capacity)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._window or key in self._probation or key in self._protected
+
+    def keys(self) -> List[Hashable]:
+        return list(self._window.keys()) + list(self._probation.keys()) + list(self._protected.keys())
+
+    def access(self, key: Hashable) -> bool:
+        self._sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+            return True
+        if key in self._protected:
+            self._protected.move_to_end(key)
+            return True
+        if key in self._probation:
+            # Promote, demoting the protected LRU back to probation if needed
+            del self._probation[key]
+            self._protected[key] = True
+            if len(self._protected) > self.protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = True
+            return True
+        return False
+
+    def _main_victim(self) -> Optional[Hashable]:
+        if self._probation:
+            return next(iter(self._probation))
+        if self._protected:
+            return next(iter(self._protected))
+        return None
+
+    def admit(self, key: Hashable) -> List[Hashable]:
+        if key in self:
+            return []
+        self._window[key] = True
+        if len(self._window) <= self.window_capacity:
+            return []
+
+        candidate, _ = self._window.popitem(last=False)
+        if self.main_capacity == 0:
+            return [candidate]
+        if len(self._probation) + len(self._protected) < self.main_capacity:
+            self._probation[candidate] = True
+            return []
+
+        victim = self._main_victim()
+        if self._sketch.estimate(candidate) > self._sketch.estimate(victim):
+            self.remove(victim)
+            self._probation[candidate] = True
+            return [victim]
+        # Candidate isn't used often enough to displace the main area's victim
+        return [candidate]
+
+    def evict(self) -> Optional[Hashable]:
+        # Main-area probation first: the window holds the newest keys
+        for segment in (self._probation, self._window, self._protected):
+            if segment:
+                victim, _ = segment.popitem(last=False)
+                return victim
+        return None
+
+    def remove(self, key: Hashable):
+        for segment in (self._window, self._probation, self._protected):
+            segment.pop(key, None)
+
+    def clear(self):
+        for segment in (self._window, self._probation, self._protected):
+            segment.clear()
+        self._sketch = FrequencySketch(self.capacity)
+
+
+POLICIES: Dict[str, Type[CachePolicy]] = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    ARCPolicy.name: ARCPolicy,
+    WTinyLFUPolicy.name: WTinyLFUPolicy,
+}
+
+
+def create_policy(name: str, capacity: int, **kwargs: Any) -> CachePolicy:
+    """
+    Create an eviction policy by name
+
+    Args:
+        name: One of POLICIES ("lru", "lfu", "arc", "wtinylfu"), case-insensitive
+        capacity: Maximum number of cached keys
+
+    Returns:
+        CachePolicy instance
+
+    Raises:
+        ValueError: If the policy name is unknown
+    """
+    policy_class = POLICIES.get(name.strip().lower().replace("-", ""))
+    if policy_class is None:
+        raise ValueError(f"Unknown cache policy '{name}'. Available: {', '.join(POLICIES)}")
+    return policy_class(capacity, **kwargs)
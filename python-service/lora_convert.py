@@ -0,0 +1,145 @@
+"""
+LoRA Conversion Module
+Converts trained adapters once, at deploy time, into the canonical format the
+service loads without any per-request conversion
+
+Trainers save adapters with kohya keys (lora_unet_..., lora_down/lora_up plus
+.alpha) or diffusers keys (lora.down/lora.up or lora_A/lora_B), in fp32 or
+fp16. diffusers re-detects the format, renames keys and casts dtypes on every
+load_lora_weights call. The canonical file has:
+- PEFT keys: {unet|text_encoder}.<module>.lora_A.weight / .lora_B.weight
+- tensors already in the serving dtype
+- alpha folded into lora_B (scaled by alpha / rank), so no .alpha keys
+- no keys for components the service pipeline doesn't have
+"""
+
+import os
+import logging
+from typing import Any, Dict, Tuple
+
+import torch
+from safetensors.torch import load_file, save_file
+
+from lora_inspect import split_lora_key, CANONICAL_FORMAT, CANONICAL_FORMAT_KEY
+
+logger = logging.getLogger(__name__)
+
+# Pipeline components the service applies LoRAs to (StableDiffusionPipeline)
+SERVED_COMPONENTS = ("unet", "text_encoder")
+
+DTYPES = {
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+    "fp32": torch.float32,
+}
+
+
+def _to_diffusers_keys(state_dict: Dict[str, torch.Tensor]) -> Tuple[Dict[str, torch.Tensor], Dict[str, float]]:
+    """Run diffusers' own format detection and key conversion, once"""
+    from diffusers import StableDiffusionPipeline
+
+    converted, network_alphas = StableDiffusionPipeline.lora_state_dict(state_dict)
+    return converted, network_alphas or {}
+
+
+def _component(module_path: str) -> str:
+    """Pipeline component a module path belongs to ("unet" for unprefixed legacy keys)"""
+    prefix = module_path.split(".", 1)[0]
+    return prefix if prefix.startswith(("unet", "text_encoder")) else "unet"
+
+
+def canonicalize_lora(state_dict: Dict[str, torch.Tensor], dtype: str = "fp16") -> Tuple[Dict[str, torch.Tensor], Dict[str, Any]]:
+    """
+    Convert an adapter state dict to canonical PEFT keys in the serving dtype.
+
+    Args:
+        state_dict: Adapter tensors as saved by the trainer
+        dtype: Serving dtype, one of DTYPES
+
+    Returns:
+        Tuple of (canonical state dict, conversion report)
+
+    Raises:
+        ValueError: If the dtype is unknown, or LoRA tensors can't be mapped
+                    (converting would silently drop layers)
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype '{dtype}'. Available: {', '.join(DTYPES)}")
+
+    converted, network_alphas = _to_diffusers_keys(state_dict)
+
+    layers: Dict[str, Dict[str, torch.Tensor]] = {}
+    alphas: Dict[str, float] = {}
+    dropped = []
+    for name, tensor in converted.items():
+        module_path, role = split_lora_key(name)
+        if role == "alpha":
+            alphas[module_path] = float(tensor.item())
+        elif role in ("down", "up"):
+            if _component(module_path) not in SERVED_COMPONENTS:
+                dropped.append(name)
+                continue
+            layers.setdefault(module_path, {})[role] = tensor
+        elif "lora" in name.lower():
+            raise ValueError(f"Unrecognized LoRA tensor '{name}', refusing to convert")
+        else:
+            dropped.append(name)
+    for name, alpha in network_alphas.items():
+        module_path, _ = split_lora_key(name)
+        alphas[module_path] = float(alpha)
+
+    incomplete = [module_path for module_path, pair in layers.items() if len(pair) != 2]
+    if incomplete:
+        raise ValueError(f"{len(incomplete)} layers are missing a down or up matrix (e.g. {incomplete[0]})")
+
+    target_dtype = DTYPES[dtype]
+    canonical = {}
+    folded = 0
+    for module_path, pair in sorted(layers.items()):
+        if not module_path.startswith(SERVED_COMPONENTS):
+            module_path = f"unet.{module_path}"
+        down = pair["down"].float()
+        up = pair["up"].float()
+        rank = down.shape[0]
+        alpha = alphas.get(module_path, alphas.get(module_path.split(".", 1)[-1]))
+        if alpha is not None and alpha != rank:
+            up = up * (alpha / rank)
+            folded += 1
+        canonical[f"{module_path}.lora_A.weight"] = down.to(target_dtype).contiguous()
+        canonical[f"{module_path}.lora_B.weight"] = up.to(target_dtype).contiguous()
+
+    report = {
+        "dtype": dtype,
+        "layers": len(layers),
+        "tensors_in": len(state_dict),
+        "tensors_out": len(canonical),
+        "alphas_folded": folded,
+        "dropped_keys": len(dropped),
+    }
+    return canonical, report
+
+
+def canonicalize_lora_file(source_path: str, target_path: str, dtype: str = "fp16", source_format: str = "unknown") -> Dict[str, Any]:
+    """
+    Convert an adapter file to a canonical safetensors file.
+
+    Args:
+        source_path: Adapter file as saved by the trainer
+        target_path: Where to write the canonical file
+        dtype: Serving dtype, one of DTYPES
+        source_format: Key format of the source (recorded in the file metadata)
+
+    Returns:
+        Conversion report (dtype, layers, tensor counts, alphas folded, dropped
+        keys, source and target byte sizes)
+    """
+    canonical, report = canonicalize_lora(load_file(source_path, device="cpu"), dtype)
+    save_file(canonical, target_path, metadata={
+        "format": "pt",
+        CANONICAL_FORMAT_KEY: CANONICAL_FORMAT,
+        "dtype": dtype,
+        "source_format": source_format,
+    })
+    report["source_bytes"] = os.path.getsize(source_path)
+    report["target_bytes"] = os.path.getsize(target_path)
+    return report
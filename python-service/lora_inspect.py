@@ -0,0 +1,266 @@
+"""
+LoRA Inspection Module
+Reads safetensors headers without loading tensor data
+
+A safetensors file starts with an 8-byte little-endian header length followed
+by a JSON header mapping tensor names to dtype, shape and byte offsets, so
+adapter properties can be read in microseconds regardless of file size.
+No torch/diffusers import, so deploy tooling can use it too.
+"""
+
+import os
+import json
+import struct
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Refuse absurd headers (corrupt or non-safetensors files)
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+# (down/A suffix, up/B suffix) pairs used by the LoRA key formats we accept
+LORA_DOWN_UP_SUFFIXES = [
+    ("lora_A.weight", "lora_B.weight"),          # PEFT / diffusers
+    ("lora.down.weight", "lora.up.weight"),      # old diffusers
+    ("lora_down.weight", "lora_up.weight"),      # kohya
+    ("lora_linear_layer.down.weight", "lora_linear_layer.up.weight"),  # diffusers text encoder
+]
+
+# Header __metadata__ marker written by lora_convert.py: PEFT keys, serving
+# dtype, alpha folded in, so the service can load the file without conversion
+CANONICAL_FORMAT_KEY = "lora_format"
+CANONICAL_FORMAT = "canonical_peft_v1"
+
+# Bytes per element of the safetensors dtypes
+DTYPE_SIZES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2, "F8_E4M3": 1, "F8_E5M2": 1,
+    "I64": 8, "I32": 4, "I16": 2, "I8": 1, "U8": 1, "BOOL": 1,
+}
+
+# Key prefixes that tell which pipeline component a layer belongs to
+COMPONENT_PREFIXES = [
+    ("unet.", "unet"),
+    ("text_encoder_2.", "text_encoder_2"),
+    ("text_encoder.", "text_encoder"),
+    ("lora_unet_", "unet"),
+    ("lora_te2_", "text_encoder_2"),
+    ("lora_te1_", "text_encoder"),
+    ("lora_te_", "text_encoder"),
+]
+
+# Leaf module names LoRAs commonly target; kohya keys join the module path with
+# underscores, so these are matched as suffixes
+KNOWN_TARGET_MODULES = [
+    "to_q", "to_k", "to_v", "to_out.0", "proj_in", "proj_out",
+    "ff.net.0.proj", "ff.net.2", "q_proj", "k_proj", "v_proj", "out_proj",
+    "fc1", "fc2", "conv1", "conv2", "conv_shortcut", "time_emb_proj", "conv",
+]
+
+
+def read_safetensors_header(path: str) -> Dict[str, Any]:
+    """
+    Read the JSON header of a safetensors file.
+
+    Args:
+        path: Path to the .safetensors file
+
+    Returns:
+        Header dictionary (tensor name -> {dtype, shape, data_offsets},
+        plus an optional "__metadata__" entry)
+
+    Raises:
+        ValueError: If the file is not a valid safetensors file
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(8)
+        if len(prefix) != 8:
+            raise ValueError(f"{path} is too short to be a safetensors file")
+        (header_size,) = struct.unpack('<Q', prefix)
+        if header_size > MAX_HEADER_SIZE:
+            raise ValueError(f"{path} has an invalid safetensors header size ({header_size} bytes)")
+        raw_header = f.read(header_size)
+    if len(raw_header) != header_size:
+        raise ValueError(f"{path} is truncated (header incomplete)")
+    try:
+        header = json.loads(raw_header)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} has a corrupt safetensors header: {e}")
+    if not isinstance(header, dict):
+        raise ValueError(f"{path} has a corrupt safetensors header")
+    return header
+
+
+def verify_safetensors_file(path: str) -> Dict[str, Any]:
+    """
+    Check that a safetensors file is complete, not just that its header parses.
+
+    Every tensor's byte range must match its dtype and shape and lie inside
+    the data section, and the data section must end where the file does
+    (catches truncated uploads and copies).
+
+    Args:
+        path: Path to the .safetensors file
+
+    Returns:
+        Header dictionary, as from read_safetensors_header()
+
+    Raises:
+        ValueError: If the file is not a valid, complete safetensors file
+    """
+    header = read_safetensors_header(path)
+    with open(path, 'rb') as f:
+        (header_size,) = struct.unpack('<Q', f.read(8))
+    data_size = os.path.getsize(path) - 8 - header_size
+
+    data_end = 0
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        if not isinstance(info, dict) or "data_offsets" not in info or "shape" not in info:
+            raise ValueError(f"{path}: malformed header entry for {name}")
+        start, end = (int(offset) for offset in info["data_offsets"])
+        if not 0 <= start <= end <= data_size:
+            raise ValueError(f"{path}: tensor {name} lies outside the data section (file truncated?)")
+        element_size = DTYPE_SIZES.get(info.get("dtype"))
+        if element_size is not None:
+            count = 1
+            for dim in info["shape"]:
+                count *= int(dim)
+            if end - start != count * element_size:
+                raise ValueError(f"{path}: tensor {name} has {end - start} bytes, expected {count * element_size}")
+        data_end = max(data_end, end)
+    if data_end != data_size:
+        raise ValueError(f"{path}: data section is {data_size} bytes, tensors cover {data_end}")
+    return header
+
+
+def infer_lora_rank(header: Dict[str, Any]) -> Optional[int]:
+    """
+    Infer the LoRA rank from a safetensors header.
+
+    The rank is the output dimension of the down/A matrices; if layers use
+    different ranks the largest one is returned.
+
+    Args:
+        header: Header from read_safetensors_header()
+
+    Returns:
+        Rank, or None if no LoRA down/A tensors were found
+    """
+    ranks = []
+    for name, info in header.items():
+        if name == "__metadata__" or not isinstance(info, dict):
+            continue
+        if any(name.endswith(down) for down, _ in LORA_DOWN_UP_SUFFIXES) and info.get("shape"):
+            ranks.append(int(info["shape"][0]))
+    return max(ranks) if ranks else None
+
+
+def split_lora_key(name: str):
+    """Split a tensor name into (module path, role), role being "down", "up", "alpha" or None"""
+    for down, up in LORA_DOWN_UP_SUFFIXES:
+        if name.endswith("." + down):
+            return name[:-len(down) - 1], "down"
+        if name.endswith("." + up):
+            return name[:-len(up) - 1], "up"
+    if name.endswith(".alpha"):
+        return name[:-len(".alpha")], "alpha"
+    return name, None
+
+
+def _target_module(module_path: str) -> str:
+    """Leaf module type of a LoRA layer (e.g. "to_q"), in either key format"""
+    for target in KNOWN_TARGET_MODULES:
+        if module_path.endswith("." + target) or module_path.endswith("_" + target.replace(".", "_")):
+            return target
+    return module_path.replace("_", ".").rsplit(".", 1)[-1]
+
+
+def _key_format(names: List[str]) -> str:
+    """Name the key convention an adapter was saved with"""
+    if any(name.startswith(("lora_unet_", "lora_te")) for name in names):
+        return "kohya"
+    if any(name.endswith("lora_A.weight") for name in names):
+        return "peft"
+    if any(name.endswith("lora.down.weight") for name in names):
+        return "diffusers_legacy"
+    return "unknown"
+
+
+def inspect_lora(path: str) -> Dict[str, Any]:
+    """
+    Describe a LoRA adapter from its safetensors header alone.
+
+    Args:
+        path: Path to the .safetensors file
+
+    Returns:
+        Dictionary with format, canonical, rank, ranks, target_modules,
+        components, layers, dtype, param_count, tensor_bytes and file_size
+
+    Raises:
+        ValueError: If the file is not a valid safetensors file
+    """
+    header = read_safetensors_header(path)
+    names = [name for name, info in header.items() if name != "__metadata__" and isinstance(info, dict)]
+
+    param_count = 0
+    tensor_bytes = 0
+    dtypes: Counter = Counter()
+    ranks = set()
+    layers = set()
+    target_modules = set()
+    components = set()
+    for name in names:
+        info = header[name]
+        count = 1
+        for dim in info.get("shape", []):
+            count *= int(dim)
+        param_count += count
+        start, end = info.get("data_offsets", (0, 0))
+        tensor_bytes += end - start
+        dtypes[info.get("dtype")] += count
+
+        module_path, role = split_lora_key(name)
+        if role is None:
+            continue
+        if role == "down" and info.get("shape"):
+            ranks.add(int(info["shape"][0]))
+        if role in ("down", "up"):
+            layers.add(module_path)
+            target_modules.add(_target_module(module_path))
+            for prefix, component in COMPONENT_PREFIXES:
+                if module_path.startswith(prefix):
+                    components.add(component)
+                    break
+
+    metadata = header.get("__metadata__") or {}
+    return {
+        "format": _key_format(names),
+        "canonical": metadata.get(CANONICAL_FORMAT_KEY) == CANONICAL_FORMAT,
+        "rank": max(ranks) if ranks else None,
+        "ranks": sorted(ranks),
+        "target_modules": sorted(target_modules),
+        "components": sorted(components),
+        "layers": len(layers),
+        "dtype": dtypes.most_common(1)[0][0] if dtypes else None,
+        "param_count": param_count,
+        "tensor_bytes": tensor_bytes,
+        "file_size": os.path.getsize(path),
+    }
+
+
+def estimate_adapter_bytes(inspection: Dict[str, Any], element_size: int) -> int:
+    """
+    Memory an adapter takes once loaded into a pipeline.
+
+    diffusers casts adapter weights to the pipeline dtype, so the resident size
+    is the parameter count at that dtype's element size, not the file size.
+
+    Args:
+        inspection: Result of inspect_lora()
+        element_size: Bytes per element of the serving dtype (2 for fp16)
+
+    Returns:
+        Estimated resident size in bytes
+    """
+    return inspection["param_count"] * element_size
@@ -7,40 +7,193 @@ Phase 2: Added LRU cache for performance optimization
 
 import os
 import json
+import time
 import logging
 import threading
 from typing import Optional, Dict, Any, Tuple, List
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import torch
 from diffusers import StableDiffusionPipeline
+from safetensors.torch import load_file
+from lora_cache_policies import POLICIES, CachePolicy, create_policy
+from lora_registry import LoRARegistry, LORA_FILE_NAMES, EMBEDDING_FILE_NAMES
+from lora_store import read_manifest
+from lora_inspect import inspect_lora, estimate_adapter_bytes, verify_safetensors_file, infer_lora_rank
+from lora_mmap import mmap_state_dict, get_shared_copy
 
 logger = logging.getLogger(__name__)
 
 # Default LoRA directory
 LORA_BASE_DIR = os.getenv("LORA_BASE_DIR", "loras")
 
+# In-memory registry of deployed adapters, kept current by a watcher thread
+LORA_REGISTRY_ENABLED = os.getenv("LORA_REGISTRY_ENABLED", "true").lower() == "true"
+LORA_REGISTRY_POLL_INTERVAL = float(os.getenv("LORA_REGISTRY_POLL_INTERVAL", "5"))
+_registry = LoRARegistry(LORA_BASE_DIR, poll_interval=LORA_REGISTRY_POLL_INTERVAL)
+
 # Phase 2: Cache configuration
 LORA_CACHE_ENABLED = os.getenv("LORA_CACHE_ENABLED", "true").lower() == "true"
 LORA_CACHE_MAX_SIZE = int(os.getenv("LORA_CACHE_MAX_SIZE", "5"))
+# Eviction policy: lru (default), lfu, arc or wtinylfu (see lora_cache_policies.py)
+LORA_CACHE_POLICY = os.getenv("LORA_CACHE_POLICY", "lru").lower()
+# Memory budget for resident adapters, estimated from safetensors headers before
+# loading (0 = off; only applies to "adapter" fuse mode)
+LORA_CACHE_MAX_MB = float(os.getenv("LORA_CACHE_MAX_MB", "0"))
+
+
+def _create_cache_policy(name: str) -> CachePolicy:
+    """Create the configured eviction policy, falling back to LRU on a bad name"""
+    try:
+        return create_policy(name, LORA_CACHE_MAX_SIZE)
+    except ValueError as e:
+        logger.warning(f"[LORA-CACHE] {str(e)}, falling back to lru")
+        return create_policy("lru", LORA_CACHE_MAX_SIZE)
 
-# Phase 2: LRU Cache for loaded LoRA pipelines
-# Key: (normalized_brand_id, lora_weight) tuple
+
+# Phase 2: Cache for loaded LoRA pipelines
+# Key: (lora_key, lora_weight) tuple; lora_key is normalized_brand_id, or
+#      normalized_brand_id@version_id for a pinned version
 # Value: Pipeline with LoRA loaded (we'll store a reference, not the actual pipeline)
-_lora_cache: OrderedDict = OrderedDict()
+# Which keys stay cached is decided by _cache_policy
+_lora_cache: Dict[Tuple[str, float], StableDiffusionPipeline] = {}
+_cache_policy = _create_cache_policy(LORA_CACHE_POLICY)
 _cache_lock = threading.Lock()
 _cache_stats = {
     "hits": 0,
     "misses": 0,
     "evictions": 0,
+    "budget_evictions": 0,
+    "budget_rejections": 0,
+    "admission_rejections": 0,
     "size": 0
 }
+# Estimated resident size of each cached adapter (tracked when LORA_CACHE_MAX_MB is set)
+# Key: lora_key, Value: bytes
+_adapter_bytes: Dict[str, int] = {}
+# Shadow policies see the same lookups as the real cache (keys only), so
+# get_cache_stats() can report what every policy's hit rate would be
+_shadow_policies: Dict[str, Dict[str, Any]] = {
+    name: {"policy": create_policy(name, LORA_CACHE_MAX_SIZE), "hits": 0, "misses": 0}
+    for name in POLICIES if name != _cache_policy.name
+}
+# Adapter names evicted (or superseded by a reload) while a job may still be
+# using them; deleted at unload time once no job holds them
+_pending_adapter_deletions: set = set()
+# Jobs currently using each adapter (held from activation until the job's unload)
+# Key: adapter name, Value: number of jobs
+_adapter_refs: Dict[str, int] = {}
+# Adapter names held by the job running on this thread
+_job_adapters = threading.local()
+
+# Hot reload: bumped when a brand's adapter file is redeployed, so the new
+# version loads under a fresh adapter name while in-flight jobs keep the old one
+# Key: normalized_brand_id, Value: generation number
+_adapter_generations: Dict[str, int] = {}
+_reload_stats = {
+    "scheduled": 0,
+    "completed": 0,
+    "failed": 0
+}
+# Reloads queued but not finished, so one file change schedules one reload
+# Key: normalized_brand_id, Value: sha256 of the version being loaded
+_pending_reloads: Dict[str, Optional[str]] = {}
+
+# Serializes adapter uploads published through deploy_uploaded_lora()
+_deploy_lock = threading.Lock()
+
+# Fuse mode: "adapter" keeps PEFT adapters active during inference (default),
+# "delta" adds cached per-layer B@A*scale deltas straight into the base weights
+LORA_FUSE_MODE = os.getenv("LORA_FUSE_MODE", "adapter").lower()
+LORA_DELTA_CACHE_MAX_SIZE = int(os.getenv("LORA_DELTA_CACHE_MAX_SIZE", "3"))
+# Restore touched weights from the pristine snapshot every N unfuses (0 = never)
+LORA_DELTA_RESTORE_INTERVAL = int(os.getenv("LORA_DELTA_RESTORE_INTERVAL", "25"))
+
+# Delta cache for "delta" fuse mode
+# Key: lora_key (normalized_brand_id, or normalized_brand_id@version_id for pinned versions)
+# Value: {(component_name, module_name): delta tensor at scale 1.0}
+_delta_cache: OrderedDict = OrderedDict()
+# Deltas currently added into the base weights: (lora_key, lora_weight, deltas)
+_fused_deltas: List[Tuple[str, float, Dict[Tuple[str, str], torch.Tensor]]] = []
+# Copies of base weights taken before any delta touched them (kept on CPU)
+_pristine_weights: Dict[Tuple[str, str], torch.Tensor] = {}
+_delta_lock = threading.RLock()
+_delta_stats = {
+    "computed": 0,
+    "fuses": 0,
+    "unfuses": 0,
+    "restores": 0,
+    "evictions": 0
+}
+
+# Usage stats: per-brand request counts and recency, used to pick startup preloads
+LORA_USAGE_STATS_FILE = os.getenv("LORA_USAGE_STATS_FILE", os.path.join(LORA_BASE_DIR, "usage_stats.json"))
+LORA_USAGE_FLUSH_INTERVAL = float(os.getenv("LORA_USAGE_FLUSH_INTERVAL", "60"))
+# Requests older than this count half as much when ranking brands
+LORA_USAGE_HALF_LIFE_HOURS = float(os.getenv("LORA_USAGE_HALF_LIFE_HOURS", "72"))
+
+# Access trace for simulate_lora_cache.py: one JSON line per LoRA request (empty = off)
+LORA_ACCESS_TRACE_FILE = os.getenv("LORA_ACCESS_TRACE_FILE", "")
+_trace_lock = threading.Lock()
 
+# Key: normalized_brand_id
+# Value: {"count": int, "last_used": unix timestamp}
+_usage_stats: Optional[Dict[str, Dict[str, Any]]] = None
+_usage_lock = threading.Lock()
+_usage_last_flush = 0.0
 
-def get_lora_path(brand_id: str) -> Optional[str]:
+# Prefetch: read/parse adapter files on a background I/O thread at enqueue time
+LORA_PREFETCH_ENABLED = os.getenv("LORA_PREFETCH_ENABLED", "true").lower() == "true"
+LORA_PREFETCH_MAX_ENTRIES = int(os.getenv("LORA_PREFETCH_MAX_ENTRIES", "8"))
+
+# Key: lora_key (normalized_brand_id, or normalized_brand_id@version_id for pinned versions)
+# Value: Future resolving to (lora_path, state_dict) or None if no LoRA file exists
+_prefetch_buffer: OrderedDict = OrderedDict()
+_prefetch_lock = threading.Lock()
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lora-prefetch")
+_prefetch_stats = {
+    "submitted": 0,
+    "hits": 0,
+    "misses": 0,
+    "errors": 0
+}
+
+# Memory-mapped loading: adapter tensors point into a shared page-cache mapping
+# of the file instead of private copies, so worker processes on a host share them
+LORA_MMAP_ENABLED = os.getenv("LORA_MMAP_ENABLED", "true").lower() == "true"
+# Optional host-wide copy location, ideally tmpfs (e.g. /dev/shm/mayvn-loras); empty = map files in place
+LORA_SHARED_CACHE_DIR = os.getenv("LORA_SHARED_CACHE_DIR", "")
+LORA_SHARED_CACHE_MAX_MB = float(os.getenv("LORA_SHARED_CACHE_MAX_MB", "2048"))
+_mmap_lock = threading.Lock()
+_mmap_stats = {
+    "mapped": 0,
+    "shared_cache_errors": 0
+}
+
+
+# Textual-inversion style embeddings: a brand token (<{brand_id}_style>) added to
+# the tokenizer/text encoder once and kept resident, so requests can carry a
+# brand's aesthetic without swapping an adapter
+LORA_EMBEDDINGS_PRELOAD = os.getenv("LORA_EMBEDDINGS_PRELOAD", "true").lower() == "true"
+_embedding_lock = threading.Lock()
+# Key: normalized_brand_id, Value: {"token", "path", "mtime"} of the loaded embedding
+_loaded_embeddings: Dict[str, Dict[str, Any]] = {}
+# Bumped whenever style embeddings are loaded or unloaded (changes token vectors)
+_embedding_version = 0
+
+# LoRAs currently applied to the text encoder, as (adapter name, weight); with the
+# embedding version this is the text encoder state prompt-embedding caches key on
+_text_encoder_loras: List[Tuple[str, float]] = []
+
+
+def get_lora_path(brand_id: str, version: Optional[str] = None) -> Optional[str]:
     """
     Get the path to a LoRA file for a given brand ID
     
     Args:
         brand_id: The brand identifier (will be normalized)
+        version: Optional deployed version (version id or sha256 prefix);
+                 the currently published file is used if omitted
         
     Returns:
         Path to LoRA file if exists, None otherwise
@@ -51,8 +204,21 @@ def get_lora_path(brand_id: str) -> Optional[str]:
     # Normalize brand_id for filesystem
     normalized_id = normalize_brand_id(brand_id)
     
+    if not _is_current_version(version):
+        resolved = resolve_lora_version(normalized_id, version)
+        return resolved[1] if resolved else None
+    
+    if _registry.started:
+        # Registry lookup: no disk access on the hot path
+        lora_path = _registry.get_lora_path(normalized_id)
+        if lora_path:
+            logger.debug(f"[LORA] Found LoRA at: {lora_path}")
+        else:
+            logger.warning(f"[LORA] No LoRA found for brand_id: {normalized_id} in registry")
+        return lora_path
+    
     # Try different possible LoRA file names
-    possible_names = ["style.safetensors", "lora.safetensors", f"{normalized_id}.safetensors"]
+    possible_names = LORA_FILE_NAMES + [f"{normalized_id}.safetensors"]
     
     brand_dir = os.path.join(LORA_BASE_DIR, normalized_id)
     
@@ -66,36 +232,167 @@ def get_lora_path(brand_id: str) -> Optional[str]:
     return None
 
 
-def _get_cache_key(brand_id: str, lora_weight: float) -> Tuple[str, float]:
-    """Generate cache key from brand_id and lora_weight"""
+def _is_current_version(version: Optional[str]) -> bool:
+    """True if a requested version means the currently published file"""
+    return not version or version.strip().lower() in ("current", "latest")
+
+
+def resolve_lora_version(brand_id: str, version: str) -> Optional[Tuple[str, str]]:
+    """
+    Resolve a requested adapter version to a stored file
+    
+    Versions are the content-hash directories deploy_lora.py creates under
+    loras/<brand_id>/versions/, so every version stays loadable after newer
+    ones are published.
+    
+    Args:
+        brand_id: The brand identifier (will be normalized)
+        version: Version id or a unique prefix of it (or of the file's sha256)
+        
+    Returns:
+        Tuple of (version_id, lora_path), or None if no single version matches
+    """
     normalized_id = normalize_brand_id(brand_id)
-    return (normalized_id, lora_weight)
+    brand_dir = os.path.join(LORA_BASE_DIR, normalized_id)
+    
+    if _registry.started:
+        entry = _registry.get(normalized_id)
+        manifest = entry["manifest"] if entry else None
+    else:
+        try:
+            manifest = read_manifest(brand_dir)
+        except Exception as e:
+            logger.warning(f"[LORA] Could not read deployment manifest for {normalized_id}: {str(e)}")
+            manifest = None
+    
+    if not manifest:
+        logger.warning(f"[LORA] No versioned deployments for brand_id: {normalized_id}")
+        return None
+    
+    requested = version.strip().lower()
+    versions = manifest.get("versions", {})
+    matches = [
+        version_id for version_id, info in versions.items()
+        if version_id.startswith(requested) or info.get("sha256", "").startswith(requested)
+    ]
+    if len(matches) != 1:
+        reason = "is ambiguous" if matches else "not found"
+        logger.warning(f"[LORA] Version '{version}' {reason} for brand_id: {normalized_id}")
+        return None
+    
+    version_id = matches[0]
+    lora_path = os.path.join(brand_dir, versions[version_id]["file"])
+    if not _registry.started and not os.path.exists(lora_path):
+        logger.warning(f"[LORA] Version {version_id} of {normalized_id} is missing on disk: {lora_path}")
+        return None
+    return version_id, lora_path
 
 
-def _is_cached(brand_id: str, lora_weight: float) -> bool:
+def get_lora_inspection(brand_id: str, lora_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get adapter properties read from the safetensors header only
+    
+    Served from the registry when it indexed this file, otherwise the header
+    is read (no tensor data is loaded either way).
+    
+    Args:
+        brand_id: The brand identifier (will be normalized)
+        lora_path: Adapter file to inspect (defaults to the brand's current file)
+        
+    Returns:
+        Dictionary with format, rank, ranks, target_modules, components, layers,
+        dtype, param_count, tensor_bytes and file_size; None if unavailable
+    """
+    normalized_id = normalize_brand_id(brand_id)
+    lora_path = lora_path or get_lora_path(normalized_id)
+    if not lora_path or os.path.isdir(lora_path):
+        return None
+    
+    if _registry.started:
+        entry = _registry.get(normalized_id)
+        if entry and entry["lora_path"] == lora_path and entry["inspection"] is not None:
+            return entry["inspection"]
+    
+    try:
+        return inspect_lora(lora_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[LORA] Could not inspect {lora_path}: {str(e)}")
+        return None
+
+
+def _get_element_size(pipe: StableDiffusionPipeline) -> int:
+    """Bytes per element of the pipeline's serving dtype (adapters are cast to it on load)"""
+    try:
+        return torch.finfo(pipe.unet.dtype).bits // 8
+    except Exception:
+        return 2
+
+
+def _get_lora_key(normalized_id: str, version_id: Optional[str] = None) -> str:
+    """Identity of a loaded adapter: the brand, or brand@version for a pinned version"""
+    return f"{normalized_id}@{version_id}" if version_id else normalized_id
+
+
+def start_lora_registry() -> bool:
+    """
+    Build the in-memory LoRA registry and start watching LORA_BASE_DIR
+    
+    After this, get_lora_path(), list_available_loras() and the metadata
+    getters are served from memory instead of probing the filesystem.
+    
+    Returns:
+        True if the registry is running, False if disabled or failed
+    """
+    if not LORA_REGISTRY_ENABLED:
+        logger.info("[LORA-REGISTRY] Registry disabled, probing filesystem per request")
+        return False
+    try:
+        _registry.start()
+        return True
+    except Exception as e:
+        logger.error(f"[LORA-REGISTRY] Failed to start registry, probing filesystem per request: {str(e)}")
+        return False
+
+
+def _refresh_registry(normalized_id: str):
+    """Pick up files this process just wrote without waiting for the watcher"""
+    if _registry.started:
+        _registry.refresh(normalized_id)
+
+
+def _get_cache_key(brand_id: str, lora_weight: float, version_id: Optional[str] = None) -> Tuple[str, float]:
+    """Generate cache key from brand_id, version and lora_weight"""
+    normalized_id = normalize_brand_id(brand_id)
+    return (_get_lora_key(normalized_id, version_id), lora_weight)
+
+
+def _is_cached(brand_id: str, lora_weight: float, version_id: Optional[str] = None) -> bool:
     """Check if LoRA is in cache"""
     if not LORA_CACHE_ENABLED:
         return False
     
-    cache_key = _get_cache_key(brand_id, lora_weight)
+    cache_key = _get_cache_key(brand_id, lora_weight, version_id)
     with _cache_lock:
         return cache_key in _lora_cache
 
 
-def _get_from_cache(brand_id: str, lora_weight: float) -> Optional[StableDiffusionPipeline]:
-    """Get pipeline from cache (returns None if not cached)"""
+def _get_from_cache(brand_id: str, lora_weight: float, version_id: Optional[str] = None) -> Optional[StableDiffusionPipeline]:
+    """Look up pipeline in cache, recording the access with the policy (returns None if not cached)"""
     if not LORA_CACHE_ENABLED:
         return None
     
-    cache_key = _get_cache_key(brand_id, lora_weight)
+    cache_key = _get_cache_key(brand_id, lora_weight, version_id)
     with _cache_lock:
-        if cache_key in _lora_cache:
-            # Move to end (most recently used)
-            _lora_cache.move_to_end(cache_key)
+        for shadow in _shadow_policies.values():
+            if shadow["policy"].access(cache_key):
+                shadow["hits"] += 1
+            else:
+                shadow["misses"] += 1
+                shadow["policy"].admit(cache_key)
+        
+        if _cache_policy.access(cache_key) and cache_key in _lora_cache:
             _cache_stats["hits"] += 1
             logger.debug(f"[LORA-CACHE] Cache HIT for {brand_id} (weight: {lora_weight})")
-            # Note: We can't actually cache the pipeline itself because it's modified in-place
-            # Instead, we'll use the cache to track which LoRAs are "ready" and skip reloading
             return _lora_cache[cache_key]
         else:
             _cache_stats["misses"] += 1
@@ -103,28 +400,122 @@ def _get_from_cache(brand_id: str, lora_weight: float) -> Optional[StableDiffusi
             return None
 
 
-def _add_to_cache(brand_id: str, lora_weight: float, pipe: StableDiffusionPipeline):
+def _evict_cache_key(evicted_key: Tuple[str, float], reason: str):
+    """
+    Drop a key the policy evicted, scheduling its adapter for deletion (caller holds _cache_lock)
+    
+    A key that was never cached is an admission rejection (W-TinyLFU turning
+    down a new brand); its adapter was loaded for the job and is freed the
+    same way, but it is counted separately from evictions.
+    """
+    if _lora_cache.pop(evicted_key, None) is not None:
+        _cache_stats["evictions"] += 1
+        logger.info(f"[LORA-CACHE] Evicted {evicted_key[0]} from cache (policy: {_cache_policy.name}, {reason})")
+    else:
+        _cache_stats["admission_rejections"] += 1
+        logger.info(f"[LORA-CACHE] Not admitting {evicted_key[0]} (policy: {_cache_policy.name})")
+    # Free the resident adapter once no weight variant of the brand (version) is cached
+    if not any(key[0] == evicted_key[0] for key in _lora_cache):
+        _pending_adapter_deletions.add(_get_adapter_name(evicted_key[0]))
+        _adapter_bytes.pop(evicted_key[0], None)
+
+
+def _get_resident_bytes() -> int:
+    """Estimated size of all cached adapters (caller holds _cache_lock)"""
+    return sum(_adapter_bytes.get(lora_key, 0) for lora_key in {key[0] for key in _lora_cache})
+
+
+def _enforce_memory_budget():
+    """Evict policy victims until the cached adapters fit LORA_CACHE_MAX_MB (caller holds _cache_lock)"""
+    if LORA_CACHE_MAX_MB <= 0:
+        return
+    budget = LORA_CACHE_MAX_MB * 1024 * 1024
+    while _get_resident_bytes() > budget:
+        victim = _cache_policy.evict()
+        if victim is None:
+            break
+        _cache_stats["budget_evictions"] += 1
+        _evict_cache_key(victim, f"memory budget: {LORA_CACHE_MAX_MB:g} MB")
+
+
+def _add_to_cache(
+    brand_id: str,
+    lora_weight: float,
+    pipe: StableDiffusionPipeline,
+    version_id: Optional[str] = None,
+    adapter_bytes: Optional[int] = None
+):
     """Add pipeline to cache (stores reference for tracking)"""
     if not LORA_CACHE_ENABLED:
         return
     
-    cache_key = _get_cache_key(brand_id, lora_weight)
+    cache_key = _get_cache_key(brand_id, lora_weight, version_id)
     with _cache_lock:
-        # If cache is full, remove least recently used
-        if len(_lora_cache) >= LORA_CACHE_MAX_SIZE and cache_key not in _lora_cache:
-            # Remove oldest (first) item
-            oldest_key = next(iter(_lora_cache))
-            del _lora_cache[oldest_key]
-            _cache_stats["evictions"] += 1
-            logger.info(f"[LORA-CACHE] Evicted {oldest_key[0]} from cache (max size: {LORA_CACHE_MAX_SIZE})")
-        
-        # Add or update cache entry
-        _lora_cache[cache_key] = pipe  # Store reference
-        _lora_cache.move_to_end(cache_key)  # Mark as most recently used
+        for evicted_key in _cache_policy.admit(cache_key):
+            _evict_cache_key(evicted_key, f"max size: {LORA_CACHE_MAX_SIZE}")
+        
+        if cache_key in _cache_policy:
+            _lora_cache[cache_key] = pipe  # Store reference
+            _pending_adapter_deletions.discard(_get_adapter_name(cache_key[0]))
+            if adapter_bytes is not None:
+                _adapter_bytes[cache_key[0]] = adapter_bytes
+        _enforce_memory_budget()
         _cache_stats["size"] = len(_lora_cache)
         logger.debug(f"[LORA-CACHE] Added {brand_id} to cache (weight: {lora_weight}, cache size: {len(_lora_cache)})")
 
 
+def _acquire_adapter(lora_key: str) -> str:
+    """Adapter name of a brand (version), held for the current job until unload_lora_weights()"""
+    with _cache_lock:
+        adapter_name = _get_adapter_name(lora_key)
+        _adapter_refs[adapter_name] = _adapter_refs.get(adapter_name, 0) + 1
+    if not hasattr(_job_adapters, "names"):
+        _job_adapters.names = []
+    _job_adapters.names.append(adapter_name)
+    return adapter_name
+
+
+def _release_job_adapters():
+    """Release the adapters the current job acquired"""
+    names = getattr(_job_adapters, "names", None)
+    if not names:
+        return
+    with _cache_lock:
+        for adapter_name in names:
+            remaining = _adapter_refs.get(adapter_name, 0) - 1
+            if remaining > 0:
+                _adapter_refs[adapter_name] = remaining
+            else:
+                _adapter_refs.pop(adapter_name, None)
+    names.clear()
+
+
+def _delete_evicted_adapters(pipe: StableDiffusionPipeline):
+    """
+    Delete adapters evicted or superseded since the last job (called once LoRA is disabled)
+    
+    Adapters another running job still holds stay pending until that job unloads.
+    """
+    with _cache_lock:
+        keep = {_get_adapter_name(key[0]) for key in _lora_cache}
+        _pending_adapter_deletions.difference_update(keep)
+        pending = [name for name in _pending_adapter_deletions if name not in _adapter_refs]
+        _pending_adapter_deletions.difference_update(pending)
+    for adapter_name in pending:
+        _delete_adapter(pipe, adapter_name)
+
+
+def _get_policy_hit_rates() -> Dict[str, float]:
+    """Hit rate per policy: the live one from real stats, the others from shadows (caller holds _cache_lock)"""
+    def rate(hits: int, misses: int) -> float:
+        return hits / (hits + misses) if (hits + misses) > 0 else 0.0
+    
+    hit_rates = {_cache_policy.name: rate(_cache_stats["hits"], _cache_stats["misses"])}
+    for name, shadow in _shadow_policies.items():
+        hit_rates[name] = rate(shadow["hits"], shadow["misses"])
+    return hit_rates
+
+
 def get_cache_stats() -> Dict[str, Any]:
     """Get cache statistics"""
     with _cache_lock:
@@ -132,22 +523,784 @@ def get_cache_stats() -> Dict[str, Any]:
             "enabled": LORA_CACHE_ENABLED,
             "max_size": LORA_CACHE_MAX_SIZE,
             "current_size": len(_lora_cache),
+            "policy": _cache_policy.name,
             "hits": _cache_stats["hits"],
             "misses": _cache_stats["misses"],
             "evictions": _cache_stats["evictions"],
-            "hit_rate": _cache_stats["hits"] / (_cache_stats["hits"] + _cache_stats["misses"]) if (_cache_stats["hits"] + _cache_stats["misses"]) > 0 else 0.0
+            "max_mb": LORA_CACHE_MAX_MB,
+            "resident_mb": _get_resident_bytes() / (1024 * 1024),
+            "budget_evictions": _cache_stats["budget_evictions"],
+            "budget_rejections": _cache_stats["budget_rejections"],
+            "admission_rejections": _cache_stats["admission_rejections"],
+            "hit_rate": _cache_stats["hits"] / (_cache_stats["hits"] + _cache_stats["misses"]) if (_cache_stats["hits"] + _cache_stats["misses"]) > 0 else 0.0,
+            "policy_hit_rates": _get_policy_hit_rates(),
+            "fuse_mode": LORA_FUSE_MODE,
+            "delta_cache": _get_delta_cache_stats(),
+            "prefetch": _get_prefetch_stats(),
+            "mmap": _get_mmap_stats(),
+            "style_embeddings": len(_loaded_embeddings),
+            "reloads": dict(_reload_stats)
         }
 
 
-def clear_cache():
-    """Clear the LoRA cache"""
+def clear_cache(pipe: Optional[StableDiffusionPipeline] = None):
+    """Clear the LoRA cache (and delete the resident adapters if pipe is given)"""
     with _cache_lock:
+        if pipe is not None:
+            for brand in {key[0] for key in _lora_cache}:
+                _delete_adapter(pipe, _get_adapter_name(brand))
         _lora_cache.clear()
+        _cache_policy.clear()
+        _adapter_bytes.clear()
         _cache_stats["size"] = 0
         logger.info("[LORA-CACHE] Cache cleared")
+    with _delta_lock:
+        # Fused deltas hold their own reference, so clearing is safe mid-job
+        _delta_cache.clear()
+
+
+def _targets_text_encoder(lora_key: str, lora_path: str) -> bool:
+    """True if an adapter has text encoder layers (assumed when its header can't be inspected)"""
+    inspection = get_lora_inspection(lora_key.split("@")[0], lora_path)
+    if not inspection or not inspection.get("components"):
+        return True
+    return any(component.startswith("text_encoder") for component in inspection["components"])
+
+
+def get_text_encoder_state() -> Tuple:
+    """
+    Hashable description of what, besides the prompt, shapes the text encoder's output
+    
+    Covers the LoRAs applied to the text encoder (name includes the hot reload
+    generation) and the style embedding version. Used as part of the
+    prompt-embedding cache key (prompt_cache.py).
+    """
+    return tuple(_text_encoder_loras), _embedding_version
+
+
+def _get_adapter_name(lora_key: str) -> str:
+    """
+    Adapter name a brand's LoRA is loaded under in the pipeline
+    
+    Pinned versions get their own name ({brand}_{version}_adapter) so several
+    versions of a brand can be resident side by side. The current version's
+    name changes on hot reload; pinned versions are immutable and never reload.
+    """
+    base_name = lora_key.replace("@", "_")
+    generation = _adapter_generations.get(lora_key, 0)
+    if generation:
+        return f"{base_name}_v{generation}_adapter"
+    return f"{base_name}_adapter"
+
+
+def _is_adapter_loaded(pipe: StableDiffusionPipeline, adapter_name: str) -> bool:
+    """Check whether an adapter is still resident in the pipeline"""
+    try:
+        return any(adapter_name in names for names in pipe.get_list_adapters().values())
+    except Exception:
+        return False
+
+
+def _delete_adapter(pipe: StableDiffusionPipeline, adapter_name: str):
+    """Delete a resident adapter from the pipeline (non-critical)"""
+    if pipe is None or not _is_adapter_loaded(pipe, adapter_name):
+        return
+    try:
+        pipe.delete_adapters(adapter_name)
+        logger.info(f"[LORA-CACHE] Deleted adapter '{adapter_name}' from pipeline")
+    except Exception as e:
+        logger.debug(f"[LORA-CACHE] Could not delete adapter '{adapter_name}': {str(e)}")
+
+
+def _load_usage_stats() -> Dict[str, Dict[str, Any]]:
+    """Load usage stats from disk on first use (caller holds _usage_lock)"""
+    global _usage_stats
+    if _usage_stats is None:
+        _usage_stats = {}
+        try:
+            if os.path.exists(LORA_USAGE_STATS_FILE):
+                with open(LORA_USAGE_STATS_FILE, 'r', encoding='utf-8') as f:
+                    _usage_stats = json.load(f).get("brands", {})
+        except Exception as e:
+            logger.warning(f"[LORA-USAGE] Could not read usage stats, starting fresh: {str(e)}")
+    return _usage_stats
+
+
+def flush_usage_stats():
+    """Write usage stats to disk atomically (temp file + rename)"""
+    global _usage_last_flush
+    with _usage_lock:
+        stats = _load_usage_stats()
+        _usage_last_flush = time.time()
+        try:
+            os.makedirs(os.path.dirname(LORA_USAGE_STATS_FILE) or ".", exist_ok=True)
+            tmp_path = f"{LORA_USAGE_STATS_FILE}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"updated_at": _usage_last_flush, "brands": stats}, f, indent=2)
+            os.replace(tmp_path, LORA_USAGE_STATS_FILE)
+        except Exception as e:
+            logger.warning(f"[LORA-USAGE] Could not write usage stats: {str(e)}")
+
+
+def record_lora_usage(brand_id: str):
+    """Record one request for a brand (flushed to disk at most every LORA_USAGE_FLUSH_INTERVAL seconds)"""
+    normalized_id = normalize_brand_id(brand_id)
+    now = time.time()
+    with _usage_lock:
+        stats = _load_usage_stats()
+        entry = stats.setdefault(normalized_id, {"count": 0, "last_used": now})
+        entry["count"] += 1
+        entry["last_used"] = now
+        should_flush = now - _usage_last_flush >= LORA_USAGE_FLUSH_INTERVAL
+    if should_flush:
+        flush_usage_stats()
+
+
+def record_lora_access(brand_id: str, lora_weight: float, lora_path: str):
+    """Append one (timestamp, brand_id, weight, size_bytes) line to the access trace"""
+    if not LORA_ACCESS_TRACE_FILE:
+        return
+    try:
+        size_bytes = os.path.getsize(lora_path) if os.path.isfile(lora_path) else 0
+        line = json.dumps({
+            "timestamp": time.time(),
+            "brand_id": normalize_brand_id(brand_id),
+            "weight": lora_weight,
+            "size_bytes": size_bytes
+        })
+        with _trace_lock:
+            with open(LORA_ACCESS_TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+    except Exception as e:
+        logger.debug(f"[LORA-USAGE] Could not append to access trace: {str(e)}")
+
+
+def get_top_used_brands(top_k: int, memory_budget_mb: float) -> List[str]:
+    """
+    Rank brands by recency-weighted request count and pick those that fit the budget
+    
+    Args:
+        top_k: Maximum number of brands to return
+        memory_budget_mb: Total adapter size allowed across the returned brands
+        
+    Returns:
+        List of normalized brand_ids, most used first
+    """
+    now = time.time()
+    with _usage_lock:
+        stats = dict(_load_usage_stats())
+    
+    def score(entry: Dict[str, Any]) -> float:
+        age_hours = max(0.0, now - entry.get("last_used", 0)) / 3600
+        return entry.get("count", 0) * 0.5 ** (age_hours / LORA_USAGE_HALF_LIFE_HOURS)
+    
+    selected = []
+    remaining_bytes = memory_budget_mb * 1024 * 1024
+    for brand_id, entry in sorted(stats.items(), key=lambda item: score(item[1]), reverse=True):
+        if len(selected) >= top_k:
+            break
+        lora_path = get_lora_path(brand_id)
+        if not lora_path or os.path.isdir(lora_path):
+            continue
+        size = os.path.getsize(lora_path)
+        if size > remaining_bytes:
+            logger.info(f"[LORA-USAGE] Skipping {brand_id} ({size / 1024 / 1024:.1f} MB): exceeds remaining preload budget")
+            continue
+        selected.append(brand_id)
+        remaining_bytes -= size
+    return selected
+
+
+def _get_known_sha256(normalized_id: str, lora_path: str) -> Optional[str]:
+    """Content hash of an adapter file from the registry or deploy manifest (None if not indexed)"""
+    entry = _registry.get(normalized_id) if _registry.started else None
+    if not entry:
+        return None
+    if entry["lora_path"] == lora_path:
+        return entry["sha256"]
+    brand_dir = os.path.join(LORA_BASE_DIR, normalized_id)
+    for info in (entry["manifest"] or {}).get("versions", {}).values():
+        if os.path.join(brand_dir, info.get("file", "")) == lora_path:
+            return info.get("sha256")
+    return None
 
 
-def load_lora_weights(pipe: StableDiffusionPipeline, brand_id: Optional[str], lora_weight: float = 0.8) -> StableDiffusionPipeline:
+def _read_adapter_tensors(lora_path: str, lora_key: Optional[str] = None, populate: bool = False) -> Dict[str, torch.Tensor]:
+    """
+    Read an adapter file into CPU tensors
+    
+    With LORA_MMAP_ENABLED the tensors are backed by a memory mapping (of the
+    copy in LORA_SHARED_CACHE_DIR if set), so they cost no private memory and
+    are shared with every other process on the host that maps the same file.
+    
+    Args:
+        lora_path: Adapter file
+        lora_key: Brand (or brand@version) the file belongs to, to look up its hash
+        populate: Page the mapping in now (prefetch)
+        
+    Returns:
+        Dictionary of tensor name -> CPU tensor
+    """
+    if not LORA_MMAP_ENABLED:
+        return load_file(lora_path, device="cpu")
+    
+    mapped_path = lora_path
+    if LORA_SHARED_CACHE_DIR:
+        try:
+            sha256 = _get_known_sha256(lora_key.split("@")[0], lora_path) if lora_key else None
+            mapped_path = get_shared_copy(lora_path, LORA_SHARED_CACHE_DIR, sha256, int(LORA_SHARED_CACHE_MAX_MB * 1024 * 1024))
+        except OSError as e:
+            logger.warning(f"[LORA-MMAP] Shared cache unavailable, mapping {lora_path} in place: {str(e)}")
+            with _mmap_lock:
+                _mmap_stats["shared_cache_errors"] += 1
+    
+    state_dict = mmap_state_dict(mapped_path, populate=populate)
+    with _mmap_lock:
+        _mmap_stats["mapped"] += 1
+    return state_dict
+
+
+def _get_mmap_stats() -> Dict[str, Any]:
+    """Get memory-mapped loading statistics"""
+    with _mmap_lock:
+        return {
+            "enabled": LORA_MMAP_ENABLED,
+            "shared_cache_dir": LORA_SHARED_CACHE_DIR or None,
+            "shared_cache_max_mb": LORA_SHARED_CACHE_MAX_MB,
+            **_mmap_stats
+        }
+
+
+def _read_lora_file(normalized_id: str, version_id: Optional[str] = None) -> Optional[Tuple[str, Dict[str, torch.Tensor]]]:
+    """Resolve and parse a brand's LoRA file into host memory (runs on the prefetch thread)"""
+    lora_path = get_lora_path(normalized_id, version_id)
+    if not lora_path or os.path.isdir(lora_path):
+        return None
+    state_dict = _read_adapter_tensors(lora_path, _get_lora_key(normalized_id, version_id), populate=True)
+    logger.info(f"[LORA-PREFETCH] Prefetched {len(state_dict)} tensors for {_get_lora_key(normalized_id, version_id)}")
+    return lora_path, state_dict
+
+
+def prefetch_lora(brand_id: Optional[str], version: Optional[str] = None) -> bool:
+    """
+    Start reading a brand's LoRA file into host memory in the background
+    
+    Called when a job is enqueued, so disk I/O and safetensors parsing overlap
+    with earlier jobs instead of sitting on the critical path when this job runs.
+    
+    Args:
+        brand_id: Brand identifier (will be normalized)
+        version: Optional pinned version (see resolve_lora_version)
+        
+    Returns:
+        True if a prefetch was scheduled or is already buffered, False otherwise
+    """
+    if not LORA_PREFETCH_ENABLED or not brand_id or brand_id == "default":
+        return False
+    
+    normalized_id = normalize_brand_id(brand_id)
+    version_id = None
+    if not _is_current_version(version):
+        resolved = resolve_lora_version(normalized_id, version)
+        if not resolved:
+            return False
+        version_id = resolved[0]
+    lora_key = _get_lora_key(normalized_id, version_id)
+    
+    if LORA_FUSE_MODE == "delta":
+        with _delta_lock:
+            if lora_key in _delta_cache:
+                # Deltas are already resident, the file won't be read again
+                return False
+    
+    with _prefetch_lock:
+        if lora_key in _prefetch_buffer:
+            _prefetch_buffer.move_to_end(lora_key)
+            return True
+        
+        future = _prefetch_executor.submit(_read_lora_file, normalized_id, version_id)
+        _prefetch_buffer[lora_key] = future
+        _prefetch_stats["submitted"] += 1
+        while len(_prefetch_buffer) > LORA_PREFETCH_MAX_ENTRIES:
+            _prefetch_buffer.popitem(last=False)
+    return True
+
+
+def _get_prefetched_state_dict(lora_key: Optional[str], lora_path: str) -> Optional[Dict[str, torch.Tensor]]:
+    """Get a prefetched state dict for a brand (version), waiting if its read is still in flight"""
+    if not lora_key:
+        return None
+    with _prefetch_lock:
+        future: Optional[Future] = _prefetch_buffer.get(lora_key)
+    if future is None:
+        with _prefetch_lock:
+            _prefetch_stats["misses"] += 1
+        return None
+    
+    try:
+        # Waiting on an in-flight read is still cheaper than starting a second one
+        prefetched = future.result()
+    except Exception as e:
+        logger.warning(f"[LORA-PREFETCH] Prefetch failed for {lora_key}: {str(e)}")
+        with _prefetch_lock:
+            _prefetch_buffer.pop(lora_key, None)
+            _prefetch_stats["errors"] += 1
+        return None
+    
+    with _prefetch_lock:
+        if prefetched is None or prefetched[0] != lora_path:
+            _prefetch_stats["misses"] += 1
+            return None
+        _prefetch_stats["hits"] += 1
+    return prefetched[1]
+
+
+def _get_prefetch_stats() -> Dict[str, Any]:
+    """Get prefetch buffer statistics"""
+    with _prefetch_lock:
+        return {
+            "enabled": LORA_PREFETCH_ENABLED,
+            "max_entries": LORA_PREFETCH_MAX_ENTRIES,
+            "buffered_brands": list(_prefetch_buffer.keys()),
+            **_prefetch_stats
+        }
+
+
+def _reload_adapter(normalized_id: str, sha256: Optional[str] = None):
+    """
+    Load a redeployed adapter in the background, then swap it in (runs on the prefetch thread)
+    
+    The new file is parsed into host memory first; only then is the brand's
+    generation bumped, so jobs that start afterwards load the new version under
+    a fresh adapter name. Jobs already running keep the old adapter (or their
+    fused deltas), which is deleted once the last of them unloads.
+    """
+    try:
+        _swap_in_adapter(normalized_id)
+    finally:
+        with _cache_lock:
+            if normalized_id in _pending_reloads and _pending_reloads[normalized_id] == sha256:
+                del _pending_reloads[normalized_id]
+
+
+def _swap_in_adapter(normalized_id: str):
+    """Read a brand's current adapter file and make it the version new jobs load"""
+    try:
+        prefetched = _read_lora_file(normalized_id)
+    except Exception as e:
+        logger.error(f"[LORA-RELOAD] Failed to read new version for {normalized_id}, keeping old one: {str(e)}")
+        with _cache_lock:
+            _reload_stats["failed"] += 1
+        return
+    
+    ready: Future = Future()
+    ready.set_result(prefetched)
+    
+    with _cache_lock:
+        old_adapter_name = _get_adapter_name(normalized_id)
+        _adapter_generations[normalized_id] = _adapter_generations.get(normalized_id, 0) + 1
+        for key in [key for key in _lora_cache if key[0] == normalized_id]:
+            del _lora_cache[key]
+            _cache_policy.remove(key)
+        _adapter_bytes.pop(normalized_id, None)
+        _cache_stats["size"] = len(_lora_cache)
+        _pending_adapter_deletions.add(old_adapter_name)
+        _reload_stats["completed"] += 1
+    with _delta_lock:
+        # Fused deltas of in-flight jobs hold their own reference
+        _delta_cache.pop(normalized_id, None)
+    with _prefetch_lock:
+        if prefetched is not None:
+            _prefetch_buffer[normalized_id] = ready
+            _prefetch_buffer.move_to_end(normalized_id)
+        else:
+            _prefetch_buffer.pop(normalized_id, None)
+    
+    logger.info(f"[LORA-RELOAD] Swapped in new version of {normalized_id} (adapter: {_get_adapter_name(normalized_id)})")
+
+
+def reload_lora(brand_id: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Reload a brand's adapter without restarting the service
+    
+    Re-reads the brand in the registry; if the adapter file changed (by mtime
+    and content hash), or force is set, the new version is loaded in the
+    background and swapped in for subsequent jobs.
+    
+    Args:
+        brand_id: Brand identifier (will be normalized)
+        force: Reload even if the file looks unchanged
+        
+    Returns:
+        Dictionary with the brand_id, whether a reload is scheduled (by this
+        call or already pending) and the current sha256
+    """
+    normalized_id = normalize_brand_id(brand_id)
+    if _registry.started:
+        # A detected change schedules the reload through _on_registry_change
+        _registry.refresh(normalized_id)
+    entry = _registry.get(normalized_id) if _registry.started else None
+    with _cache_lock:
+        # Also pending when the watcher saw the change first
+        scheduled = normalized_id in _pending_reloads
+    if force and not scheduled:
+        scheduled = _schedule_adapter_reload(normalized_id, entry["sha256"] if entry else None)
+    
+    return {
+        "brand_id": normalized_id,
+        "reload_scheduled": scheduled,
+        "sha256": entry["sha256"] if entry else None
+    }
+
+
+def deploy_uploaded_lora(
+    brand_id: str,
+    upload_path: str,
+    upload_sha256: str,
+    source_name: Optional[str] = None,
+    normalize: bool = True
+) -> Dict[str, Any]:
+    """
+    Publish an uploaded adapter file as the brand's current version
+    
+    Runs the same steps as deploy_lora.py (canonical conversion, content-addressed
+    version store, atomic publish), then refreshes the registry so the next job
+    uses it; resident adapters of the brand are hot reloaded. Blocking: call it
+    off the event loop.
+    
+    Args:
+        brand_id: Brand identifier (will be normalized)
+        upload_path: Received file (removed by the caller)
+        upload_sha256: sha256 of the received bytes; if the current version was
+                       deployed from identical bytes, nothing is redeployed
+        source_name: Original file name, recorded in the manifest
+        normalize: Convert to the canonical format before publishing
+        
+    Returns:
+        Dictionary with brand_id, version, sha256, upload_sha256, size_bytes,
+        rank, canonical, published and reload_scheduled
+        
+    Raises:
+        ValueError: If the upload is not a complete safetensors file with LoRA tensors
+        RuntimeError: If publishing failed
+    """
+    # Imported here: the deploy script configures CLI logging at import time
+    from deploy_lora import deploy_lora
+    from pathlib import Path
+    
+    normalized_id = normalize_brand_id(brand_id)
+    header = verify_safetensors_file(upload_path)
+    if infer_lora_rank(header) is None:
+        raise ValueError("Upload contains no LoRA down/up tensors")
+    
+    brand_dir = os.path.join(LORA_BASE_DIR, normalized_id)
+    # The store's temp files are named by pid, so deployments in this process take turns
+    with _deploy_lock:
+        manifest = read_manifest(brand_dir) if os.path.isdir(brand_dir) else None
+        current = (manifest or {}).get("versions", {}).get((manifest or {}).get("current"), {})
+        published = current.get("source_sha256") != upload_sha256
+        if published:
+            deployed = deploy_lora(
+                Path(upload_path), normalized_id,
+                show_next_steps=False,
+                normalize=normalize,
+                source_name=source_name,
+                source_sha256=upload_sha256
+            )
+            if not deployed:
+                raise RuntimeError(f"Deploying the upload for {normalized_id} failed, see service logs")
+            manifest = read_manifest(brand_dir)
+            current = manifest["versions"][manifest["current"]]
+        else:
+            logger.info(f"[LORA-UPLOAD] {normalized_id}: upload matches current version {manifest['current']}, skipping deploy")
+    
+    reload_result = reload_lora(normalized_id)
+    return {
+        "brand_id": normalized_id,
+        "version": manifest["current"],
+        "sha256": current.get("sha256"),
+        "upload_sha256": upload_sha256,
+        "size_bytes": current.get("size_bytes"),
+        "rank": current.get("rank"),
+        "canonical": current.get("canonical"),
+        "published": published,
+        "reload_scheduled": reload_result["reload_scheduled"],
+    }
+
+
+def _schedule_adapter_reload(normalized_id: str, sha256: Optional[str] = None) -> bool:
+    """
+    Queue a background reload on the adapter I/O thread
+    
+    Returns:
+        False if a reload of the same version (sha256) is already pending
+    """
+    with _cache_lock:
+        if normalized_id in _pending_reloads and _pending_reloads[normalized_id] == sha256:
+            return False
+        _pending_reloads[normalized_id] = sha256
+        _reload_stats["scheduled"] += 1
+    logger.info(f"[LORA-RELOAD] Adapter for {normalized_id} changed, loading new version in background")
+    _prefetch_executor.submit(_reload_adapter, normalized_id, sha256)
+    return True
+
+
+def _is_new_adapter_version(old_entry: Optional[Dict[str, Any]], new_entry: Optional[Dict[str, Any]]) -> bool:
+    """A reload is needed when an existing adapter's file or content hash changed"""
+    if not old_entry or not new_entry or not old_entry.get("lora_path") or not new_entry.get("lora_path"):
+        return False
+    return old_entry["lora_path"] != new_entry["lora_path"] or old_entry["sha256"] != new_entry["sha256"]
+
+
+def _on_registry_change(brand_id: str, old_entry: Optional[Dict[str, Any]], new_entry: Optional[Dict[str, Any]]):
+    """Registry watcher callback: hot reload adapters whose file was redeployed"""
+    if _is_new_adapter_version(old_entry, new_entry):
+        _schedule_adapter_reload(brand_id, new_entry["sha256"])
+
+
+_registry.on_change = _on_registry_change
+
+
+def _is_canonical_lora(lora_key: Optional[str], lora_path: str) -> bool:
+    """True if deploy_lora.py converted the file to canonical PEFT keys in the serving dtype"""
+    if not lora_key or os.path.isdir(lora_path):
+        return False
+    inspection = get_lora_inspection(lora_key.split("@")[0], lora_path)
+    return bool(inspection and inspection.get("canonical"))
+
+
+def _load_adapter(pipe: StableDiffusionPipeline, lora_path: str, adapter_name: str, lora_key: Optional[str] = None):
+    """Load a LoRA file or directory into the pipeline under adapter_name"""
+    state_dict = _get_prefetched_state_dict(lora_key, lora_path)
+    if state_dict is None and not os.path.isdir(lora_path):
+        canonical = _is_canonical_lora(lora_key, lora_path)
+        if LORA_MMAP_ENABLED:
+            # Page-in from the shared mapping instead of a private read + deserialize
+            state_dict = _read_adapter_tensors(lora_path, lora_key)
+            if canonical and pipe.device.type != "cpu":
+                # Canonical fast path on top of the mapping: nothing for diffusers
+                # to convert, so copy the mapped tensors straight to the device
+                state_dict = {name: tensor.to(pipe.device) for name, tensor in state_dict.items()}
+                logger.debug(f"[LORA] Loading canonical adapter {lora_path} from its mapping directly to {pipe.device}")
+        elif canonical:
+            # Fast path: keys and dtype already match what diffusers would convert
+            # to, so read the tensors straight onto the pipeline's device
+            state_dict = load_file(lora_path, device=str(pipe.device))
+            logger.debug(f"[LORA] Loading canonical adapter {lora_path} directly to {pipe.device}")
+    if state_dict is not None:
+        # Memory-only activation; pass a shallow copy so the buffer stays reusable
+        pipe.load_lora_weights(dict(state_dict), adapter_name=adapter_name)
+    elif os.path.isdir(lora_path):
+        # If it's a directory, load from directory
+        pipe.load_lora_weights(lora_path, adapter_name=adapter_name)
+    else:
+        # If it's a file, load from file path
+        # For single file, we need to load from the directory containing it
+        lora_dir = os.path.dirname(lora_path)
+        weight_name = os.path.basename(lora_path)
+        pipe.load_lora_weights(lora_dir, weight_name=weight_name, adapter_name=adapter_name)
+
+
+def _get_delta_cache_stats() -> Dict[str, Any]:
+    """Get delta cache statistics (only meaningful in "delta" fuse mode)"""
+    with _delta_lock:
+        return {
+            "max_size": LORA_DELTA_CACHE_MAX_SIZE,
+            "current_size": len(_delta_cache),
+            "cached_brands": list(_delta_cache.keys()),
+            "fused": [(brand, weight) for brand, weight, _ in _fused_deltas],
+            "snapshot_layers": len(_pristine_weights),
+            "restore_interval": LORA_DELTA_RESTORE_INTERVAL,
+            **_delta_stats
+        }
+
+
+def _get_base_weight(pipe: StableDiffusionPipeline, layer_key: Tuple[str, str]) -> torch.Tensor:
+    """Resolve (component_name, module_name) to the base layer weight parameter"""
+    component_name, module_name = layer_key
+    module = getattr(pipe, component_name).get_submodule(module_name)
+    # PEFT wraps targeted layers; the original Linear/Conv2d sits underneath
+    if hasattr(module, "get_base_layer"):
+        module = module.get_base_layer()
+    return module.weight
+
+
+def _compute_lora_deltas(pipe: StableDiffusionPipeline, lora_key: str, lora_path: str, adapter_name: str) -> Dict[Tuple[str, str], torch.Tensor]:
+    """
+    Compute per-layer LoRA deltas (B @ A * scale) for an adapter file
+    
+    The adapter is loaded through the normal diffusers path (so kohya/diffusers
+    key conversion still applies), the deltas are read off the PEFT layers and
+    the adapter is deleted again, leaving the pipeline as it was.
+    
+    Args:
+        pipe: The Stable Diffusion pipeline
+        lora_key: Brand (or brand@version) the adapter belongs to
+        lora_path: Path to the LoRA file or directory
+        adapter_name: Temporary adapter name to load under
+        
+    Returns:
+        Dictionary mapping (component_name, module_name) to delta tensor
+    """
+    _load_adapter(pipe, lora_path, adapter_name, lora_key)
+    deltas = {}
+    try:
+        with torch.no_grad():
+            for component_name in ("unet", "text_encoder"):
+                component = getattr(pipe, component_name, None)
+                if component is None:
+                    continue
+                for module_name, module in component.named_modules():
+                    lora_A = getattr(module, "lora_A", None)
+                    if lora_A is None or adapter_name not in lora_A:
+                        continue
+                    base_weight = _get_base_weight(pipe, (component_name, module_name))
+                    delta = module.get_delta_weight(adapter_name)
+                    deltas[(component_name, module_name)] = delta.detach().to(
+                        device=base_weight.device, dtype=base_weight.dtype
+                    )
+    finally:
+        pipe.delete_adapters(adapter_name)
+    return deltas
+
+
+def _get_lora_deltas(pipe: StableDiffusionPipeline, lora_key: str, lora_path: str) -> Dict[Tuple[str, str], torch.Tensor]:
+    """Get deltas for a brand (version) from the delta cache, computing them on a miss"""
+    with _delta_lock:
+        if lora_key in _delta_cache:
+            _delta_cache.move_to_end(lora_key)
+            return _delta_cache[lora_key]
+        
+        logger.info(f"[LORA-DELTA] Computing deltas for {lora_key} from {lora_path}")
+        deltas = _compute_lora_deltas(pipe, lora_key, lora_path, f"{lora_key.replace('@', '_')}_delta")
+        _delta_stats["computed"] += 1
+        
+        if len(_delta_cache) >= LORA_DELTA_CACHE_MAX_SIZE:
+            oldest_id = next(iter(_delta_cache))
+            del _delta_cache[oldest_id]
+            _delta_stats["evictions"] += 1
+            logger.info(f"[LORA-DELTA] Evicted deltas for {oldest_id} (max size: {LORA_DELTA_CACHE_MAX_SIZE})")
+        _delta_cache[lora_key] = deltas
+        logger.info(f"[LORA-DELTA] Cached {len(deltas)} layer deltas for {lora_key}")
+        return deltas
+
+
+def _fuse_lora_deltas(pipe: StableDiffusionPipeline, lora_key: str, lora_path: str, lora_weight: float):
+    """Add a brand's cached deltas into the base weights (one elementwise pass)"""
+    with _delta_lock:
+        deltas = _get_lora_deltas(pipe, lora_key, lora_path)
+        fused = []
+        with torch.no_grad():
+            try:
+                for layer_key, delta in deltas.items():
+                    weight = _get_base_weight(pipe, layer_key)
+                    if layer_key not in _pristine_weights:
+                        # First touch: nothing has been fused into this layer yet
+                        _pristine_weights[layer_key] = weight.detach().to("cpu", copy=True)
+                    weight.add_(delta, alpha=lora_weight)
+                    fused.append(layer_key)
+            except Exception:
+                # Take back the layers fused so far, the caller falls back to the base model
+                for layer_key in reversed(fused):
+                    _get_base_weight(pipe, layer_key).sub_(deltas[layer_key], alpha=lora_weight)
+                logger.error(f"[LORA-DELTA] Fusing {lora_key} failed after {len(fused)}/{len(deltas)} layers, reverted")
+                raise
+        _fused_deltas.append((lora_key, lora_weight, deltas))
+        _delta_stats["fuses"] += 1
+
+
+def _unfuse_lora_deltas(pipe: StableDiffusionPipeline):
+    """
+    Subtract all fused deltas from the base weights
+    
+    Every LORA_DELTA_RESTORE_INTERVAL unfuses the touched layers are copied back
+    from the pristine snapshot instead, so rounding drift from repeated
+    add/subtract (notably in fp16) never accumulates.
+    """
+    with _delta_lock:
+        if not _fused_deltas:
+            return
+        _delta_stats["unfuses"] += 1
+        restore = LORA_DELTA_RESTORE_INTERVAL > 0 and _delta_stats["unfuses"] % LORA_DELTA_RESTORE_INTERVAL == 0
+        with torch.no_grad():
+            if restore:
+                for layer_key, pristine in _pristine_weights.items():
+                    weight = _get_base_weight(pipe, layer_key)
+                    weight.copy_(pristine.to(device=weight.device, dtype=weight.dtype))
+                _delta_stats["restores"] += 1
+                logger.info(f"[LORA-DELTA] Restored {len(_pristine_weights)} layers from pristine snapshot")
+            else:
+                for _, lora_weight, deltas in reversed(_fused_deltas):
+                    for layer_key, delta in deltas.items():
+                        _get_base_weight(pipe, layer_key).sub_(delta, alpha=lora_weight)
+        _fused_deltas.clear()
+
+
+def _prepare_lora_load(pipe: StableDiffusionPipeline, brand_id: str, lora_weight: float, version: Optional[str],
+                       record_usage: bool = True) -> Optional[Tuple[str, Optional[str], str, Optional[int]]]:
+    """
+    Resolve a brand's adapter, record the access and check it against the memory budget
+    
+    Usage stats and the access trace are only recorded when record_usage is
+    set (not for startup preloads, which would count themselves up).
+    
+    Returns:
+        Tuple of (lora_key, version_id, lora_path, adapter_bytes), or None if
+        the base model should be used
+    """
+    normalized_id = normalize_brand_id(brand_id)
+    version_id = None
+    if _is_current_version(version):
+        lora_path = get_lora_path(brand_id)
+    else:
+        resolved = resolve_lora_version(normalized_id, version)
+        version_id, lora_path = resolved if resolved else (None, None)
+    lora_key = _get_lora_key(normalized_id, version_id)
+    
+    if not lora_path:
+        logger.info(f"[LORA] LoRA not found for brand_id: {brand_id} (version: {version or 'current'}), using base model")
+        return None
+    
+    # Phase 2: Check cache (records the access with the eviction policy)
+    is_cached = _get_from_cache(brand_id, lora_weight, version_id) is not None
+    if is_cached:
+        logger.info(f"[LORA] LoRA for {lora_key} found in cache")
+    
+    # Check the adapter against the memory budget from its header, before loading anything
+    adapter_bytes = None
+    if LORA_CACHE_MAX_MB > 0 and LORA_FUSE_MODE != "delta" and not is_cached:
+        inspection = get_lora_inspection(normalized_id, lora_path)
+        if inspection:
+            adapter_bytes = estimate_adapter_bytes(inspection, _get_element_size(pipe))
+            if adapter_bytes > LORA_CACHE_MAX_MB * 1024 * 1024:
+                with _cache_lock:
+                    _cache_stats["budget_rejections"] += 1
+                logger.error(f"[LORA] Adapter {lora_key} needs ~{adapter_bytes / 1024 / 1024:.1f} MB, over LORA_CACHE_MAX_MB={LORA_CACHE_MAX_MB:g}; using base model")
+                return None
+    
+    if record_usage:
+        record_lora_usage(brand_id)
+        record_lora_access(lora_key, lora_weight, lora_path)
+    return lora_key, version_id, lora_path, adapter_bytes
+
+
+def _ensure_adapter_resident(pipe: StableDiffusionPipeline, lora_key: str, lora_path: str) -> str:
+    """Load a brand's adapter into the pipeline unless it is still resident; returns the adapter name"""
+    adapter_name = _acquire_adapter(lora_key)
+    # unload_lora_weights() disables the LoRA layers and neither loading a new
+    # adapter nor set_adapters() turns them back on
+    if hasattr(pipe, 'enable_lora'):
+        pipe.enable_lora()
+    if _is_adapter_loaded(pipe, adapter_name):
+        # Adapter stayed resident after the previous job
+        logger.info(f"[LORA] Reusing resident adapter '{adapter_name}'")
+    else:
+        _load_adapter(pipe, lora_path, adapter_name, lora_key)
+    return adapter_name
+
+
+def load_lora_weights(pipe: StableDiffusionPipeline, brand_id: Optional[str], lora_weight: float = 0.8, version: Optional[str] = None,
+                      record_usage: bool = True) -> StableDiffusionPipeline:
     """
     Load LoRA weights into the pipeline for a specific brand
     
@@ -157,6 +1310,10 @@ def load_lora_weights(pipe: StableDiffusionPipeline, brand_id: Optional[str], lo
         pipe: The Stable Diffusion pipeline
         brand_id: Brand identifier (optional)
         lora_weight: Weight/strength of LoRA (0.0-1.0), default 0.8
+        version: Optional pinned version (see resolve_lora_version); each
+                 version is loaded under its own adapter name, so A/B
+                 requests don't swap files or reload each other's adapters
+        record_usage: Record usage stats and the access trace (off for preloads)
         
     Returns:
         Pipeline with LoRA loaded (or original pipeline if no LoRA found)
@@ -165,45 +1322,35 @@ def load_lora_weights(pipe: StableDiffusionPipeline, brand_id: Optional[str], lo
         logger.info("[LORA] No brand_id provided, using base model")
         return pipe
     
-    # Phase 2: Check cache first (for statistics and tracking)
-    is_cached = _is_cached(brand_id, lora_weight)
-    if is_cached:
-        logger.info(f"[LORA] LoRA for {brand_id} found in cache (tracking only - still loading)")
-        # Note: We still load the LoRA because pipelines are modified in-place
-        # The cache tracks which LoRAs have been loaded, but we can't skip loading
-        # This is a limitation of how diffusers works with shared pipelines
-    
-    lora_path = get_lora_path(brand_id)
-    
-    if not lora_path:
-        logger.info(f"[LORA] LoRA not found for brand_id: {brand_id}, using base model")
+    prepared = _prepare_lora_load(pipe, brand_id, lora_weight, version, record_usage)
+    if prepared is None:
         return pipe
+    lora_key, version_id, lora_path, adapter_bytes = prepared
     
     try:
         logger.info(f"[LORA] Loading LoRA: {lora_path} with weight: {lora_weight}")
         
-        # Use adapter_name and set_adapters() method (matches script approach for better accuracy)
-        adapter_name = f"{brand_id}_adapter"
+        if LORA_FUSE_MODE == "delta":
+            # Delta mode: add cached B@A*scale into base weights, no adapter kept active
+            _fuse_lora_deltas(pipe, lora_key, lora_path, lora_weight)
+            if _targets_text_encoder(lora_key, lora_path):
+                _text_encoder_loras.append((_get_adapter_name(lora_key), lora_weight))
+            _add_to_cache(brand_id, lora_weight, pipe, version_id)
+            logger.info(f"[LORA] Fused LoRA deltas for brand: {lora_key} with weight: {lora_weight}")
+            return pipe
         
-        # Check if LoRA is a directory or file
-        if os.path.isdir(lora_path):
-            # If it's a directory, load from directory
-            pipe.load_lora_weights(lora_path, adapter_name=adapter_name)
-        else:
-            # If it's a file, load from file path
-            # For single file, we need to load from the directory containing it
-            lora_dir = os.path.dirname(lora_path)
-            weight_name = os.path.basename(lora_path)
-            pipe.load_lora_weights(lora_dir, weight_name=weight_name, adapter_name=adapter_name)
+        # Use adapter_name and set_adapters() method (matches script approach for better accuracy)
+        adapter_name = _ensure_adapter_resident(pipe, lora_key, lora_path)
         
         # Explicitly set adapter with weight (more reliable than weight parameter in load_lora_weights)
         pipe.set_adapters([adapter_name], adapter_weights=[lora_weight])
+        _text_encoder_loras[:] = [(adapter_name, lora_weight)] if _targets_text_encoder(lora_key, lora_path) else []
         logger.info(f"[LORA] Set adapter '{adapter_name}' with weight: {lora_weight}")
         
         # Phase 2: Add to cache after successful load (for tracking and statistics)
-        _add_to_cache(brand_id, lora_weight, pipe)
+        _add_to_cache(brand_id, lora_weight, pipe, version_id, adapter_bytes)
         
-        logger.info(f"[LORA] LoRA loaded successfully for brand: {brand_id} with weight: {lora_weight}")
+        logger.info(f"[LORA] LoRA loaded successfully for brand: {lora_key} with weight: {lora_weight}")
         return pipe
         
     except Exception as e:
@@ -214,11 +1361,50 @@ def load_lora_weights(pipe: StableDiffusionPipeline, brand_id: Optional[str], lo
         return pipe
 
 
+def load_lora_adapter(pipe: StableDiffusionPipeline, brand_id: Optional[str], lora_weight: float = 0.8, version: Optional[str] = None) -> Optional[str]:
+    """
+    Make a brand's adapter resident without activating it
+    
+    Used for mixed-adapter batches (mixed_lora.py), where each sample selects
+    its own adapter, so set_adapters() is left to the batch. Not available in
+    "delta" fuse mode, which bakes a single brand into the base weights.
+    
+    Args:
+        pipe: The Stable Diffusion pipeline
+        brand_id: Brand identifier
+        lora_weight: Weight the sample will use (tracked by the cache)
+        version: Optional pinned version (see resolve_lora_version)
+        
+    Returns:
+        Adapter name, or None if the brand has no LoRA or loading failed
+    """
+    if not brand_id or brand_id == "default":
+        return None
+    if LORA_FUSE_MODE == "delta":
+        logger.warning("[LORA] Mixed-adapter batches need LORA_FUSE_MODE=adapter")
+        return None
+    
+    prepared = _prepare_lora_load(pipe, brand_id, lora_weight, version)
+    if prepared is None:
+        return None
+    lora_key, version_id, lora_path, adapter_bytes = prepared
+    
+    try:
+        adapter_name = _ensure_adapter_resident(pipe, lora_key, lora_path)
+        _add_to_cache(brand_id, lora_weight, pipe, version_id, adapter_bytes)
+        return adapter_name
+    except Exception as e:
+        logger.error(f"[LORA] Error loading adapter for {lora_key}: {str(e)}")
+        return None
+
+
 def unload_lora_weights(pipe: StableDiffusionPipeline) -> StableDiffusionPipeline:
     """
     Unload LoRA weights from the pipeline to return to base model
     
-    Uses disable_adapters() when using adapter-based approach (matches script).
+    Uses disable_lora() when available so adapters stay resident for the next
+    cache hit; evicting a brand from the cache deletes its adapter.
+    In "delta" fuse mode the fused deltas are subtracted from the base weights.
     
     Args:
         pipe: The Stable Diffusion pipeline
@@ -226,9 +1412,22 @@ def unload_lora_weights(pipe: StableDiffusionPipeline) -> StableDiffusionPipelin
     Returns:
         Pipeline with adapters disabled (returns to base model)
     """
+    _text_encoder_loras.clear()
+    _release_job_adapters()
+    if _fused_deltas:
+        # Not wrapped in the try below: failing to unfuse leaves a brand baked in
+        _unfuse_lora_deltas(pipe)
+        logger.info("[LORA] Fused deltas removed (returned to base model)")
+        _delete_evicted_adapters(pipe)
+        return pipe
+    
     try:
+        # Disable LoRA layers but keep adapters loaded for reuse
+        if hasattr(pipe, 'disable_lora'):
+            pipe.disable_lora()
+            logger.info("[LORA] LoRA disabled (returned to base model, adapters kept resident)")
         # Disable adapters (matches script approach - more reliable)
-        if hasattr(pipe, 'disable_adapters'):
+        elif hasattr(pipe, 'disable_adapters'):
             pipe.disable_adapters()
             logger.info("[LORA] Adapters disabled (returned to base model)")
         # Fallback to unload_lora_weights if disable_adapters not available
@@ -239,9 +1438,158 @@ def unload_lora_weights(pipe: StableDiffusionPipeline) -> StableDiffusionPipelin
         # Non-critical - LoRA unloading is optional
         logger.debug(f"[LORA] Note: LoRA unloading not available or not needed: {str(e)}")
     
+    _delete_evicted_adapters(pipe)
     return pipe
 
 
+def get_style_token(brand_id: str) -> str:
+    """Textual-inversion token of a brand's style embedding (e.g. "<apple_style>")"""
+    return f"<{normalize_brand_id(brand_id)}_style>"
+
+
+def _get_embedding_file(normalized_id: str) -> Optional[Tuple[str, float]]:
+    """(path, mtime) of a brand's style embedding file, or None if it has none"""
+    if _registry.started:
+        entry = _registry.get(normalized_id)
+        if entry and entry.get("embedding_path"):
+            return entry["embedding_path"], entry["embedding_mtime"]
+        return None
+    
+    brand_dir = os.path.join(LORA_BASE_DIR, normalized_id)
+    for name in EMBEDDING_FILE_NAMES:
+        embedding_path = os.path.join(brand_dir, name)
+        if os.path.isfile(embedding_path):
+            return embedding_path, os.path.getmtime(embedding_path)
+    return None
+
+
+def _list_embedding_brands() -> List[str]:
+    """Normalized ids of all brands that have a style embedding file"""
+    if _registry.started:
+        return [entry["brand_id"] for entry in _registry.list_entries() if entry.get("embedding_path")]
+    if not os.path.exists(LORA_BASE_DIR):
+        return []
+    return [
+        item for item in sorted(os.listdir(LORA_BASE_DIR))
+        if os.path.isdir(os.path.join(LORA_BASE_DIR, item)) and _get_embedding_file(item)
+    ]
+
+
+def _unload_style_embedding(pipe: StableDiffusionPipeline, normalized_id: str) -> bool:
+    """Remove a brand's token from the tokenizer/text encoder (needs a diffusers with unload_textual_inversion)"""
+    loaded = _loaded_embeddings.get(normalized_id)
+    if not loaded:
+        return True
+    if not hasattr(pipe, 'unload_textual_inversion'):
+        logger.warning(f"[LORA-EMBED] This diffusers version can't unload {loaded['token']}; restart to pick up the new embedding")
+        return False
+    global _embedding_version
+    pipe.unload_textual_inversion(loaded["token"])
+    del _loaded_embeddings[normalized_id]
+    _embedding_version += 1
+    return True
+
+
+def load_style_embeddings(pipe: StableDiffusionPipeline, brand_ids: Optional[List[str]] = None) -> Dict[str, bool]:
+    """
+    Load brands' textual-inversion style embeddings into the tokenizer/text encoder
+    
+    All new embeddings go through a single load_textual_inversion() call, so the
+    token embedding matrix is resized once however many brands there are. An
+    embedding costs one vector per token (~3 KB at SD 1.5 size), so hundreds of
+    brands stay resident for a few MB. Embeddings whose file changed are
+    unloaded and loaded again.
+    
+    Args:
+        pipe: The Stable Diffusion pipeline
+        brand_ids: Brands to load (default: every brand with an embedding file)
+        
+    Returns:
+        Dictionary mapping normalized brand_id to whether its token is loaded
+    """
+    global _embedding_version
+    if pipe is None or not hasattr(pipe, 'load_textual_inversion'):
+        return {}
+    
+    normalized_ids = [normalize_brand_id(b) for b in brand_ids] if brand_ids is not None else _list_embedding_brands()
+    results = {}
+    with _embedding_lock:
+        to_load = []
+        for normalized_id in normalized_ids:
+            embedding_file = _get_embedding_file(normalized_id)
+            loaded = _loaded_embeddings.get(normalized_id)
+            if not embedding_file:
+                results[normalized_id] = False
+                continue
+            path, mtime = embedding_file
+            if loaded and loaded["path"] == path and loaded["mtime"] == mtime:
+                results[normalized_id] = True
+                continue
+            if not _unload_style_embedding(pipe, normalized_id):
+                # Old vectors stay in use until restart
+                results[normalized_id] = True
+                continue
+            to_load.append((normalized_id, path, mtime))
+        
+        if not to_load:
+            return results
+        
+        try:
+            pipe.load_textual_inversion(
+                [path for _, path, _ in to_load],
+                token=[get_style_token(normalized_id) for normalized_id, _, _ in to_load]
+            )
+            batches = [to_load]
+        except Exception as e:
+            # One bad file fails the whole call; load the rest one at a time
+            logger.warning(f"[LORA-EMBED] Batched load failed ({str(e)}), loading embeddings individually")
+            batches = []
+            for item in to_load:
+                normalized_id, path, _ = item
+                try:
+                    pipe.load_textual_inversion(path, token=get_style_token(normalized_id))
+                    batches.append([item])
+                except Exception as item_error:
+                    logger.error(f"[LORA-EMBED] Could not load {path}: {str(item_error)}")
+                    results[normalized_id] = False
+        
+        for batch in batches:
+            for normalized_id, path, mtime in batch:
+                _loaded_embeddings[normalized_id] = {"token": get_style_token(normalized_id), "path": path, "mtime": mtime}
+                results[normalized_id] = True
+        _embedding_version += 1
+    
+    logger.info(f"[LORA-EMBED] Loaded {sum(len(batch) for batch in batches)} style embeddings ({len(_loaded_embeddings)} resident)")
+    return results
+
+
+def get_style_embedding_token(pipe: StableDiffusionPipeline, brand_id: Optional[str]) -> Optional[str]:
+    """
+    Token to put in the prompt for a brand's style embedding, loading it on first use
+    
+    Args:
+        pipe: The Stable Diffusion pipeline
+        brand_id: Brand identifier (will be normalized)
+        
+    Returns:
+        The brand's style token, or None if it has no embedding (use its LoRA instead)
+    """
+    if not brand_id or brand_id == "default":
+        return None
+    normalized_id = normalize_brand_id(brand_id)
+    embedding_file = _get_embedding_file(normalized_id)
+    if not embedding_file:
+        return None
+    
+    loaded = _loaded_embeddings.get(normalized_id)
+    if not loaded or (loaded["path"], loaded["mtime"]) != embedding_file:
+        load_style_embeddings(pipe, [normalized_id])
+        loaded = _loaded_embeddings.get(normalized_id)
+    if loaded:
+        record_lora_usage(normalized_id)
+    return loaded["token"] if loaded else None
+
+
 def ensure_lora_directory():
     """
     Ensure the LoRA directory structure exists
@@ -364,6 +1712,7 @@ def save_brand_metadata(brand_id: str, brand_data: Dict[str, Any]) -> bool:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
         
         logger.info(f"[LORA] Saved brand metadata for {normalized_id} to {metadata_path}")
+        _refresh_registry(normalized_id)
         return True
         
     except Exception as e:
@@ -383,6 +1732,11 @@ def load_brand_metadata(brand_id: str) -> Optional[Dict[str, Any]]:
     """
     try:
         normalized_id = normalize_brand_id(brand_id)
+        
+        if _registry.started:
+            entry = _registry.get(normalized_id)
+            return entry["brand_metadata"] if entry else None
+        
         metadata_path = os.path.join(LORA_BASE_DIR, normalized_id, "brand_metadata.json")
         
         if not os.path.exists(metadata_path):
@@ -428,6 +1782,10 @@ def preload_lora(pipe: StableDiffusionPipeline, brand_id: str, lora_weight: floa
     """
     Phase 2: Preload a LoRA into cache at startup
     
+    Goes through load_lora_weights()/unload_lora_weights(), the same path as a
+    normal request, so the adapter is left resident (or its deltas cached) and
+    the first real request is a cache hit.
+    
     Args:
         pipe: The Stable Diffusion pipeline
         brand_id: Brand identifier to preload
@@ -446,16 +1804,13 @@ def preload_lora(pipe: StableDiffusionPipeline, brand_id: str, lora_weight: floa
         
         logger.info(f"[LORA-PRELOAD] Preloading LoRA for brand: {brand_id}")
         
-        # Load the LoRA
-        if os.path.isdir(lora_path):
-            pipe.load_lora_weights(lora_path, weight=lora_weight)
-        else:
-            lora_dir = os.path.dirname(lora_path)
-            weight_name = os.path.basename(lora_path)
-            pipe.load_lora_weights(lora_dir, weight_name=weight_name, weight=lora_weight)
+        # Not a request: keep it out of the usage stats and access trace
+        load_lora_weights(pipe, normalized_id, lora_weight, record_usage=False)
+        unload_lora_weights(pipe)
         
-        # Add to cache
-        _add_to_cache(brand_id, lora_weight, pipe)
+        if LORA_CACHE_ENABLED and not _is_cached(normalized_id, lora_weight):
+            logger.warning(f"[LORA-PRELOAD] LoRA for {brand_id} did not load, see errors above")
+            return False
         
         logger.info(f"[LORA-PRELOAD] Successfully preloaded LoRA for {brand_id}")
         return True
@@ -493,7 +1848,8 @@ def load_multiple_lora_weights(pipe: StableDiffusionPipeline, lora_configs: List
     
     Args:
         pipe: The Stable Diffusion pipeline
-        lora_configs: List of LoRA configurations, each with 'brand_id' and 'weight'
+        lora_configs: List of LoRA configurations, each with 'brand_id', 'weight'
+                      and an optional 'version'
                       Example: [{"brand_id": "apple_style", "weight": 0.7}, ...]
         
     Returns:
@@ -510,15 +1866,16 @@ def load_multiple_lora_weights(pipe: StableDiffusionPipeline, lora_configs: List
         brand_id = config.get("brand_id") or config.get("brandId")  # Support both formats
         weight = config.get("weight", 0.8)
         lora_type = config.get("type", "unknown")
+        version = config.get("version")
         
         if not brand_id:
             logger.warning(f"[LORA] LoRA config {i+1} missing brand_id, skipping")
             continue
         
-        logger.info(f"[LORA] [{i+1}/{len(lora_configs)}] Loading LoRA: {brand_id} (type: {lora_type}, weight: {weight})")
+        logger.info(f"[LORA] [{i+1}/{len(lora_configs)}] Loading LoRA: {brand_id} (type: {lora_type}, weight: {weight}, version: {version or 'current'})")
         
         try:
-            pipe = load_lora_weights(pipe, brand_id, weight)
+            pipe = load_lora_weights(pipe, brand_id, weight, version)
             loaded_count += 1
         except Exception as e:
             logger.warning(f"[LORA] Failed to load LoRA {brand_id}: {str(e)}, continuing with others...")
@@ -539,24 +1896,44 @@ def get_lora_metadata(brand_id: str) -> Optional[Dict[str, Any]]:
     """
     try:
         normalized_id = normalize_brand_id(brand_id)
+        
+        if _registry.started:
+            entry = _registry.get(normalized_id)
+            if not entry:
+                return None
+            # Same fallback as below: lora_metadata.json, then brand_metadata.json
+            metadata = entry["lora_metadata"] if entry["lora_metadata"] is not None else entry["brand_metadata"]
+            return _with_inspection(metadata, entry["inspection"])
+        
+        inspection = get_lora_inspection(normalized_id)
         metadata_path = os.path.join(LORA_BASE_DIR, normalized_id, "lora_metadata.json")
         
         if not os.path.exists(metadata_path):
             # Fallback to brand_metadata.json
             metadata_path = os.path.join(LORA_BASE_DIR, normalized_id, "brand_metadata.json")
             if not os.path.exists(metadata_path):
-                return None
+                return _with_inspection(None, inspection)
         
         with open(metadata_path, 'r', encoding='utf-8') as f:
             metadata = json.load(f)
         
-        return metadata
+        return _with_inspection(metadata, inspection)
         
     except Exception as e:
         logger.error(f"[LORA] Error loading LoRA metadata for {brand_id}: {str(e)}")
         return None
 
 
+def _with_inspection(metadata: Optional[Dict[str, Any]], inspection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Copy of metadata with the header inspection under "adapter" (None if neither exists)"""
+    if metadata is None and inspection is None:
+        return None
+    result = dict(metadata or {})
+    if inspection is not None:
+        result["adapter"] = inspection
+    return result
+
+
 def save_lora_metadata(brand_id: str, metadata: Dict[str, Any]) -> bool:
     """
     Phase 3: Save LoRA metadata including version information
@@ -592,6 +1969,7 @@ def save_lora_metadata(brand_id: str, metadata: Dict[str, Any]) -> bool:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
         
         logger.info(f"[LORA] Saved LoRA metadata for {normalized_id} to {metadata_path}")
+        _refresh_registry(normalized_id)
         return True
         
     except Exception as e:
@@ -608,6 +1986,27 @@ def list_available_loras() -> List[Dict[str, Any]]:
     """
     loras = []
     
+    if _registry.started:
+        for entry in _registry.list_entries():
+            if not entry["lora_path"] and not entry.get("embedding_path"):
+                continue
+            loras.append({
+                "brand_id": entry["brand_id"],
+                "normalized_id": normalize_brand_id(entry["brand_id"]),
+                "lora_file": entry["lora_file"],
+                "lora_metadata": entry["lora_metadata"] if entry["lora_metadata"] is not None else entry["brand_metadata"],
+                "brand_metadata": entry["brand_metadata"],
+                "has_lora_file": entry["lora_path"] is not None,
+                "style_token": get_style_token(entry["brand_id"]) if entry.get("embedding_path") else None,
+                "size_bytes": entry["size"],
+                "mtime": entry["mtime"],
+                "sha256": entry["sha256"],
+                "inspection": entry["inspection"],
+                "current_version": entry["manifest"].get("current") if entry["manifest"] else None,
+                "versions": sorted(entry["manifest"].get("versions", {})) if entry["manifest"] else []
+            })
+        return loras
+    
     if not os.path.exists(LORA_BASE_DIR):
         return loras
     
@@ -619,20 +2018,24 @@ def list_available_loras() -> List[Dict[str, Any]]:
             
             # Check if LoRA file exists
             lora_path = get_lora_path(item)
-            if not lora_path:
+            has_embedding = _get_embedding_file(item) is not None
+            if not lora_path and not has_embedding:
                 continue
             
-            # Get metadata
-            metadata = get_lora_metadata(item)
+            # Get metadata (get_lora_metadata returns a copy, the header inspection under "adapter")
+            metadata = get_lora_metadata(item) or {}
+            inspection = metadata.pop("adapter", None)
             brand_metadata = load_brand_metadata(item)
             
             lora_info = {
                 "brand_id": item,
                 "normalized_id": normalize_brand_id(item),
                 "lora_file": os.path.basename(lora_path) if lora_path else None,
-                "lora_metadata": metadata,
+                "lora_metadata": metadata or None,
                 "brand_metadata": brand_metadata,
-                "has_lora_file": lora_path is not None
+                "has_lora_file": lora_path is not None,
+                "style_token": get_style_token(item) if has_embedding else None,
+                "inspection": inspection
             }
             
             loras.append(lora_info)
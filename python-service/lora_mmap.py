@@ -0,0 +1,149 @@
+"""
+LoRA Memory-Mapped Loading Module
+Zero-copy safetensors loading through mmap, with an optional shared host cache
+
+load_file() copies every tensor into private process memory, so N service
+processes on a host each hold their own copy of every adapter. Tensors created
+here point straight into a copy-on-write mapping of the file instead: all
+processes share the page cache's single physical copy, and a cold load is a
+page-in rather than a read + deserialize.
+
+With LORA_SHARED_CACHE_DIR on tmpfs (e.g. /dev/shm/mayvn-loras), adapters are
+copied there once per host, keyed by content, so page-ins never touch disk.
+"""
+
+import os
+import mmap
+import shutil
+import hashlib
+import logging
+import warnings
+from typing import Dict, Optional
+
+import torch
+
+from lora_inspect import read_safetensors_header
+
+logger = logging.getLogger(__name__)
+
+TORCH_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+if hasattr(torch, "float8_e4m3fn"):
+    TORCH_DTYPES["F8_E4M3"] = torch.float8_e4m3fn
+    TORCH_DTYPES["F8_E5M2"] = torch.float8_e5m2
+
+
+def mmap_state_dict(path: str, populate: bool = False) -> Dict[str, torch.Tensor]:
+    """
+    Load a safetensors file as CPU tensors backed by a memory mapping.
+
+    The mapping is copy-on-write (MAP_PRIVATE): pages are shared with every
+    other process mapping the same file until a tensor is written to.
+
+    Args:
+        path: Path to the .safetensors file
+        populate: Ask the kernel to read the pages in now (for prefetching)
+
+    Returns:
+        Dictionary of tensor name -> tensor
+
+    Raises:
+        ValueError: If the file is not a valid safetensors file
+    """
+    header = read_safetensors_header(path)
+    with open(path, 'rb') as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if populate and hasattr(mapping, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        mapping.madvise(mmap.MADV_WILLNEED)
+
+    data_start = 8 + header_size
+    state_dict = {}
+    with warnings.catch_warnings():
+        # Tensors keep the mapping alive; the "non-writable buffer" warning
+        # doesn't apply to ACCESS_COPY mappings
+        warnings.simplefilter("ignore", UserWarning)
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = TORCH_DTYPES.get(info["dtype"])
+            if dtype is None:
+                raise ValueError(f"{path}: unsupported dtype {info['dtype']} for {name}")
+            shape = [int(dim) for dim in info["shape"]]
+            start, end = info["data_offsets"]
+            if end == start:
+                state_dict[name] = torch.empty(shape, dtype=dtype)
+                continue
+            count = (end - start) // torch.tensor([], dtype=dtype).element_size()
+            tensor = torch.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + start)
+            state_dict[name] = tensor.reshape(shape)
+    return state_dict
+
+
+def _shared_copy_name(lora_path: str, sha256: Optional[str]) -> str:
+    """Content key of an adapter in the shared cache (sha256 if known, else path + size + mtime)"""
+    if sha256:
+        return f"{sha256}.safetensors"
+    stat = os.stat(lora_path)
+    identity = f"{os.path.realpath(lora_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return f"{hashlib.sha256(identity.encode('utf-8')).hexdigest()}.safetensors"
+
+
+def _prune_shared_cache(cache_dir: str, max_bytes: int, keep: str):
+    """Delete least recently used copies until the shared cache fits max_bytes"""
+    entries = []
+    for item in os.scandir(cache_dir):
+        if item.name.endswith(".safetensors") and item.name != keep:
+            stat = item.stat()
+            entries.append((stat.st_atime, stat.st_size, item.path))
+    total = sum(size for _, size, _ in entries) + os.path.getsize(os.path.join(cache_dir, keep))
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            # Processes that still map the file keep their pages until they unmap
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def get_shared_copy(lora_path: str, cache_dir: str, sha256: Optional[str] = None, max_bytes: int = 0) -> str:
+    """
+    Get the path of an adapter's copy in the shared host cache, creating it if needed.
+
+    Copies are written to a temp file and renamed into place, so processes
+    racing on the same adapter never map a partial file.
+
+    Args:
+        lora_path: Adapter file under LORA_BASE_DIR
+        cache_dir: Shared cache directory (ideally on tmpfs)
+        sha256: Content hash of the adapter, if known
+        max_bytes: Size budget of the shared cache (0 = unlimited)
+
+    Returns:
+        Path of the shared copy
+    """
+    name = _shared_copy_name(lora_path, sha256)
+    shared_path = os.path.join(cache_dir, name)
+    if os.path.exists(shared_path):
+        return shared_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{shared_path}.tmp.{os.getpid()}"
+    shutil.copyfile(lora_path, tmp_path)
+    os.replace(tmp_path, shared_path)
+    logger.info(f"[LORA-MMAP] Copied {lora_path} to shared cache as {name}")
+    if max_bytes > 0:
+        _prune_shared_cache(cache_dir, max_bytes, name)
+    return shared_path
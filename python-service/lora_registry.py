@@ -0,0 +1,290 @@
+"""
+LoRA Registry Module
+In-memory index of deployed LoRA adapters, kept current by a filesystem watcher
+
+Built once at startup so the generation hot path (get_lora_path) and /lora/list
+are dictionary lookups instead of os.path.exists probes and JSON reads.
+A background thread polls LORA_BASE_DIR for changes; if the optional `watchdog`
+package is installed, inotify/FSEvents notifications trigger refreshes as well.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Callable, Tuple
+from lora_store import hash_file, MANIFEST_FILE
+from lora_inspect import inspect_lora
+
+logger = logging.getLogger(__name__)
+
+# Adapter file names probed in each brand directory, in order of preference
+# (f"{brand_id}.safetensors" is tried last)
+LORA_FILE_NAMES = ["style.safetensors", "lora.safetensors"]
+
+# Textual-inversion style embedding file names, in order of preference
+# (learned_embeds.safetensors is what diffusers' textual inversion training writes)
+EMBEDDING_FILE_NAMES = ["style_embedding.safetensors", "learned_embeds.safetensors"]
+
+# Callback signature: on_change(brand_id, old_entry, new_entry); either entry may be None
+ChangeCallback = Callable[[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    """Read a JSON file, returning None if it is missing or invalid"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"[LORA-REGISTRY] Could not read {path}: {str(e)}")
+        return None
+
+
+class LoRARegistry:
+    """
+    Brand -> adapter index (file, size, mtime, content hash, header inspection,
+    parsed metadata, style embedding file)
+
+    Entries are immutable dicts replaced as a whole on change, so readers never
+    need the lock for longer than the dictionary lookup.
+    """
+
+    def __init__(self, base_dir: str, poll_interval: float = 5.0, on_change: Optional[ChangeCallback] = None):
+        self.base_dir = base_dir
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Brand -> stat signature of the files an entry was built from
+        self._signatures: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        # Brand -> lock serializing refresh(): the poller, watchdog and reload
+        # endpoint may refresh the same brand at once, and a change must be
+        # reported to on_change only once
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Build the index and start watching for changes"""
+        if self.started:
+            return
+        self.scan()
+        self._thread = threading.Thread(target=self._poll_loop, name="lora-registry", daemon=True)
+        self._thread.start()
+        self._start_observer()
+        logger.info(f"[LORA-REGISTRY] Watching {self.base_dir} ({len(self._entries)} brands indexed)")
+
+    def stop(self):
+        """Stop the watcher threads"""
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.warning(f"[LORA-REGISTRY] Scan failed: {str(e)}")
+
+    def _start_observer(self):
+        """Use inotify/FSEvents through watchdog if it is installed (polling stays on as a fallback)"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("[LORA-REGISTRY] watchdog not installed, using polling only")
+            return
+
+        registry = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                relative = os.path.relpath(event.src_path, registry.base_dir)
+                brand_id = relative.split(os.sep)[0]
+                if brand_id and brand_id not in (".", ".."):
+                    registry.refresh(brand_id)
+
+        try:
+            os.makedirs(self.base_dir, exist_ok=True)
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.base_dir, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            logger.info("[LORA-REGISTRY] Using filesystem notifications via watchdog")
+        except Exception as e:
+            logger.warning(f"[LORA-REGISTRY] Could not start watchdog observer: {str(e)}")
+            self._observer = None
+
+    def scan(self) -> List[str]:
+        """
+        Rescan every brand directory
+
+        Returns:
+            List of brand_ids whose entry was added, changed or removed
+        """
+        try:
+            brand_ids = [
+                item.name for item in os.scandir(self.base_dir)
+                if item.is_dir() and not item.name.startswith((".", "__"))
+            ]
+        except FileNotFoundError:
+            brand_ids = []
+
+        changed = []
+        for brand_id in brand_ids:
+            if self.refresh(brand_id):
+                changed.append(brand_id)
+
+        with self._lock:
+            removed = [brand_id for brand_id in self._signatures if brand_id not in brand_ids]
+        for brand_id in removed:
+            if self.refresh(brand_id):
+                changed.append(brand_id)
+        return changed
+
+    def _signature(self, brand_dir: str) -> Optional[Tuple]:
+        """Stat signature of the files that make up a brand entry (None if the directory is gone)"""
+        try:
+            files = []
+            for item in os.scandir(brand_dir):
+                if item.name.endswith((".safetensors", ".json")):
+                    stat = item.stat()
+                    files.append((item.name, stat.st_size, stat.st_mtime_ns))
+            return tuple(sorted(files))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def refresh(self, brand_id: str) -> bool:
+        """
+        Re-read one brand directory if any of its files changed
+
+        Args:
+            brand_id: Normalized brand identifier (the directory name)
+
+        Returns:
+            True if the entry was added, changed or removed
+        """
+        brand_dir = os.path.join(self.base_dir, brand_id)
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(brand_id, threading.Lock())
+
+        with refresh_lock:
+            signature = self._signature(brand_dir)
+
+            with self._lock:
+                if self._signatures.get(brand_id) == signature and (signature is not None or brand_id not in self._entries):
+                    return False
+                old_entry = self._entries.get(brand_id)
+
+            new_entry = self._build_entry(brand_id, brand_dir, old_entry) if signature is not None else None
+
+            with self._lock:
+                if new_entry is None:
+                    self._entries.pop(brand_id, None)
+                    self._signatures.pop(brand_id, None)
+                else:
+                    self._entries[brand_id] = new_entry
+                    self._signatures[brand_id] = signature
+
+            logger.debug(f"[LORA-REGISTRY] {'Updated' if new_entry else 'Removed'} entry for {brand_id}")
+            if self.on_change is not None:
+                try:
+                    self.on_change(brand_id, old_entry, new_entry)
+                except Exception as e:
+                    logger.warning(f"[LORA-REGISTRY] Change callback failed for {brand_id}: {str(e)}")
+            return True
+
+    def _find_adapter(self, brand_id: str, brand_dir: str) -> Optional[str]:
+        """Resolve the adapter file of a brand directory"""
+        for name in LORA_FILE_NAMES + [f"{brand_id}.safetensors"]:
+            lora_path = os.path.join(brand_dir, name)
+            if os.path.exists(lora_path):
+                return lora_path
+        return None
+
+    def _find_embedding(self, brand_dir: str) -> Optional[str]:
+        """Resolve the textual-inversion style embedding of a brand directory"""
+        for name in EMBEDDING_FILE_NAMES:
+            embedding_path = os.path.join(brand_dir, name)
+            if os.path.isfile(embedding_path):
+                return embedding_path
+        return None
+
+    def _build_entry(self, brand_id: str, brand_dir: str, old_entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build a registry entry from disk, reusing the old hash and inspection if the adapter didn't change"""
+        lora_path = self._find_adapter(brand_id, brand_dir)
+        embedding_path = self._find_embedding(brand_dir)
+        # Versions stored by deploy_lora.py (None for hand-copied adapters)
+        manifest = _read_json(os.path.join(brand_dir, MANIFEST_FILE))
+        size = mtime = None
+        sha256 = None
+        inspection = None
+        if lora_path:
+            stat = os.stat(lora_path)
+            size, mtime = stat.st_size, stat.st_mtime
+            if old_entry and old_entry.get("lora_path") == lora_path and old_entry.get("size") == size and old_entry.get("mtime") == mtime:
+                sha256 = old_entry.get("sha256")
+                inspection = old_entry.get("inspection")
+            else:
+                sha256 = self._manifest_sha256(brand_dir, lora_path, manifest) or hash_file(lora_path)
+                inspection = self._inspect(lora_path)
+
+        return {
+            "brand_id": brand_id,
+            "lora_path": lora_path,
+            "lora_file": os.path.basename(lora_path) if lora_path else None,
+            "size": size,
+            "mtime": mtime,
+            "sha256": sha256,
+            # Header-only adapter properties (rank, target modules, dtype, params, bytes)
+            "inspection": inspection,
+            "lora_metadata": _read_json(os.path.join(brand_dir, "lora_metadata.json")),
+            "brand_metadata": _read_json(os.path.join(brand_dir, "brand_metadata.json")),
+            "manifest": manifest,
+            "embedding_path": embedding_path,
+            "embedding_mtime": os.path.getmtime(embedding_path) if embedding_path else None,
+        }
+
+    def _inspect(self, lora_path: str) -> Optional[Dict[str, Any]]:
+        """Read an adapter's safetensors header (None for directories or unreadable files)"""
+        if os.path.isdir(lora_path):
+            return None
+        try:
+            return inspect_lora(lora_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[LORA-REGISTRY] Could not inspect {lora_path}: {str(e)}")
+            return None
+
+    def _manifest_sha256(self, brand_dir: str, lora_path: str, manifest: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Content hash recorded by deploy_lora.py for the published version, if lora_path points at it"""
+        if not manifest or not manifest.get("current"):
+            return None
+        version = manifest.get("versions", {}).get(manifest["current"], {})
+        version_path = os.path.join(brand_dir, version.get("file", ""))
+        if version.get("sha256") and os.path.realpath(lora_path) == os.path.realpath(version_path):
+            return version["sha256"]
+        return None
+
+    def get(self, brand_id: str) -> Optional[Dict[str, Any]]:
+        """Get the entry for a normalized brand_id"""
+        with self._lock:
+            return self._entries.get(brand_id)
+
+    def get_lora_path(self, brand_id: str) -> Optional[str]:
+        """Get the adapter path for a normalized brand_id (no disk access)"""
+        entry = self.get(brand_id)
+        return entry["lora_path"] if entry else None
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Get all entries, sorted by brand_id"""
+        with self._lock:
+            return [self._entries[brand_id] for brand_id in sorted(self._entries)]
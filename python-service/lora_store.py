@@ -0,0 +1,138 @@
+"""
+LoRA Store Module
+Versioned, content-addressed on-disk layout for deployed LoRA adapters
+
+Layout per brand:
+
+    loras/<brand_id>/
+    ├── versions/
+    │   ├── 3f2a9c01d4e5b6a7/style.safetensors   (one directory per content hash)
+    │   └── 81be0f44c2d19a3e/style.safetensors
+    ├── style.safetensors -> versions/81be0f44c2d19a3e/style.safetensors
+    ├── lora_manifest.json                      (current version + history)
+    └── lora_metadata.json
+
+Publishing swaps the style.safetensors symlink with an atomic rename, so the
+service never sees a half-written file. Where symlinks are unavailable
+(e.g. Windows without developer mode) the file is copied next to the target and
+renamed over it, which is still atomic.
+No torch/diffusers import, so deploy tooling can use it too.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "lora_manifest.json"
+# Content hash prefix used as the version id
+VERSION_ID_LENGTH = 16
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the sha256 hex digest of a file without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]):
+    """Write JSON to a temp file in the same directory and rename it into place"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest(brand_dir: str) -> Optional[Dict[str, Any]]:
+    """Read a brand's deployment manifest (None if the brand was never deployed with versions)"""
+    manifest_path = os.path.join(brand_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def get_version_path(brand_dir: str, version_id: str, target_name: str = "style.safetensors") -> str:
+    """Path of a stored version's adapter file"""
+    return os.path.join(brand_dir, VERSIONS_DIR, version_id, target_name)
+
+
+def store_version(brand_dir: str, source_path: str, target_name: str = "style.safetensors", sha256: Optional[str] = None) -> Tuple[str, str, bool]:
+    """
+    Store an adapter file under versions/<content hash>/, skipping identical content.
+
+    Args:
+        brand_dir: Brand directory (loras/<brand_id>)
+        source_path: Adapter file to store
+        target_name: File name inside the version directory
+        sha256: Precomputed content hash (computed if omitted)
+
+    Returns:
+        Tuple of (version_id, version_path, copied); copied is False if that
+        content was already stored
+    """
+    sha256 = sha256 or hash_file(source_path)
+    version_id = sha256[:VERSION_ID_LENGTH]
+    version_path = get_version_path(brand_dir, version_id, target_name)
+
+    if os.path.exists(version_path) and os.path.getsize(version_path) == os.path.getsize(source_path):
+        return version_id, version_path, False
+
+    os.makedirs(os.path.dirname(version_path), exist_ok=True)
+    tmp_path = f"{version_path}.tmp.{os.getpid()}"
+    # copyfile (not copy2) so the stored file gets a fresh mtime the service watcher notices
+    shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, version_path)
+    return version_id, version_path, True
+
+
+def publish_version(brand_dir: str, version_id: str, target_name: str = "style.safetensors", info: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Make a stored version the live adapter of a brand.
+
+    Args:
+        brand_dir: Brand directory (loras/<brand_id>)
+        version_id: Version id returned by store_version()
+        target_name: Live file name the service resolves (style.safetensors)
+        info: Extra fields recorded for this version in the manifest (sha256, size, rank...)
+
+    Returns:
+        How the live file was published: "symlink" or "copy"
+    """
+    version_path = get_version_path(brand_dir, version_id, target_name)
+    if not os.path.exists(version_path):
+        raise FileNotFoundError(f"Version {version_id} is not stored in {brand_dir}")
+
+    live_path = os.path.join(brand_dir, target_name)
+    tmp_path = f"{live_path}.tmp.{os.getpid()}"
+    try:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.symlink(os.path.relpath(version_path, brand_dir), tmp_path)
+        method = "symlink"
+    except (OSError, NotImplementedError):
+        shutil.copyfile(version_path, tmp_path)
+        method = "copy"
+    os.replace(tmp_path, live_path)
+
+    manifest = read_manifest(brand_dir) or {"versions": {}}
+    version_info = dict(info or {})
+    version_info["file"] = os.path.relpath(version_path, brand_dir).replace(os.sep, "/")
+    version_info["published_at"] = datetime.now().isoformat()
+    manifest["versions"][version_id] = version_info
+    manifest["current"] = version_id
+    manifest["target_name"] = target_name
+    write_json_atomic(os.path.join(brand_dir, MANIFEST_FILE), manifest)
+    return method
@@ -5,27 +5,49 @@ FastAPI service for generating images using Stable Diffusion
 Phase 5: Stable Diffusion integration
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Any
 import base64
+import hashlib
 from io import BytesIO
 from PIL import Image
 import os
 from dotenv import load_dotenv
 import torch
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+from diffusers import StableDiffusionPipeline
 import logging
 import uuid
+import random
 import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
 from lora_manager import (
     load_lora_weights, unload_lora_weights, ensure_lora_directory, LORA_BASE_DIR,
     save_brand_metadata, get_brand_id_from_data, normalize_brand_id,
-    preload_loras, get_cache_stats, clear_cache,  # Phase 2: Cache functions
-    load_multiple_lora_weights, get_lora_metadata, list_available_loras  # Phase 3: Multiple LoRA support
+    preload_loras, get_cache_stats, clear_cache, prefetch_lora,  # Phase 2: Cache functions
+    get_top_used_brands, flush_usage_stats, LORA_CACHE_MAX_SIZE, start_lora_registry,
+    reload_lora,
+    load_multiple_lora_weights, get_lora_metadata, list_available_loras,  # Phase 3: Multiple LoRA support
+    load_lora_adapter, LORA_FUSE_MODE, deploy_uploaded_lora,
+    load_style_embeddings, get_style_embedding_token, LORA_EMBEDDINGS_PRELOAD,  # Textual-inversion brand tokens
+    get_text_encoder_state
+)
+from mixed_lora import MixedLoRABatch
+from prompt_cache import PromptEmbeddingCache
+from step_callbacks import CFGTruncation, ConvergenceStop, StepCallbacks
+from deep_cache import DeepCache
+from presets import SPEED_PRESETS, SpeedPreset, get_speed_preset
+from compiled_models import (
+    CompiledModels, TORCH_COMPILE_ENABLED, TORCH_COMPILE_BUCKETS, TORCH_COMPILE_WARMUP, snap_to_bucket
+)
+from schedulers import (
+    DEFAULT_SCHEDULER, create_scheduler, get_scheduler_guidance_scale, job_pipeline,
+    list_schedulers, validate_scheduler
 )
 
 # Configure logging
@@ -58,6 +80,12 @@ app.add_middleware(
 
 # Request/Response Models
 
+class StyleMode(str, Enum):
+    """How a brand's style is applied"""
+    LORA = "lora"            # Load the brand's LoRA adapter
+    EMBEDDING = "embedding"  # Use the brand's textual-inversion token, falling back to the LoRA
+
+
 class LoRAConfig(BaseModel):
     """Phase 3: Configuration for a single LoRA adapter"""
     brand_id: str = Field(..., description="Brand identifier for the LoRA adapter")
@@ -66,6 +94,10 @@ class LoRAConfig(BaseModel):
         default=None,
         description="LoRA type: 'style', 'product', 'photography', etc. (for organization)"
     )
+    version: Optional[str] = Field(
+        default=None,
+        description="Deployed adapter version (version id or sha256 prefix, see /lora/list). Defaults to the current version."
+    )
 
 
 class GenerateRequest(BaseModel):
@@ -78,6 +110,44 @@ class GenerateRequest(BaseModel):
     width: int = Field(default=1024, ge=256, le=2048, description="Image width in pixels")
     height: int = Field(default=1024, ge=256, le=2048, description="Image height in pixels")
     num_inference_steps: int = Field(default=50, ge=1, le=100, description="Number of inference steps")
+    preset: Optional[str] = Field(
+        default=None,
+        description="Speed preset ('draft', 'standard', 'final' or one from SPEED_PRESETS_FILE; see GET /presets): sets the step count and scheduler (unless given in the request), token merging and attention settings"
+    )
+    scheduler: Optional[str] = Field(
+        default=None,
+        description="Sampler from the scheduler registry (see GET /schedulers), e.g. 'dpmpp_2m', 'euler_a', 'unipc', 'lcm'. Defaults to the preset's, then DEFAULT_SCHEDULER"
+    )
+    seed: Optional[int] = Field(
+        default=None,
+        ge=0,
+        lt=2 ** 32,
+        description="Seed for reproducible results (random if omitted). Image i uses seed + i"
+    )
+    num_images: int = Field(
+        default=1,
+        ge=1,
+        le=8,
+        description="Number of variations to generate in one batched pass (shares the prompt encoding and LoRA load)"
+    )
+    cfg_truncation: Optional[float] = Field(
+        default=None,
+        gt=0.0,
+        le=1.0,
+        description="Fraction of steps that use classifier-free guidance; the rest run the UNet once per step (1.0 = always). Defaults to the brand's lora_metadata.json value, then CFG_TRUNCATION_DEFAULT"
+    )
+    deep_cache_interval: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=10,
+        description="Run the deep UNet blocks only every N steps and reuse their features in between (DeepCache; 1 = off). Defaults to DEEP_CACHE_INTERVAL"
+    )
+    early_stop_threshold: Optional[float] = Field(
+        default=None,
+        ge=0.0,
+        le=0.5,
+        description="End denoising once the predicted final latent changes by less than this fraction per step (e.g. 0.01; 0 = off). Defaults to EARLY_STOP_THRESHOLD"
+    )
     
     # Phase 1 & 2: Single LoRA support (backward compatible)
     brand_id: Optional[str] = Field(
@@ -101,6 +171,11 @@ class GenerateRequest(BaseModel):
         description="List of LoRA configurations to apply. Multiple LoRAs will be composed together."
     )
     
+    style_mode: StyleMode = Field(
+        default=StyleMode.LORA,
+        description="'lora' loads brand adapters; 'embedding' uses a brand's resident style token (<brand_id_style>, e.g. <apple_style>) instead when it has a style embedding (no adapter swap, no per-step cost)"
+    )
+    
     # Phase 3: A/B testing support
     test_weights: bool = Field(
         default=False,
@@ -110,6 +185,10 @@ class GenerateRequest(BaseModel):
         default=None,
         description="List of weight values to test (e.g., [0.6, 0.7, 0.8, 0.9]). Only used if test_weights=true."
     )
+    contact_sheet: bool = Field(
+        default=False,
+        description="With test_weights, also return a labeled grid of all variations as contact_sheet_base64"
+    )
 
 
 class GenerateResponse(BaseModel):
@@ -117,6 +196,13 @@ class GenerateResponse(BaseModel):
     success: bool
     image_base64: Optional[str] = None
     image_url: Optional[str] = None
+    images_base64: Optional[List[str]] = None  # All images (variations or weight sweep)
+    weights: Optional[List[float]] = None  # LoRA weight of each image in images_base64
+    seeds: Optional[List[int]] = None  # Seed of each image in images_base64
+    steps_used: Optional[int] = None  # Denoising steps actually run (fewer than requested after an early stop)
+    preset: Optional[Dict[str, Any]] = None  # Speed preset applied, with its settings
+    scheduler: Optional[str] = None  # Scheduler the images were sampled with
+    contact_sheet_base64: Optional[str] = None  # Labeled grid of a weight sweep
     message: Optional[str] = None
     mock: bool = False  # Phase 5: Real image generation
     device: Optional[str] = None  # Device used (cuda/cpu)
@@ -129,6 +215,23 @@ class JobResponse(BaseModel):
     message: str
 
 
+class BatchGenerateRequest(BaseModel):
+    """Request model for mixed-adapter batch generation"""
+    requests: List[GenerateRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=64,
+        description="Generation requests; compatible ones (same size and steps, at most one LoRA) share one denoising batch"
+    )
+
+
+class BatchJobResponse(BaseModel):
+    """Response model for batch job creation"""
+    job_ids: List[str]
+    status: str
+    message: str
+
+
 class JobStatusResponse(BaseModel):
     """Response model for job status check"""
     job_id: str
@@ -180,6 +283,41 @@ def create_placeholder_image(width: int, height: int) -> Image.Image:
     return img
 
 
+def create_contact_sheet(images: List[Image.Image], labels: List[str], max_columns: int = 4, tile_width: int = 384) -> Image.Image:
+    """
+    Lay out images in a grid with a caption under each (weight sweeps)
+    
+    Args:
+        images: Images to show, in order
+        labels: Caption of each image
+        max_columns: Images per row
+        tile_width: Width each image is scaled to
+    
+    Returns:
+        PIL Image object
+    """
+    from PIL import ImageDraw, ImageFont
+    
+    tile_height = int(tile_width * images[0].height / images[0].width)
+    caption_height = 28
+    columns = min(max_columns, len(images))
+    rows = (len(images) + columns - 1) // columns
+    sheet = Image.new('RGB', (columns * tile_width, rows * (tile_height + caption_height)), color='white')
+    draw = ImageDraw.Draw(sheet)
+    try:
+        font = ImageFont.load_default()
+    except:
+        font = None
+    
+    for i, (image, label) in enumerate(zip(images, labels)):
+        x = (i % columns) * tile_width
+        y = (i // columns) * (tile_height + caption_height)
+        sheet.paste(image.resize((tile_width, tile_height), Image.Resampling.LANCZOS), (x, y))
+        draw.text((x + 8, y + tile_height + 8), label, fill='black', font=font)
+    
+    return sheet
+
+
 def image_to_base64(image: Image.Image) -> str:
     """
     Convert PIL Image to base64 string
@@ -196,14 +334,83 @@ def image_to_base64(image: Image.Image) -> str:
     return f"data:image/png;base64,{img_str}"
 
 
+def encode_output_images(images: List[Image.Image], width: int, height: int) -> List[str]:
+    """
+    Resize images to the requested size (if generated smaller) and base64-encode them
+    
+    PNG encoding of a 1024px image takes a noticeable fraction of a CPU second,
+    so multi-image results are encoded in parallel on output_executor.
+    """
+    def encode(image: Image.Image) -> str:
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        return image_to_base64(image)
+    
+    if len(images) == 1:
+        return [encode(images[0])]
+    return list(output_executor.map(encode, images))
+
+
 # Global variable to store the pipeline
 pipe = None
 device = None
+# The model's own scheduler config; every job creates its scheduler from it
+scheduler_base_config = None
+# Compiled UNet/VAE decoder (TORCH_COMPILE_ENABLED), None when running eagerly
+compiled_models = None
+
+# Guidance scale unless the scheduler needs another (higher guidance for stronger prompt adherence, increased from 7.5)
+DEFAULT_GUIDANCE_SCALE = 8.5
 
 # Job storage (in-memory, for production consider Redis or database)
 jobs: Dict[str, Dict] = {}
 jobs_lock = threading.Lock()
 
+# Held by every generation from LoRA load to unload: adapters, mixed-adapter
+# batches, DeepCache and speed presets all patch the shared UNet
+pipeline_lock = threading.Lock()
+
+# Model name - using Stable Diffusion 1.5 (smaller, faster)
+SD_MODEL = os.getenv("SD_MODEL", "runwayml/stable-diffusion-v1-5")
+
+# Quality negatives added to short or missing negative prompts
+DEFAULT_NEGATIVES = "blurry, low quality, distorted, text, letters, words, typography, watermark, ugly, amateur, cluttered, busy background, low resolution, oversaturated, poorly lit, bad composition"
+
+# Text encoder outputs cached by prompt (0 = off); the default negatives are encoded at startup
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "256"))
+prompt_cache = PromptEmbeddingCache(PROMPT_CACHE_MAX_ENTRIES) if PROMPT_CACHE_MAX_ENTRIES > 0 else None
+
+# Fraction of denoising steps that use classifier-free guidance when neither the
+# request nor the brand's lora_metadata.json ("cfg_truncation") sets one (1.0 = off)
+CFG_TRUNCATION_DEFAULT = float(os.getenv("CFG_TRUNCATION_DEFAULT", "1.0"))
+
+# DeepCache: default full-UNet interval (1 = off) and the skip branch (0 = shallowest, fastest)
+DEEP_CACHE_INTERVAL = int(os.getenv("DEEP_CACHE_INTERVAL", "1"))
+DEEP_CACHE_BRANCH = int(os.getenv("DEEP_CACHE_BRANCH", "0"))
+
+# Convergence early stop: default relative x0 change per step below which denoising
+# ends (0 = off), and the fraction of steps that always runs first
+EARLY_STOP_THRESHOLD = float(os.getenv("EARLY_STOP_THRESHOLD", "0"))
+EARLY_STOP_MIN_FRACTION = float(os.getenv("EARLY_STOP_MIN_FRACTION", "0.4"))
+# Steps requested vs. run by generations with early stop enabled, reported by GET /
+early_stop_stats = {"generations": 0, "stopped_early": 0, "steps_requested": 0, "steps_used": 0}
+early_stop_lock = threading.Lock()
+
+# Weights tried by test_weights when weight_variations is not given
+DEFAULT_WEIGHT_VARIATIONS = [0.6, 0.7, 0.8, 0.9]
+
+# Largest number of requests sharing one denoising batch
+MIXED_BATCH_MAX_SIZE = int(os.getenv("MIXED_BATCH_MAX_SIZE", "4"))
+
+# Threads that resize and PNG-encode the images of a multi-image result
+OUTPUT_ENCODE_WORKERS = int(os.getenv("OUTPUT_ENCODE_WORKERS", "4"))
+output_executor = ThreadPoolExecutor(max_workers=max(1, OUTPUT_ENCODE_WORKERS), thread_name_prefix="image-output")
+
+# Largest adapter accepted by POST /lora/{brand_id}, in MB
+LORA_UPLOAD_MAX_MB = float(os.getenv("LORA_UPLOAD_MAX_MB", "1024"))
+# Upload chunks are collected into blocks of this size before each threadpool write
+UPLOAD_WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+
 
 class JobStatus(str, Enum):
     """Job status enumeration"""
@@ -219,7 +426,7 @@ def load_stable_diffusion_model():
     
     Step 5.1: Load model once and reuse for all requests
     """
-    global pipe, device
+    global pipe, device, scheduler_base_config
     
     try:
         # Detect device (GPU if available, else CPU)
@@ -232,8 +439,7 @@ def load_stable_diffusion_model():
             torch_dtype = torch.float32  # Use full precision for CPU
             logger.info("[IMAGE-GEN] CUDA not available. Using CPU (will be slower)")
         
-        # Model name - using Stable Diffusion 1.5 (smaller, faster)
-        model_name = os.getenv("SD_MODEL", "runwayml/stable-diffusion-v1-5")
+        model_name = SD_MODEL
         
         logger.info(f"[IMAGE-GEN] Loading Stable Diffusion model: {model_name}")
         logger.info("[IMAGE-GEN] This may take a few minutes on first run...")
@@ -246,9 +452,11 @@ def load_stable_diffusion_model():
             requires_safety_checker=False
         )
         
-        # Use DPMSolverMultistepScheduler for better quality (matches script)
-        pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
-        logger.info("[IMAGE-GEN] Using DPMSolverMultistepScheduler for better quality")
+        # Jobs get their own scheduler (schedulers.job_pipeline); the shared one is
+        # only used by direct pipe() calls. DPM++ 2M by default for better quality
+        scheduler_base_config = pipe.scheduler.config
+        pipe.scheduler = create_scheduler(DEFAULT_SCHEDULER, scheduler_base_config)
+        logger.info(f"[IMAGE-GEN] Default scheduler: {DEFAULT_SCHEDULER} ({type(pipe.scheduler).__name__})")
         
         # Move to device
         pipe = pipe.to(device)
@@ -269,7 +477,8 @@ def load_stable_diffusion_model():
                 logger.info("[IMAGE-GEN] xformers not available, using default attention")
         
         # For CPU, enable sequential CPU offloading to reduce memory usage
-        if device == "cpu":
+        # (its per-layer hooks would split the compiled graphs, so not with torch.compile)
+        if device == "cpu" and not TORCH_COMPILE_ENABLED:
             try:
                 pipe.enable_sequential_cpu_offload()
                 logger.info("[IMAGE-GEN] Enabled sequential CPU offloading (reduces memory usage)")
@@ -287,24 +496,75 @@ def load_stable_diffusion_model():
         return False
 
 
+def start_compiled_models():
+    """Compile the UNet and VAE decoder, warming the buckets requests can reach on this device"""
+    global compiled_models
+    try:
+        compiled_models = CompiledModels(pipe)
+        if TORCH_COMPILE_WARMUP:
+            buckets = [bucket for bucket in TORCH_COMPILE_BUCKETS if get_adjusted_dimensions(*bucket) == bucket]
+            compiled_models.warmup(get_job_pipeline(None, compiled=True), buckets)
+    except Exception as e:
+        logger.warning(f"[COMPILE] torch.compile unavailable, running eagerly: {str(e)}")
+        compiled_models = None
+
+
 @app.on_event("startup")
 async def startup_event():
     """Load model when service starts"""
     logger.info("[IMAGE-GEN] Starting up...")
     # Ensure LoRA directory exists
     ensure_lora_directory()
+    # Index deployed LoRAs in memory and watch for changes
+    start_lora_registry()
     # Load base model
     load_stable_diffusion_model()
     
+    # Keep every brand's textual-inversion style token resident (one text encoder resize)
+    if LORA_EMBEDDINGS_PRELOAD and pipe is not None:
+        loaded = load_style_embeddings(pipe)
+        if loaded:
+            logger.info(f"[IMAGE-GEN] Loaded {sum(loaded.values())}/{len(loaded)} brand style embeddings")
+    
+    # Encode the negative prompts nearly every request uses (base text encoder state)
+    if prompt_cache is not None and pipe is not None:
+        try:
+            default_negatives = [
+                enhance_prompts("", None, None)[1],
+                enhance_prompts("", GenerateRequest.model_fields["negative_prompt"].default, None)[1],
+            ]
+            prompt_cache.warm(pipe, default_negatives, get_text_encoder_state(), SD_MODEL)
+            logger.info(f"[IMAGE-GEN] Precomputed {len(default_negatives)} default negative prompt embeddings")
+        except Exception as e:
+            logger.warning(f"[IMAGE-GEN] Could not precompute negative prompt embeddings: {str(e)}")
+    
+    # Compile the UNet and VAE decoder before any adapters are loaded
+    if TORCH_COMPILE_ENABLED and pipe is not None:
+        start_compiled_models()
+    
     # Phase 2: Preload popular LoRAs if configured
     preload_brands = os.getenv("LORA_PRELOAD_BRANDS", "").strip()
-    if preload_brands and pipe is not None:
-        brand_list = [b.strip() for b in preload_brands.split(",") if b.strip()]
-        if brand_list:
-            logger.info(f"[IMAGE-GEN] Preloading {len(brand_list)} LoRAs: {brand_list}")
-            preload_results = preload_loras(pipe, brand_list)
-            successful = sum(1 for v in preload_results.values() if v)
-            logger.info(f"[IMAGE-GEN] Preloaded {successful}/{len(brand_list)} LoRAs successfully")
+    brand_list = [normalize_brand_id(b.strip()) for b in preload_brands.split(",") if b.strip()]
+    
+    # Add the most used brands from recorded usage stats, within the adapter memory budget
+    top_k = int(os.getenv("LORA_PRELOAD_TOP_K", str(LORA_CACHE_MAX_SIZE)))
+    budget_mb = float(os.getenv("LORA_PRELOAD_MEMORY_BUDGET_MB", "1024"))
+    if top_k > 0:
+        for brand_id in get_top_used_brands(top_k, budget_mb):
+            if brand_id not in brand_list:
+                brand_list.append(brand_id)
+    
+    if brand_list and pipe is not None:
+        logger.info(f"[IMAGE-GEN] Preloading {len(brand_list)} LoRAs: {brand_list}")
+        preload_results = preload_loras(pipe, brand_list)
+        successful = sum(1 for v in preload_results.values() if v)
+        logger.info(f"[IMAGE-GEN] Preloaded {successful}/{len(brand_list)} LoRAs successfully")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist LoRA usage stats so the next startup preloads the right brands"""
+    flush_usage_stats()
 
 
 @app.get("/")
@@ -321,6 +581,9 @@ async def root():
         "lora_support": True,
         "lora_directory": LORA_BASE_DIR,
         "lora_cache": cache_stats,  # Phase 2: Include cache stats
+        "prompt_cache": prompt_cache.stats() if prompt_cache is not None else None,
+        "early_stop": dict(early_stop_stats),
+        "torch_compile": compiled_models.stats() if compiled_models is not None else {"enabled": False},
         "description": "Stable Diffusion integration with LoRA support for brand-specific generation"
     }
 
@@ -328,7 +591,377 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "image-generation"}
+    health_status = {"status": "healthy", "service": "image-generation"}
+    if compiled_models is not None:
+        # Recompiles after warm-up mean requests are falling off the compiled graphs
+        health_status["torch_compile"] = compiled_models.stats()
+    return health_status
+
+
+def get_adjusted_dimensions(width: int, height: int) -> tuple:
+    """
+    Generation size for the current device (CPU renders at most 512px, multiple of 8,
+    and upscales afterwards); with torch.compile, snapped to the nearest
+    resolution bucket so the compiled graphs see a few static shapes
+    """
+    if device == "cpu" and (width > 512 or height > 512):
+        aspect_ratio = width / height
+        if aspect_ratio >= 1:
+            width, height = 512, int(512 / aspect_ratio)
+        else:
+            width, height = int(512 * aspect_ratio), 512
+        width, height = (width // 8) * 8, (height // 8) * 8
+    if TORCH_COMPILE_ENABLED:
+        return snap_to_bucket(width, height)
+    return width, height
+
+
+def enhance_prompts(
+    prompt: str,
+    negative_prompt: Optional[str],
+    style_brand_id: Optional[str],
+    style_tokens: Optional[List[str]] = None
+) -> tuple:
+    """
+    Add the brand style triggers and the default quality negatives to a request's prompts
+    
+    Args:
+        prompt: Positive prompt
+        negative_prompt: Negative prompt from the request
+        style_brand_id: Brand whose LoRA is loaded (None if no LoRA is applied)
+        style_tokens: Textual-inversion style tokens to append (e.g. "<apple_style>")
+        
+    Returns:
+        Tuple of (enhanced_prompt, enhanced_negative)
+    """
+    enhanced_prompt = prompt
+    if style_brand_id:
+        # Add brand style keyword (e.g., "apple_style") to prompt for better LoRA activation
+        normalized_id = normalize_brand_id(style_brand_id)
+        if f"{normalized_id}_style" not in enhanced_prompt.lower():
+            enhanced_prompt = f"{enhanced_prompt}, {normalized_id}_style"
+    for token in style_tokens or []:
+        if token not in enhanced_prompt:
+            enhanced_prompt = f"{enhanced_prompt}, {token}"
+    
+    # Enhanced negative prompt for better quality
+    enhanced_negative = negative_prompt or ""
+    if not enhanced_negative or len(enhanced_negative) < 50:
+        # Add comprehensive negative prompts if not provided
+        enhanced_negative = enhanced_negative + (", " + DEFAULT_NEGATIVES if enhanced_negative else DEFAULT_NEGATIVES)
+    return enhanced_prompt, enhanced_negative
+
+
+def get_prompt_kwargs(prompt: str, negative_prompt: str) -> Dict[str, Any]:
+    """
+    Prompt arguments for a pipeline call: cached text embeddings when the
+    prompt cache is enabled, the raw text otherwise
+    
+    Must be called after the request's LoRAs are loaded, since adapters on the
+    text encoder are part of the cache key.
+    """
+    if prompt_cache is None or pipe is None:
+        return {"prompt": prompt, "negative_prompt": negative_prompt}
+    try:
+        state = get_text_encoder_state()
+        return {
+            "prompt_embeds": prompt_cache.get(pipe, prompt, state, SD_MODEL),
+            "negative_prompt_embeds": prompt_cache.get(pipe, negative_prompt, state, SD_MODEL),
+        }
+    except Exception as e:
+        logger.warning(f"[IMAGE-GEN] Prompt cache unavailable, encoding as text: {str(e)}")
+        return {"prompt": prompt, "negative_prompt": negative_prompt}
+
+
+def make_generators(seed: Optional[int], count: int) -> tuple:
+    """
+    One seeded torch.Generator per image, so each variation is reproducible on its own
+    
+    Image i uses seed + i; a random base seed is drawn when none is given.
+    
+    Returns:
+        Tuple of (generators, seeds)
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32 - count)
+    seeds = [(seed + i) % 2 ** 32 for i in range(count)]
+    return [torch.Generator(device=device).manual_seed(s) for s in seeds], seeds
+
+
+def get_cfg_truncation(request: GenerateRequest, brand_id: Optional[str]) -> float:
+    """Fraction of steps with classifier-free guidance: the request's, the brand's, then the default"""
+    if request.cfg_truncation is not None:
+        return request.cfg_truncation
+    if brand_id:
+        try:
+            metadata = get_lora_metadata(brand_id) or {}
+            value = metadata.get("cfg_truncation")
+            if isinstance(value, (int, float)) and 0.0 < value <= 1.0:
+                return float(value)
+        except Exception as e:
+            logger.warning(f"[IMAGE-GEN] Failed to read cfg_truncation of {brand_id}: {str(e)}")
+    return CFG_TRUNCATION_DEFAULT
+
+
+def get_early_stop_threshold(request: GenerateRequest) -> float:
+    """Convergence threshold of a request (0 = run every step)"""
+    return request.early_stop_threshold if request.early_stop_threshold is not None else EARLY_STOP_THRESHOLD
+
+
+def record_steps_used(early_stop_threshold: float, steps_requested: int, steps_used: int):
+    """Add a generation with early stop enabled to early_stop_stats"""
+    if early_stop_threshold <= 0.0:
+        return
+    with early_stop_lock:
+        early_stop_stats["generations"] += 1
+        early_stop_stats["stopped_early"] += int(steps_used < steps_requested)
+        early_stop_stats["steps_requested"] += steps_requested
+        early_stop_stats["steps_used"] += steps_used
+
+
+def get_step_callbacks(cfg_fraction: float, early_stop_threshold: float) -> StepCallbacks:
+    """Step callbacks a generation needs (none at full guidance without early stop)"""
+    callbacks = []
+    if cfg_fraction < 1.0:
+        callbacks.append(CFGTruncation(cfg_fraction))
+    if early_stop_threshold > 0.0:
+        callbacks.append(ConvergenceStop(early_stop_threshold, min_fraction=EARLY_STOP_MIN_FRACTION))
+    return StepCallbacks(callbacks)
+
+
+def apply_request_defaults(request: GenerateRequest) -> GenerateRequest:
+    """
+    Fill in the step count and scheduler of a request from its preset (unless
+    the request sets them) or the service default
+    
+    Raises:
+        ValueError: If the preset or scheduler doesn't exist
+    """
+    update = {}
+    preset = get_speed_preset(request.preset) if request.preset else None
+    if preset and "num_inference_steps" not in request.model_fields_set:
+        update["num_inference_steps"] = preset["num_inference_steps"]
+    if request.scheduler:
+        validate_scheduler(request.scheduler)
+    else:
+        update["scheduler"] = preset["scheduler"] if preset else DEFAULT_SCHEDULER
+    return request.model_copy(update=update) if update else request
+
+
+def get_job_pipeline(scheduler_name: Optional[str], compiled: bool = False) -> StableDiffusionPipeline:
+    """The shared pipeline with a fresh scheduler of its own (and the compiled UNet if asked), for one pipeline call"""
+    job_pipe = job_pipeline(pipe, scheduler_name, scheduler_base_config)
+    if compiled and compiled_models is not None:
+        job_pipe.unet = compiled_models.unet
+    return job_pipe
+
+
+def can_use_compiled_unet(request: GenerateRequest, lora_loaded: bool) -> bool:
+    """
+    Whether a generation can run on the compiled UNet (counted in the compile stats)
+    
+    Resident PEFT layers (any adapter, even disabled), DeepCache, ToMe and
+    attention processor changes all change the UNet's modules, which would
+    recompile the graph on most requests; those run eagerly. Fused delta-mode
+    LoRAs only change weight values and are fine.
+    """
+    if compiled_models is None:
+        return False
+    compiled = _can_compile_request(request, lora_loaded)
+    compiled_models.record_job(compiled)
+    return compiled
+
+
+def _can_compile_request(request: GenerateRequest, lora_loaded: bool) -> bool:
+    if lora_loaded and LORA_FUSE_MODE != "delta":
+        return False
+    if not compiled_models.can_compile():
+        return False
+    if get_deep_cache_interval(request) > 1:
+        return False
+    if request.preset:
+        preset = get_speed_preset(request.preset)
+        # ToMe and turning off attention slicing both swap attention modules
+        if preset.get("tome_ratio", 0.0) > 0.0 or preset.get("attention_slicing") is False:
+            return False
+    return True
+
+
+def get_guidance_scale(scheduler_name: Optional[str]) -> float:
+    return get_scheduler_guidance_scale(scheduler_name, DEFAULT_GUIDANCE_SCALE)
+
+
+def require_pipeline_lock(patch: str):
+    """
+    Refuse to patch the shared UNet outside pipeline_lock
+    
+    Raises:
+        RuntimeError: If pipeline_lock isn't held
+    """
+    if not pipeline_lock.locked():
+        raise RuntimeError(f"{patch} patches the shared UNet, the generation must hold pipeline_lock")
+
+
+def preset_context(preset_name: Optional[str]):
+    """
+    A preset's token merging and attention settings for the duration of a pipeline call
+    
+    Both change the shared UNet for every running job, so the caller must hold
+    pipeline_lock.
+    """
+    if not preset_name:
+        return nullcontext()
+    require_pipeline_lock(f"Preset {preset_name}")
+    return SpeedPreset(pipe, get_speed_preset(preset_name))
+
+
+def get_deep_cache_interval(request: GenerateRequest) -> int:
+    """Full-UNet interval of a request (1 = DeepCache off)"""
+    return request.deep_cache_interval if request.deep_cache_interval is not None else DEEP_CACHE_INTERVAL
+
+
+def deep_cache_context(interval: int):
+    """
+    DeepCache on the pipeline's UNet for the duration of a pipeline call, or a no-op at interval 1
+    
+    The cache is keyed by input shape only, so a concurrent job would replay
+    this job's deep features; the caller must hold pipeline_lock.
+    """
+    if interval <= 1:
+        return nullcontext()
+    require_pipeline_lock("DeepCache")
+    return DeepCache(pipe.unet, interval=interval, branch=DEEP_CACHE_BRANCH)
+
+
+@contextmanager
+def sampling_context(preset_name: Optional[str], deep_cache_interval: int):
+    """Preset and DeepCache patches of the pipeline for the duration of a pipeline call"""
+    with preset_context(preset_name), deep_cache_context(deep_cache_interval):
+        yield
+
+
+def use_style_embeddings(lora_configs_list: List[Dict]) -> tuple:
+    """
+    Serve brands that have a style embedding with their token instead of their LoRA
+    
+    Configs pinning a version keep their LoRA (embeddings aren't versioned).
+    
+    Returns:
+        Tuple of (LoRA configs still to load, style tokens for the prompt)
+    """
+    remaining = []
+    style_tokens = []
+    for config in lora_configs_list:
+        token = None if config.get("version") else get_style_embedding_token(pipe, config["brand_id"])
+        if token:
+            style_tokens.append(token)
+        else:
+            remaining.append(config)
+    return remaining, style_tokens
+
+
+def generate_weight_sweep(request: GenerateRequest, log_tag: str) -> GenerateResponse:
+    """
+    Generate one image per LoRA weight in request.weight_variations
+    
+    All variations share the seed (identical starting latents) and the prompt,
+    so only the weight differs. A single LoRA is swept in batched passes of up
+    to MIXED_BATCH_MAX_SIZE with a per-sample adapter scale (MixedLoRABatch),
+    loading the adapter once. Compositions and "delta" fuse mode run the
+    variations back to back on the resident adapters, sweeping the first
+    LoRA's weight.
+    
+    Raises:
+        ValueError: If the request has no LoRA or a weight is outside 0.0-1.0
+    """
+    global pipe, device
+    
+    if pipe is None:
+        raise Exception("Model not loaded")
+    weights = request.weight_variations or DEFAULT_WEIGHT_VARIATIONS
+    if any(not 0.0 <= weight <= 1.0 for weight in weights):
+        raise ValueError("weight_variations must be between 0.0 and 1.0")
+    
+    if request.lora_configs and len(request.lora_configs) > 0:
+        configs = [{"brand_id": cfg.brand_id, "weight": cfg.weight, "type": cfg.type, "version": cfg.version} for cfg in request.lora_configs]
+    else:
+        configs = [{"brand_id": brand_id, "weight": request.lora_weights, "version": version} for brand_id, version in get_request_loras(request)]
+    if not configs:
+        raise ValueError("test_weights needs a LoRA (brand_id or lora_configs)")
+    
+    width, height = get_adjusted_dimensions(request.width, request.height)
+    seed = request.seed if request.seed is not None else random.randrange(2 ** 32)
+    prompt, negative = enhance_prompts(request.prompt, request.negative_prompt, configs[0]["brand_id"])
+    pipe_kwargs = {
+        "width": width,
+        "height": height,
+        "num_inference_steps": request.num_inference_steps,
+        "guidance_scale": get_guidance_scale(request.scheduler),
+        **get_step_callbacks(get_cfg_truncation(request, configs[0]["brand_id"]), get_early_stop_threshold(request)).pipe_kwargs(),
+    }
+    logger.info(f"[{log_tag}] Sweeping {configs[0]['brand_id']} over weights {weights} (seed {seed})")
+    
+    job_pipe = get_job_pipeline(request.scheduler)
+    images = []
+    with pipeline_lock:
+        if len(configs) == 1 and LORA_FUSE_MODE != "delta":
+            config = configs[0]
+            try:
+                # Inside the try: a failed load may still hold a job reference on the adapter
+                adapter_name = load_lora_adapter(pipe, normalize_brand_id(config["brand_id"]), weights[0], config["version"])
+                if adapter_name is None:
+                    raise ValueError(f"LoRA not available for {config['brand_id']}")
+                for start in range(0, len(weights), MIXED_BATCH_MAX_SIZE):
+                    chunk = weights[start:start + MIXED_BATCH_MAX_SIZE]
+                    generators = [torch.Generator(device=device).manual_seed(seed) for _ in chunk]
+                    sample_adapters = [(adapter_name, weight) for weight in chunk]
+                    with MixedLoRABatch(pipe, sample_adapters), sampling_context(request.preset, get_deep_cache_interval(request)), torch.no_grad():
+                        result = job_pipe(
+                            prompt=[prompt] * len(chunk),
+                            negative_prompt=[negative] * len(chunk),
+                            generator=generators,
+                            **pipe_kwargs
+                        )
+                    images.extend(result.images)
+            finally:
+                unload_lora_weights(pipe)
+        else:
+            for weight in weights:
+                try:
+                    load_multiple_lora_weights(pipe, [dict(configs[0], weight=weight)] + configs[1:])
+                    with sampling_context(request.preset, get_deep_cache_interval(request)), torch.no_grad():
+                        result = job_pipe(
+                            **get_prompt_kwargs(prompt, negative),
+                            generator=torch.Generator(device=device).manual_seed(seed),
+                            **pipe_kwargs
+                        )
+                finally:
+                    unload_lora_weights(pipe)
+                images.append(result.images[0])
+    
+    if width != request.width or height != request.height:
+        images = [image.resize((request.width, request.height), Image.Resampling.LANCZOS) for image in images]
+    images_base64 = encode_output_images(images, request.width, request.height)
+    contact_sheet_base64 = None
+    if request.contact_sheet:
+        labels = [f"{configs[0]['brand_id']} @ {weight:.2f}" for weight in weights]
+        contact_sheet_base64 = image_to_base64(create_contact_sheet(images, labels))
+    
+    logger.info(f"[{log_tag}] Weight sweep completed ({len(images)} images)")
+    return GenerateResponse(
+        success=True,
+        image_base64=images_base64[0],
+        image_url=None,
+        images_base64=images_base64,
+        weights=list(weights),
+        seeds=[seed] * len(images),
+        scheduler=request.scheduler,
+        preset=get_speed_preset(request.preset) if request.preset else None,
+        contact_sheet_base64=contact_sheet_base64,
+        message=f"Generated {len(images)} weight variations (seed {seed})",
+        mock=False,
+        device=device
+    )
 
 
 def process_image_generation(job_id: str, request: GenerateRequest):
@@ -345,133 +978,143 @@ def process_image_generation(job_id: str, request: GenerateRequest):
         
         logger.info(f"[JOB-{job_id}] Starting image generation...")
         
+        if request.test_weights:
+            sweep_result = generate_weight_sweep(request, f"JOB-{job_id}")
+            with jobs_lock:
+                jobs[job_id]["status"] = JobStatus.COMPLETED
+                jobs[job_id]["result"] = sweep_result
+                jobs[job_id]["updated_at"] = datetime.now().isoformat()
+            return
+        
         # Adjust dimensions for CPU
-        adjusted_width = request.width
-        adjusted_height = request.height
-        
-        if device == "cpu":
-            aspect_ratio = request.width / request.height
-            if request.width > 512 or request.height > 512:
-                if aspect_ratio >= 1:
-                    adjusted_width = 512
-                    adjusted_height = int(512 / aspect_ratio)
-                else:
-                    adjusted_height = 512
-                    adjusted_width = int(512 * aspect_ratio)
-                adjusted_width = (adjusted_width // 8) * 8
-                adjusted_height = (adjusted_height // 8) * 8
-                logger.info(f"[JOB-{job_id}] CPU: Reduced dimensions to {adjusted_width}x{adjusted_height}")
-        
-        # Phase 3: Handle multiple LoRA configs OR single brand_id (backward compatibility)
-        lora_loaded = False
-        
-        if request.lora_configs and len(request.lora_configs) > 0:
-            # Phase 3: Multiple LoRA support
-            try:
-                logger.info(f"[JOB-{job_id}] Loading {len(request.lora_configs)} LoRAs for composition...")
-                lora_configs_list = [{"brand_id": cfg.brand_id, "weight": cfg.weight, "type": cfg.type} for cfg in request.lora_configs]
-                pipe = load_multiple_lora_weights(pipe, lora_configs_list)
-                lora_loaded = True
-            except Exception as e:
-                logger.warning(f"[JOB-{job_id}] Failed to load multiple LoRAs: {str(e)}")
-        else:
-            # Phase 1 & 2: Single LoRA support (backward compatible)
-            final_brand_id = request.brand_id
-            if not final_brand_id and request.brand_data is not None:
+        adjusted_width, adjusted_height = get_adjusted_dimensions(request.width, request.height)
+        if (adjusted_width, adjusted_height) != (request.width, request.height):
+            logger.info(f"[JOB-{job_id}] CPU: Reduced dimensions to {adjusted_width}x{adjusted_height}")
+        
+        # One job at a time on the shared pipeline from LoRA load to unload
+        # (adapters, DeepCache and preset patches are applied to the shared UNet)
+        with pipeline_lock:
+            # Phase 3: Handle multiple LoRA configs OR single brand_id (backward compatibility)
+            lora_loaded = False
+            style_tokens = []
+        
+            if request.lora_configs and len(request.lora_configs) > 0:
+                # Phase 3: Multiple LoRA support
                 try:
-                    final_brand_id = get_brand_id_from_data(request.brand_data)
+                    lora_configs_list = [{"brand_id": cfg.brand_id, "weight": cfg.weight, "type": cfg.type, "version": cfg.version} for cfg in request.lora_configs]
+                    if request.style_mode == StyleMode.EMBEDDING:
+                        lora_configs_list, style_tokens = use_style_embeddings(lora_configs_list)
+                    if lora_configs_list:
+                        logger.info(f"[JOB-{job_id}] Loading {len(lora_configs_list)} LoRAs for composition...")
+                        pipe = load_multiple_lora_weights(pipe, lora_configs_list)
+                        lora_loaded = True
                 except Exception as e:
-                    logger.warning(f"[JOB-{job_id}] Failed to extract brand_id: {str(e)}")
+                    logger.warning(f"[JOB-{job_id}] Failed to load multiple LoRAs: {str(e)}")
+            else:
+                # Phase 1 & 2: Single LoRA support (backward compatible)
+                final_brand_id = request.brand_id
+                if not final_brand_id and request.brand_data is not None:
+                    try:
+                        final_brand_id = get_brand_id_from_data(request.brand_data)
+                    except Exception as e:
+                        logger.warning(f"[JOB-{job_id}] Failed to extract brand_id: {str(e)}")
             
-            # Save brand metadata
-            if request.brand_data is not None:
-                try:
-                    save_brand_id = final_brand_id or get_brand_id_from_data(request.brand_data)
-                    if save_brand_id:
-                        save_brand_metadata(save_brand_id, request.brand_data)
-                except Exception as e:
-                    logger.warning(f"[JOB-{job_id}] Failed to save brand metadata: {str(e)}")
+                # Save brand metadata
+                if request.brand_data is not None:
+                    try:
+                        save_brand_id = final_brand_id or get_brand_id_from_data(request.brand_data)
+                        if save_brand_id:
+                            save_brand_metadata(save_brand_id, request.brand_data)
+                    except Exception as e:
+                        logger.warning(f"[JOB-{job_id}] Failed to save brand metadata: {str(e)}")
             
-            # Load single LoRA if needed
-            if final_brand_id:
-                try:
-                    normalized_brand_id = normalize_brand_id(final_brand_id)
-                    pipe = load_lora_weights(pipe, normalized_brand_id, request.lora_weights)
-                    lora_loaded = True
-                except Exception as e:
-                    logger.warning(f"[JOB-{job_id}] Failed to load LoRA: {str(e)}")
+                # Load single LoRA if needed (or use the brand's style token)
+                if final_brand_id:
+                    try:
+                        normalized_brand_id = normalize_brand_id(final_brand_id)
+                        token = get_style_embedding_token(pipe, normalized_brand_id) if request.style_mode == StyleMode.EMBEDDING else None
+                        if token:
+                            style_tokens.append(token)
+                        else:
+                            pipe = load_lora_weights(pipe, normalized_brand_id, request.lora_weights)
+                            lora_loaded = True
+                    except Exception as e:
+                        logger.warning(f"[JOB-{job_id}] Failed to load LoRA: {str(e)}")
         
-        # Generate image
-        if pipe is None:
-            raise Exception("Model not loaded")
+            # Generate image
+            if pipe is None:
+                raise Exception("Model not loaded")
         
-        logger.info(f"[JOB-{job_id}] Generating image on {device}...")
+            logger.info(f"[JOB-{job_id}] Generating image on {device}...")
         
-        # Enhance prompt with brand style keywords if LoRA is loaded
-        enhanced_prompt = request.prompt
-        final_brand_id_for_prompt = None
+            # Enhance prompt with brand style keywords if LoRA is loaded
+            enhanced_prompt = request.prompt
+            final_brand_id_for_prompt = None
         
-        if request.lora_configs and len(request.lora_configs) > 0:
-            # Use first LoRA's brand_id for prompt enhancement
-            final_brand_id_for_prompt = request.lora_configs[0].brand_id
-        elif request.brand_id:
-            final_brand_id_for_prompt = request.brand_id
-        elif request.brand_data:
-            try:
-                final_brand_id_for_prompt = get_brand_id_from_data(request.brand_data)
-            except:
-                pass
-        
-        if lora_loaded and final_brand_id_for_prompt:
-            # Add brand style trigger to prompt for better LoRA activation
-            normalized_id = normalize_brand_id(final_brand_id_for_prompt)
-            # Add brand style keyword (e.g., "apple_style") to prompt
-            if f"{normalized_id}_style" not in enhanced_prompt.lower():
-                enhanced_prompt = f"{enhanced_prompt}, {normalized_id}_style"
-                logger.info(f"[JOB-{job_id}] Enhanced prompt with brand style keyword: {normalized_id}_style")
-        
-        # Enhanced negative prompt for better quality
-        enhanced_negative = request.negative_prompt or ""
-        if not enhanced_negative or len(enhanced_negative) < 50:
-            # Add comprehensive negative prompts if not provided
-            default_negatives = "blurry, low quality, distorted, text, letters, words, typography, watermark, ugly, amateur, cluttered, busy background, low resolution, oversaturated, poorly lit, bad composition"
-            enhanced_negative = enhanced_negative + (", " + default_negatives if enhanced_negative else default_negatives)
-        
-        with torch.no_grad():
-            result = pipe(
-                prompt=enhanced_prompt,
-                negative_prompt=enhanced_negative,
-                width=adjusted_width,
-                height=adjusted_height,
-                num_inference_steps=request.num_inference_steps,
-                guidance_scale=8.5,  # Higher guidance for stronger prompt adherence (increased from 7.5)
+            if request.lora_configs and len(request.lora_configs) > 0:
+                # Use first LoRA's brand_id for prompt enhancement
+                final_brand_id_for_prompt = request.lora_configs[0].brand_id
+            elif request.brand_id:
+                final_brand_id_for_prompt = request.brand_id
+            elif request.brand_data:
+                try:
+                    final_brand_id_for_prompt = get_brand_id_from_data(request.brand_data)
+                except:
+                    pass
+        
+            enhanced_prompt, enhanced_negative = enhance_prompts(
+                enhanced_prompt, request.negative_prompt, final_brand_id_for_prompt if lora_loaded else None, style_tokens
             )
+            if enhanced_prompt != request.prompt:
+                logger.info(f"[JOB-{job_id}] Enhanced prompt with brand style keywords: {enhanced_prompt[len(request.prompt):]}")
+        
+            generators, seeds = make_generators(request.seed, request.num_images)
+            cfg_fraction = get_cfg_truncation(request, final_brand_id_for_prompt)
+            step_callbacks = get_step_callbacks(cfg_fraction, get_early_stop_threshold(request))
+            logger.info(f"[JOB-{job_id}] {request.num_images} image(s), seeds {seeds}, {request.scheduler}, CFG for {cfg_fraction:.0%} of steps")
         
-        # Unload LoRA
-        if lora_loaded:
             try:
-                unload_lora_weights(pipe)
-            except Exception as e:
-                logger.warning(f"[JOB-{job_id}] Error unloading LoRA: {str(e)}")
+                job_pipe = get_job_pipeline(request.scheduler, compiled=can_use_compiled_unet(request, lora_loaded))
+                with sampling_context(request.preset, get_deep_cache_interval(request)), torch.no_grad():
+                    result = job_pipe(
+                        **get_prompt_kwargs(enhanced_prompt, enhanced_negative),
+                        width=adjusted_width,
+                        height=adjusted_height,
+                        num_inference_steps=request.num_inference_steps,
+                        guidance_scale=get_guidance_scale(request.scheduler),
+                        num_images_per_prompt=request.num_images,
+                        generator=generators,
+                        **step_callbacks.pipe_kwargs(),
+                    )
+            finally:
+                # Unload LoRA
+                if lora_loaded:
+                    try:
+                        unload_lora_weights(pipe)
+                    except Exception as e:
+                        logger.warning(f"[JOB-{job_id}] Error unloading LoRA: {str(e)}")
         
-        # Extract and process image
-        generated_image = result.images[0]
+        steps_used = step_callbacks.steps_used or request.num_inference_steps
+        record_steps_used(get_early_stop_threshold(request), request.num_inference_steps, steps_used)
         
-        if device == "cpu" and (adjusted_width != request.width or adjusted_height != request.height):
+        # Upscale (CPU) and convert to base64
+        if (adjusted_width, adjusted_height) != (request.width, request.height):
             logger.info(f"[JOB-{job_id}] Upscaling to {request.width}x{request.height}")
-            generated_image = generated_image.resize((request.width, request.height), Image.Resampling.LANCZOS)
-        
-        # Convert to base64
-        image_base64 = image_to_base64(generated_image)
+        images_base64 = encode_output_images(result.images, request.width, request.height)
         
         # Update job with result
         with jobs_lock:
             jobs[job_id]["status"] = JobStatus.COMPLETED
             jobs[job_id]["result"] = GenerateResponse(
                 success=True,
-                image_base64=image_base64,
+                image_base64=images_base64[0],
                 image_url=None,
-                message="Image generated successfully",
+                images_base64=images_base64 if len(images_base64) > 1 else None,
+                seeds=seeds,
+                steps_used=steps_used,
+                preset=get_speed_preset(request.preset) if request.preset else None,
+                scheduler=request.scheduler,
+                message="Image generated successfully" if len(images_base64) == 1 else f"Generated {len(images_base64)} variations",
                 mock=False,
                 device=device
             )
@@ -488,6 +1131,204 @@ def process_image_generation(job_id: str, request: GenerateRequest):
             jobs[job_id]["updated_at"] = datetime.now().isoformat()
 
 
+def get_request_loras(request: GenerateRequest) -> List[tuple]:
+    """Get the (brand_id, version) pairs whose LoRAs a request will load (same precedence as generation)"""
+    if request.lora_configs and len(request.lora_configs) > 0:
+        return [(cfg.brand_id, cfg.version) for cfg in request.lora_configs]
+    brand_id = request.brand_id
+    if not brand_id and request.brand_data is not None:
+        try:
+            brand_id = get_brand_id_from_data(request.brand_data)
+        except Exception:
+            brand_id = None
+    return [(brand_id, None)] if brand_id else []
+
+
+def get_mixed_batch_lora(request: GenerateRequest) -> Optional[tuple]:
+    """
+    (brand_id, version, weight) of a request's LoRA in a mixed-adapter batch, or None for the base model
+    
+    Raises:
+        ValueError: If the request composes several LoRAs (it runs as a regular job instead)
+    """
+    if request.lora_configs and len(request.lora_configs) > 0:
+        if len(request.lora_configs) > 1:
+            raise ValueError("LoRA compositions can't share a mixed-adapter batch")
+        cfg = request.lora_configs[0]
+        return normalize_brand_id(cfg.brand_id), cfg.version, cfg.weight
+    loras = get_request_loras(request)
+    if loras:
+        return normalize_brand_id(loras[0][0]), None, request.lora_weights
+    return None
+
+
+def run_mixed_batch(
+    members: List[tuple],
+    width: int,
+    height: int,
+    num_inference_steps: int,
+    cfg_fraction: float = 1.0,
+    deep_cache_interval: int = 1,
+    early_stop_threshold: float = 0.0,
+    preset: Optional[str] = None,
+    scheduler: Optional[str] = None
+):
+    """
+    Generate one denoising batch where each request uses its own LoRA adapter
+    
+    Args:
+        members: (job_id, request, lora) tuples, lora from get_mixed_batch_lora()
+        width: Generation width shared by the batch
+        height: Generation height shared by the batch
+        num_inference_steps: Step count shared by the batch
+        cfg_fraction: Fraction of steps with classifier-free guidance, shared by the batch
+        deep_cache_interval: DeepCache full-UNet interval shared by the batch (1 = off)
+        early_stop_threshold: Convergence threshold shared by the batch (0 = off); the batch
+            stops when every sample has converged
+        preset: Speed preset shared by the batch
+        scheduler: Scheduler shared by the batch
+    """
+    global pipe, device
+    
+    job_ids = [job_id for job_id, _, _ in members]
+    batch_tag = f"BATCH-{job_ids[0][:8]}"
+    with jobs_lock:
+        for job_id in job_ids:
+            jobs[job_id]["status"] = JobStatus.PROCESSING
+            jobs[job_id]["updated_at"] = datetime.now().isoformat()
+    
+    try:
+        if pipe is None:
+            raise Exception("Model not loaded")
+        
+        logger.info(f"[{batch_tag}] Generating {len(members)} images at {width}x{height} on {device}...")
+        with pipeline_lock:
+            adapters = []
+            prompts = []
+            negatives = []
+            generators = []
+            seeds = []
+            for job_id, request, lora in members:
+                if request.brand_data is not None:
+                    try:
+                        save_brand_id = get_brand_id_from_data(request.brand_data)
+                        if save_brand_id:
+                            save_brand_metadata(save_brand_id, request.brand_data)
+                    except Exception as e:
+                        logger.warning(f"[JOB-{job_id}] Failed to save brand metadata: {str(e)}")
+                
+                adapter_name = None
+                style_tokens = []
+                if lora:
+                    brand_id, version, weight = lora
+                    token = None
+                    if request.style_mode == StyleMode.EMBEDDING and not version:
+                        token = get_style_embedding_token(pipe, brand_id)
+                    if token:
+                        style_tokens.append(token)
+                    else:
+                        adapter_name = load_lora_adapter(pipe, brand_id, weight, version)
+                adapters.append((adapter_name, lora[2]) if adapter_name else None)
+                prompt, negative = enhance_prompts(request.prompt, request.negative_prompt, lora[0] if adapter_name else None, style_tokens)
+                prompts.append(prompt)
+                negatives.append(negative)
+                (generator,), (seed,) = make_generators(request.seed, 1)
+                generators.append(generator)
+                seeds.append(seed)
+            
+            step_callbacks = get_step_callbacks(cfg_fraction, early_stop_threshold)
+            try:
+                job_pipe = get_job_pipeline(scheduler)
+                with MixedLoRABatch(pipe, adapters), sampling_context(preset, deep_cache_interval), torch.no_grad():
+                    result = job_pipe(
+                        prompt=prompts,
+                        negative_prompt=negatives,
+                        width=width,
+                        height=height,
+                        num_inference_steps=num_inference_steps,
+                        guidance_scale=get_guidance_scale(scheduler),
+                        generator=generators,
+                        **step_callbacks.pipe_kwargs(),
+                    )
+            finally:
+                unload_lora_weights(pipe)
+        
+        steps_used = step_callbacks.steps_used or num_inference_steps
+        for _ in members:
+            record_steps_used(early_stop_threshold, num_inference_steps, steps_used)
+        images_base64 = list(output_executor.map(
+            lambda member, image: encode_output_images([image], member[1].width, member[1].height)[0],
+            members, result.images
+        ))
+        for (job_id, _, _), image_base64, seed in zip(members, images_base64, seeds):
+            with jobs_lock:
+                jobs[job_id]["status"] = JobStatus.COMPLETED
+                jobs[job_id]["result"] = GenerateResponse(
+                    success=True,
+                    image_base64=image_base64,
+                    image_url=None,
+                    seeds=[seed],
+                    steps_used=steps_used,
+                    preset=get_speed_preset(preset) if preset else None,
+                    scheduler=scheduler,
+                    message="Image generated successfully (mixed-adapter batch)",
+                    mock=False,
+                    device=device
+                )
+                jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        
+        logger.info(f"[{batch_tag}] Batch of {len(members)} completed successfully")
+    
+    except Exception as e:
+        logger.error(f"[{batch_tag}] Error generating batch: {str(e)}")
+        logger.exception(e)
+        with jobs_lock:
+            for job_id in job_ids:
+                jobs[job_id]["status"] = JobStatus.FAILED
+                jobs[job_id]["error"] = str(e)
+                jobs[job_id]["updated_at"] = datetime.now().isoformat()
+
+
+def process_batch_generation(job_ids: List[str], requests: List[GenerateRequest]):
+    """
+    Background task for /generate-batch-async
+    
+    Requests with the same generation size and sampling settings and at most one LoRA
+    share denoising batches of up to MIXED_BATCH_MAX_SIZE, each sample with its
+    own adapter. LoRA compositions, weight sweeps, multi-image requests (and
+    every LoRA request in "delta" fuse mode) run as regular jobs afterwards.
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    sequential = []
+    for job_id, request in zip(job_ids, requests):
+        if request.test_weights or request.num_images > 1:
+            sequential.append((job_id, request))
+            continue
+        try:
+            lora = get_mixed_batch_lora(request)
+        except ValueError:
+            sequential.append((job_id, request))
+            continue
+        if lora and LORA_FUSE_MODE == "delta":
+            sequential.append((job_id, request))
+            continue
+        width, height = get_adjusted_dimensions(request.width, request.height)
+        cfg_fraction = get_cfg_truncation(request, lora[0] if lora else None)
+        group_key = (
+            width, height, request.num_inference_steps,
+            cfg_fraction, get_deep_cache_interval(request), get_early_stop_threshold(request),
+            request.preset, request.scheduler
+        )
+        groups.setdefault(group_key, []).append((job_id, request, lora))
+    
+    for group_key, members in groups.items():
+        for start in range(0, len(members), MIXED_BATCH_MAX_SIZE):
+            run_mixed_batch(members[start:start + MIXED_BATCH_MAX_SIZE], *group_key)
+    
+    for job_id, request in sequential:
+        process_image_generation(job_id, request)
+
+
 @app.post("/generate-async", response_model=JobResponse)
 async def generate_image_async(request: GenerateRequest, background_tasks: BackgroundTasks):
     """
@@ -496,6 +1337,11 @@ async def generate_image_async(request: GenerateRequest, background_tasks: Backg
     Use this endpoint for long-running generations to avoid timeouts.
     Poll /job/{job_id}/status to check progress.
     """
+    try:
+        request = apply_request_defaults(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Create job
     job_id = str(uuid.uuid4())
     
@@ -510,6 +1356,10 @@ async def generate_image_async(request: GenerateRequest, background_tasks: Backg
             "updated_at": datetime.now().isoformat(),
         }
     
+    # Start reading the job's LoRA files while earlier jobs are still running
+    for brand_id, version in get_request_loras(request):
+        prefetch_lora(normalize_brand_id(brand_id), version)
+    
     # Start background task
     background_tasks.add_task(process_image_generation, job_id, request)
     
@@ -522,6 +1372,62 @@ async def generate_image_async(request: GenerateRequest, background_tasks: Backg
     )
 
 
+@app.post("/generate-batch-async", response_model=BatchJobResponse)
+async def generate_batch_async(request: BatchGenerateRequest, background_tasks: BackgroundTasks):
+    """
+    Generate several images asynchronously, sharing denoising batches across brands
+    
+    Each request gets its own job; poll /job/{job_id}/status for each id.
+    Requests for different brand LoRAs run in one batched forward pass with
+    per-sample adapters instead of one denoising loop per brand.
+    """
+    try:
+        requests = [apply_request_defaults(generate_request) for generate_request in request.requests]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    job_ids = []
+    with jobs_lock:
+        for generate_request in requests:
+            job_id = str(uuid.uuid4())
+            jobs[job_id] = {
+                "job_id": job_id,
+                "status": JobStatus.PENDING,
+                "request": generate_request,
+                "result": None,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat(),
+            }
+            job_ids.append(job_id)
+    
+    for generate_request in requests:
+        for brand_id, version in get_request_loras(generate_request):
+            prefetch_lora(normalize_brand_id(brand_id), version)
+    
+    background_tasks.add_task(process_batch_generation, job_ids, requests)
+    
+    logger.info(f"[BATCH-{job_ids[0][:8]}] Created {len(job_ids)} jobs")
+    
+    return BatchJobResponse(
+        job_ids=job_ids,
+        status=JobStatus.PENDING,
+        message="Jobs created. Use /job/{job_id}/status to check each job's progress."
+    )
+
+
+@app.get("/presets")
+async def list_presets():
+    """List the speed presets a request can use, with their settings"""
+    return {"presets": {name: get_speed_preset(name) for name in SPEED_PRESETS}}
+
+
+@app.get("/schedulers")
+async def list_schedulers_endpoint():
+    """List the schedulers a request can pick"""
+    return {"default": DEFAULT_SCHEDULER, "schedulers": list_schedulers()}
+
+
 @app.get("/job/{job_id}/status", response_model=JobStatusResponse)
 async def get_job_status(job_id: str):
     """Get the status of an async image generation job"""
@@ -550,7 +1456,7 @@ async def get_lora_cache_stats():
 @app.post("/lora/cache/clear")
 async def clear_lora_cache():
     """Phase 2: Clear the LoRA cache"""
-    clear_cache()
+    clear_cache(pipe)
     return {"message": "LoRA cache cleared successfully", "stats": get_cache_stats()}
 
 
@@ -573,13 +1479,112 @@ async def get_lora_metadata_endpoint(brand_id: str):
     return metadata
 
 
+@app.post("/lora/{brand_id}/reload")
+async def reload_lora_endpoint(brand_id: str, force: bool = False):
+    """
+    Hot reload a redeployed LoRA without restarting the service
+    
+    The new version loads in the background and is used by jobs that start
+    afterwards; jobs already running finish on the old version.
+    Changed files are also picked up automatically by the registry watcher.
+    """
+    # Refreshing the registry hashes the adapter file, keep it off the event loop
+    return await run_in_threadpool(reload_lora, brand_id, force=force)
+
+
+def _write_upload_block(f, digest, block: bytes):
+    """Append a block of an upload to its temp file and to its running hash"""
+    f.write(block)
+    digest.update(block)
+
+
+@app.post("/lora/{brand_id}")
+async def upload_lora_endpoint(
+    brand_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: Optional[str] = None,
+    normalize: bool = True,
+    warm: bool = False
+):
+    """
+    Upload and deploy a brand's LoRA adapter (raw .safetensors request body, chunked or not)
+    
+    The body is streamed to a temp file and hashed on the way, so the adapter is
+    never held in memory; disk writes, validation and publishing run in the
+    threadpool. The adapter is published as a new version (same as deploy_lora.py)
+    and used by jobs that start afterwards. With warm=true its tensors are read
+    into the prefetch buffer in the background, so the first job doesn't wait on disk.
+    
+    Example:
+        curl -X POST "http://localhost:8000/lora/apple?warm=true&filename=apple_v3.safetensors" \\
+             -H "Content-Type: application/octet-stream" --data-binary @apple_v3.safetensors
+    """
+    normalized_id = normalize_brand_id(brand_id)
+    if not normalized_id:
+        raise HTTPException(status_code=400, detail=f"Invalid brand_id: {brand_id}")
+    
+    max_bytes = int(LORA_UPLOAD_MAX_MB * 1024 * 1024)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Adapter exceeds LORA_UPLOAD_MAX_MB={LORA_UPLOAD_MAX_MB:g}")
+    
+    # Hidden directory: the registry ignores it, so partial uploads are never indexed
+    upload_dir = os.path.join(LORA_BASE_DIR, ".uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    upload_path = os.path.join(upload_dir, f"{normalized_id}.{uuid.uuid4().hex}.safetensors")
+    digest = hashlib.sha256()
+    received = 0
+    
+    try:
+        with open(upload_path, 'wb') as f:
+            block = bytearray()
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Adapter exceeds LORA_UPLOAD_MAX_MB={LORA_UPLOAD_MAX_MB:g}")
+                block += chunk
+                if len(block) >= UPLOAD_WRITE_BLOCK_SIZE:
+                    await run_in_threadpool(_write_upload_block, f, digest, bytes(block))
+                    block.clear()
+            if block:
+                await run_in_threadpool(_write_upload_block, f, digest, bytes(block))
+        
+        if received == 0:
+            raise HTTPException(status_code=400, detail="Empty request body")
+        logger.info(f"[LORA-UPLOAD] Received {received / 1024 / 1024:.2f} MB for {normalized_id}")
+        
+        try:
+            result = await run_in_threadpool(
+                deploy_uploaded_lora, normalized_id, upload_path, digest.hexdigest(), filename, normalize
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid LoRA file: {str(e)}")
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            os.remove(upload_path)
+        except FileNotFoundError:
+            pass
+    
+    if warm:
+        background_tasks.add_task(prefetch_lora, normalized_id)
+    
+    logger.info(f"[LORA-UPLOAD] {normalized_id} is at version {result['version']} (published: {result['published']})")
+    return {**result, "warming": warm}
+
+
 @app.post("/generate", response_model=GenerateResponse)
-async def generate_image(request: GenerateRequest):
+def generate_image(request: GenerateRequest):
     """
     Generate an image from a text prompt using Stable Diffusion
     
     Phase 5: Real image generation with Stable Diffusion
     
+    A plain def, so FastAPI runs it in its threadpool: waiting for
+    pipeline_lock and the denoising loop never block the event loop.
+    
     Args:
         request: GenerateRequest with prompt and parameters
     
@@ -587,6 +1592,20 @@ async def generate_image(request: GenerateRequest):
         GenerateResponse with generated image (base64 or URL)
     """
     global pipe, device  # Declare global variables to modify them
+    try:
+        request = apply_request_defaults(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if request.test_weights:
+        try:
+            return generate_weight_sweep(request, "IMAGE-GEN")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.exception(e)
+            raise HTTPException(status_code=500, detail=f"Failed to generate weight sweep: {str(e)}")
+    
     try:
         logger.info(f"[IMAGE-GEN] Received generation request:")
         logger.info(f"  Prompt: {request.prompt[:100]}...")
@@ -594,153 +1613,144 @@ async def generate_image(request: GenerateRequest):
         logger.info(f"  Requested dimensions: {request.width}x{request.height}")
         logger.info(f"  Steps: {request.num_inference_steps}")
         
-        # Adjust dimensions for CPU to prevent out-of-memory errors
-        # CPU has limited memory, so we need to reduce dimensions
-        adjusted_width = request.width
-        adjusted_height = request.height
-        
-        if device == "cpu":
-            # For CPU, limit to 512x512 to prevent OOM errors
-            # Calculate aspect ratio to maintain it
-            aspect_ratio = request.width / request.height
-            
-            if request.width > 512 or request.height > 512:
-                if aspect_ratio >= 1:
-                    # Landscape or square
-                    adjusted_width = 512
-                    adjusted_height = int(512 / aspect_ratio)
-                else:
-                    # Portrait
-                    adjusted_height = 512
-                    adjusted_width = int(512 * aspect_ratio)
-                
-                # Ensure dimensions are multiples of 8 (required by Stable Diffusion)
-                adjusted_width = (adjusted_width // 8) * 8
-                adjusted_height = (adjusted_height // 8) * 8
-                
-                logger.warning(f"[IMAGE-GEN] CPU detected: Reducing dimensions from {request.width}x{request.height} to {adjusted_width}x{adjusted_height} to prevent OOM")
+        # Adjust dimensions for CPU to prevent out-of-memory errors (and snap to a compile bucket)
+        adjusted_width, adjusted_height = get_adjusted_dimensions(request.width, request.height)
+        if (adjusted_width, adjusted_height) != (request.width, request.height):
+            logger.warning(f"[IMAGE-GEN] Adjusting dimensions from {request.width}x{request.height} to {adjusted_width}x{adjusted_height}")
         
         logger.info(f"  Final dimensions: {adjusted_width}x{adjusted_height}")
         
-        # Phase 3: Handle multiple LoRA configs OR single brand_id (backward compatibility)
-        lora_loaded = False
+        # One job at a time on the shared pipeline from LoRA load to unload
+        # (adapters, DeepCache and preset patches are applied to the shared UNet)
+        with pipeline_lock:
+            # Phase 3: Handle multiple LoRA configs OR single brand_id (backward compatibility)
+            lora_loaded = False
+            style_tokens = []
         
-        if request.lora_configs and len(request.lora_configs) > 0:
-            # Phase 3: Multiple LoRA support
-            try:
-                logger.info(f"[IMAGE-GEN] Loading {len(request.lora_configs)} LoRAs for composition...")
-                lora_configs_list = [{"brand_id": cfg.brand_id, "weight": cfg.weight, "type": cfg.type} for cfg in request.lora_configs]
-                pipe = load_multiple_lora_weights(pipe, lora_configs_list)
-                lora_loaded = True
-                logger.info(f"[IMAGE-GEN] Successfully loaded {len(request.lora_configs)} LoRAs")
-            except Exception as e:
-                logger.warning(f"[IMAGE-GEN] Failed to load multiple LoRAs: {str(e)}")
-        else:
-            # Phase 1 & 2: Single LoRA support (backward compatible)
-            final_brand_id = request.brand_id
-            if not final_brand_id and request.brand_data is not None:
+            if request.lora_configs and len(request.lora_configs) > 0:
+                # Phase 3: Multiple LoRA support
                 try:
-                    final_brand_id = get_brand_id_from_data(request.brand_data)
-                    if final_brand_id:
-                        logger.info(f"  Brand ID extracted from brand_data: {final_brand_id}")
+                    lora_configs_list = [{"brand_id": cfg.brand_id, "weight": cfg.weight, "type": cfg.type, "version": cfg.version} for cfg in request.lora_configs]
+                    if request.style_mode == StyleMode.EMBEDDING:
+                        lora_configs_list, style_tokens = use_style_embeddings(lora_configs_list)
+                    if lora_configs_list:
+                        logger.info(f"[IMAGE-GEN] Loading {len(lora_configs_list)} LoRAs for composition...")
+                        pipe = load_multiple_lora_weights(pipe, lora_configs_list)
+                        lora_loaded = True
+                        logger.info(f"[IMAGE-GEN] Successfully loaded {len(lora_configs_list)} LoRAs")
                 except Exception as e:
-                    logger.warning(f"[IMAGE-GEN] Failed to extract brand_id from brand_data: {str(e)}")
+                    logger.warning(f"[IMAGE-GEN] Failed to load multiple LoRAs: {str(e)}")
+            else:
+                # Phase 1 & 2: Single LoRA support (backward compatible)
+                final_brand_id = request.brand_id
+                if not final_brand_id and request.brand_data is not None:
+                    try:
+                        final_brand_id = get_brand_id_from_data(request.brand_data)
+                        if final_brand_id:
+                            logger.info(f"  Brand ID extracted from brand_data: {final_brand_id}")
+                    except Exception as e:
+                        logger.warning(f"[IMAGE-GEN] Failed to extract brand_id from brand_data: {str(e)}")
             
-            # Save brand metadata if brand_data is provided
-            if request.brand_data is not None:
-                try:
-                    # Use extracted or provided brand_id
-                    save_brand_id = final_brand_id or get_brand_id_from_data(request.brand_data)
-                    if save_brand_id:
-                        save_brand_metadata(save_brand_id, request.brand_data)
-                except Exception as e:
-                    logger.warning(f"[IMAGE-GEN] Failed to save brand metadata (non-critical): {str(e)}")
+                # Save brand metadata if brand_data is provided
+                if request.brand_data is not None:
+                    try:
+                        # Use extracted or provided brand_id
+                        save_brand_id = final_brand_id or get_brand_id_from_data(request.brand_data)
+                        if save_brand_id:
+                            save_brand_metadata(save_brand_id, request.brand_data)
+                    except Exception as e:
+                        logger.warning(f"[IMAGE-GEN] Failed to save brand metadata (non-critical): {str(e)}")
             
-            if final_brand_id:
-                logger.info(f"  Brand ID: {final_brand_id} (LoRA weight: {request.lora_weights})")
+                if final_brand_id:
+                    logger.info(f"  Brand ID: {final_brand_id} (LoRA weight: {request.lora_weights})")
             
-            # Load single LoRA if needed
-            if final_brand_id:
-                try:
-                    # Normalize brand_id for filesystem
-                    normalized_brand_id = normalize_brand_id(final_brand_id)
-                    # Load LoRA (modifies pipeline in place, returns it)
-                    pipe = load_lora_weights(pipe, normalized_brand_id, request.lora_weights)
-                    lora_loaded = True
-                except Exception as e:
-                    logger.warning(f"[IMAGE-GEN] Failed to load LoRA, continuing with base model: {str(e)}")
+                # Load single LoRA if needed
+                if final_brand_id:
+                    try:
+                        # Normalize brand_id for filesystem
+                        normalized_brand_id = normalize_brand_id(final_brand_id)
+                        token = get_style_embedding_token(pipe, normalized_brand_id) if request.style_mode == StyleMode.EMBEDDING else None
+                        if token:
+                            # Resident style token: no adapter swap needed
+                            style_tokens.append(token)
+                        else:
+                            # Load LoRA (modifies pipeline in place, returns it)
+                            pipe = load_lora_weights(pipe, normalized_brand_id, request.lora_weights)
+                            lora_loaded = True
+                    except Exception as e:
+                        logger.warning(f"[IMAGE-GEN] Failed to load LoRA, continuing with base model: {str(e)}")
         
-        # Step 5.2 & 5.3: Generate image with Stable Diffusion
-        if pipe is None:
-            logger.warning("[IMAGE-GEN] Model not loaded, using placeholder")
-            # Fallback to placeholder if model failed to load
-            generated_image = create_placeholder_image(request.width, request.height)
-            return GenerateResponse(
-                success=True,
-                image_base64=image_to_base64(generated_image),
-                image_url=None,
-                message="Model not loaded - placeholder image (check logs)",
-                mock=True,
-                device=device
-            )
+            # Step 5.2 & 5.3: Generate image with Stable Diffusion
+            if pipe is None:
+                logger.warning("[IMAGE-GEN] Model not loaded, using placeholder")
+                # Fallback to placeholder if model failed to load
+                generated_image = create_placeholder_image(request.width, request.height)
+                return GenerateResponse(
+                    success=True,
+                    image_base64=image_to_base64(generated_image),
+                    image_url=None,
+                    message="Model not loaded - placeholder image (check logs)",
+                    mock=True,
+                    device=device
+                )
         
-        logger.info(f"[IMAGE-GEN] Generating image on {device}...")
+            logger.info(f"[IMAGE-GEN] Generating image on {device}...")
         
-        # Generate image with Stable Diffusion
-        try:
-            with torch.no_grad():  # Disable gradient computation for inference
-                # Enhance prompt with brand style keywords if LoRA is loaded
-                enhanced_prompt = request.prompt
-                if lora_loaded and final_brand_id:
-                    # Add brand style trigger to prompt for better LoRA activation
-                    normalized_id = normalize_brand_id(final_brand_id)
-                    # Add brand style keyword (e.g., "apple_style") to prompt
-                    if f"{normalized_id}_style" not in enhanced_prompt.lower():
-                        enhanced_prompt = f"{enhanced_prompt}, {normalized_id}_style"
-                
-                # Enhanced negative prompt for better quality
-                enhanced_negative = request.negative_prompt or ""
-                if not enhanced_negative or len(enhanced_negative) < 50:
-                    # Add comprehensive negative prompts if not provided
-                    default_negatives = "blurry, low quality, distorted, text, letters, words, typography, watermark, ugly, amateur, cluttered, busy background, low resolution, oversaturated, poorly lit, bad composition"
-                    enhanced_negative = enhanced_negative + (", " + default_negatives if enhanced_negative else default_negatives)
-                
-                result = pipe(
-                    prompt=enhanced_prompt,
-                    negative_prompt=enhanced_negative,
-                    width=adjusted_width,
-                    height=adjusted_height,
-                    num_inference_steps=request.num_inference_steps,
-                    guidance_scale=8.5,  # Higher guidance for stronger prompt adherence (increased from 7.5)
-                )
-        finally:
-            # Unload LoRA after generation to return to base model state
-            # This ensures the base pipeline remains clean for next request
-            if lora_loaded:
-                try:
-                    # Unload LoRA (modifies pipeline in place)
-                    unload_lora_weights(pipe)
-                except Exception as e:
-                    logger.warning(f"[IMAGE-GEN] Error unloading LoRA (non-critical): {str(e)}")
+            # Generate image with Stable Diffusion
+            try:
+                with torch.no_grad():  # Disable gradient computation for inference
+                    # Enhance prompts with brand style keywords if LoRA is loaded (same as the async path)
+                    request_loras = get_request_loras(request)
+                    enhanced_prompt, enhanced_negative = enhance_prompts(
+                        request.prompt, request.negative_prompt,
+                        request_loras[0][0] if lora_loaded and request_loras else None, style_tokens
+                    )
+                    
+                    generators, seeds = make_generators(request.seed, request.num_images)
+                    cfg_fraction = get_cfg_truncation(request, request_loras[0][0] if request_loras else None)
+                    step_callbacks = get_step_callbacks(cfg_fraction, get_early_stop_threshold(request))
+                    job_pipe = get_job_pipeline(request.scheduler, compiled=can_use_compiled_unet(request, lora_loaded))
+                    with sampling_context(request.preset, get_deep_cache_interval(request)):
+                        result = job_pipe(
+                            **get_prompt_kwargs(enhanced_prompt, enhanced_negative),
+                            width=adjusted_width,
+                            height=adjusted_height,
+                            num_inference_steps=request.num_inference_steps,
+                            guidance_scale=get_guidance_scale(request.scheduler),
+                            num_images_per_prompt=request.num_images,
+                            generator=generators,
+                            **step_callbacks.pipe_kwargs(),
+                        )
+            finally:
+                # Unload LoRA after generation to return to base model state
+                # This ensures the base pipeline remains clean for next request
+                if lora_loaded:
+                    try:
+                        # Unload LoRA (modifies pipeline in place)
+                        unload_lora_weights(pipe)
+                    except Exception as e:
+                        logger.warning(f"[IMAGE-GEN] Error unloading LoRA (non-critical): {str(e)}")
         
-        # Extract the generated image
-        generated_image = result.images[0]
+        steps_used = step_callbacks.steps_used or request.num_inference_steps
+        record_steps_used(get_early_stop_threshold(request), request.num_inference_steps, steps_used)
         
-        # Resize to requested dimensions if they were adjusted
-        if device == "cpu" and (adjusted_width != request.width or adjusted_height != request.height):
+        # Resize to requested dimensions if they were adjusted, and convert to base64
+        if (adjusted_width, adjusted_height) != (request.width, request.height):
             logger.info(f"[IMAGE-GEN] Upscaling image from {adjusted_width}x{adjusted_height} to {request.width}x{request.height}")
-            generated_image = generated_image.resize((request.width, request.height), Image.Resampling.LANCZOS)
-        
-        logger.info(f"[IMAGE-GEN] Image generated successfully ({generated_image.width}x{generated_image.height})")
+        images_base64 = encode_output_images(result.images, request.width, request.height)
         
-        # Convert to base64
-        image_base64 = image_to_base64(generated_image)
+        logger.info(f"[IMAGE-GEN] {len(images_base64)} image(s) generated successfully ({request.width}x{request.height}, seeds {seeds})")
         
         return GenerateResponse(
             success=True,
-            image_base64=image_base64,
+            image_base64=images_base64[0],
             image_url=None,  # Will be used when uploading to storage in Phase 7
-            message="Image generated successfully",
+            images_base64=images_base64 if len(images_base64) > 1 else None,
+            seeds=seeds,
+            steps_used=steps_used,
+            preset=get_speed_preset(request.preset) if request.preset else None,
+            scheduler=request.scheduler,
+            message="Image generated successfully" if len(images_base64) == 1 else f"Generated {len(images_base64)} variations",
             mock=False,
             device=device
         )
@@ -0,0 +1,175 @@
+"""
+Mixed-Adapter Batching Module
+Runs one batched pipeline call where every sample uses its own LoRA adapter and weight
+
+set_adapters() activates the same adapters for the whole batch, so requests
+for different brands normally need separate denoising loops. While a
+MixedLoRABatch is active, every PEFT LoRA layer of the UNet and text encoder
+computes base_layer(x) plus a per-sample low-rank update instead
+(Punica/S-LoRA style):
+
+- Linear layers gather each row's A/B matrices from per-layer stacks of all
+  adapters in the batch (rank zero-padded, scaling folded into B) and apply
+  them with two batched matmuls, so the cost doesn't grow with the number of
+  distinct adapters.
+- Conv layers (and anything else) run each adapter's lora_A/lora_B on the rows
+  that use it and scatter the result back.
+
+All adapters must already be resident (lora_manager.load_lora_adapter).
+The pipeline must not be used by another job while a batch is active
+(main.py holds pipeline_lock around every generation).
+"""
+
+import logging
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+from diffusers import StableDiffusionPipeline
+
+logger = logging.getLogger(__name__)
+
+# Per-sample adapter: (adapter name, weight), or None for the base model
+SampleAdapter = Optional[Tuple[str, float]]
+
+
+def _is_lora_layer(module: nn.Module) -> bool:
+    """True for PEFT LoRA layers (a base layer wrapped with lora_A/lora_B)"""
+    return hasattr(module, "base_layer") and isinstance(getattr(module, "lora_A", None), nn.ModuleDict)
+
+
+class MixedLoRABatch:
+    """
+    Context manager that makes a pipeline apply a different adapter to each sample
+
+    Sample i of the prompt list uses adapters[i]. Classifier-free guidance runs
+    the UNet on [uncond; cond], so a forward pass over k * len(adapters) rows
+    maps row j to sample j % len(adapters). num_images_per_prompt must be 1.
+
+    Usage:
+        with MixedLoRABatch(pipe, [("apple_adapter", 0.8), None, ("nike_adapter", 0.6)]):
+            images = pipe(prompt=[p1, p2, p3], ...).images
+    """
+
+    def __init__(self, pipe: StableDiffusionPipeline, adapters: List[SampleAdapter]):
+        self.pipe = pipe
+        self.adapters = list(adapters)
+        # Slot 0 is "no adapter" (zero update); batch adapters take slots 1..n
+        self.adapter_names = sorted({adapter[0] for adapter in self.adapters if adapter})
+        slot_of = {name: slot for slot, name in enumerate(self.adapter_names, start=1)}
+        self._sample_slots = [slot_of[adapter[0]] if adapter else 0 for adapter in self.adapters]
+        self._sample_scales = [float(adapter[1]) if adapter else 0.0 for adapter in self.adapters]
+        self._patched: List[nn.Module] = []
+        # id(layer) -> (A stack [n+1, r, in], B stack [n+1, out, r]) or None if no batch adapter targets it
+        self._stacks: Dict[int, Optional[Tuple[torch.Tensor, torch.Tensor]]] = {}
+        # (rows, device) -> (slot per row, weight per row, {slot: row indices})
+        self._layouts: Dict[Tuple[int, Any], Tuple[torch.Tensor, torch.Tensor, Dict[int, torch.Tensor]]] = {}
+
+    def _lora_layers(self) -> List[nn.Module]:
+        layers = []
+        for component in (getattr(self.pipe, "unet", None), getattr(self.pipe, "text_encoder", None)):
+            if component is not None:
+                layers.extend(module for module in component.modules() if _is_lora_layer(module))
+        return layers
+
+    def __enter__(self) -> "MixedLoRABatch":
+        layers = self._lora_layers()
+        for module in layers:
+            if getattr(module, "merged", False):
+                raise ValueError("Mixed-adapter batches need unmerged adapters (an adapter is fused into the base weights)")
+            use_dora = getattr(module, "use_dora", {})
+            if any(use_dora.get(name) for name in self.adapter_names):
+                raise ValueError("Mixed-adapter batches don't support DoRA adapters")
+
+        if self.adapter_names:
+            # Reset PEFT's scaling to alpha/rank (weight 1.0); per-sample weights are applied per row
+            self.pipe.set_adapters(self.adapter_names, adapter_weights=[1.0] * len(self.adapter_names))
+        for module in layers:
+            module.forward = partial(self._forward, module)
+            self._patched.append(module)
+        logger.info(f"[MIXED-LORA] {len(self.adapters)} samples, {len(self.adapter_names)} adapters, {len(layers)} LoRA layers")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for module in self._patched:
+            # Drop the instance attribute so the class forward is used again
+            del module.forward
+        self._patched.clear()
+        self._stacks.clear()
+        self._layouts.clear()
+        return False
+
+    def _get_layout(self, rows: int, device) -> Tuple[torch.Tensor, torch.Tensor, Dict[int, torch.Tensor]]:
+        """Per-row adapter slots and weights for a forward pass over `rows` rows"""
+        key = (rows, device)
+        layout = self._layouts.get(key)
+        if layout is None:
+            samples = len(self.adapters)
+            if rows % samples != 0:
+                raise ValueError(f"Batch of {rows} rows doesn't match {samples} mixed-adapter samples")
+            repeat = rows // samples
+            slots = torch.tensor(self._sample_slots * repeat, device=device)
+            scales = torch.tensor(self._sample_scales * repeat, device=device)
+            groups = {
+                slot: torch.nonzero(slots == slot).flatten()
+                for slot in set(self._sample_slots) if slot != 0
+            }
+            layout = (slots, scales, groups)
+            self._layouts[key] = layout
+        return layout
+
+    def _get_stacks(self, module: nn.Module) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """Stacked A/B matrices of the batch adapters for one Linear LoRA layer"""
+        key = id(module)
+        if key in self._stacks:
+            return self._stacks[key]
+
+        present = [(slot, name) for slot, name in enumerate(self.adapter_names, start=1) if name in module.lora_A]
+        stacks = None
+        if present:
+            first_a = module.lora_A[present[0][1]].weight
+            in_features = first_a.shape[1]
+            out_features = module.lora_B[present[0][1]].weight.shape[0]
+            rank = max(module.lora_A[name].weight.shape[0] for _, name in present)
+            slots = len(self.adapter_names) + 1
+            a_stack = torch.zeros(slots, rank, in_features, dtype=first_a.dtype, device=first_a.device)
+            b_stack = torch.zeros(slots, out_features, rank, dtype=first_a.dtype, device=first_a.device)
+            for slot, name in present:
+                a = module.lora_A[name].weight
+                b = module.lora_B[name].weight * module.scaling[name]
+                a_stack[slot, :a.shape[0]] = a
+                b_stack[slot, :, :b.shape[1]] = b
+            stacks = (a_stack, b_stack)
+        self._stacks[key] = stacks
+        return stacks
+
+    def _forward(self, module: nn.Module, x: torch.Tensor, *args, **kwargs) -> torch.Tensor:
+        """Replacement forward of a LoRA layer: base output plus each row's own adapter update"""
+        result = module.base_layer(x, *args, **kwargs)
+        slots, scales, groups = self._get_layout(x.shape[0], x.device)
+
+        if isinstance(module.base_layer, nn.Linear):
+            stacks = self._get_stacks(module)
+            if stacks is None:
+                return result
+            a_stack, b_stack = stacks
+            rows = x.shape[0]
+            x_3d = x.reshape(rows, -1, x.shape[-1]).to(a_stack.dtype)
+            # Gathered low-rank update: [rows, tokens, in] @ [rows, in, r] @ [rows, r, out]
+            hidden = torch.bmm(x_3d, a_stack[slots].transpose(1, 2))
+            delta = torch.bmm(hidden, b_stack[slots].transpose(1, 2)) * scales.to(a_stack.dtype).view(rows, 1, 1)
+            return result + delta.reshape(result.shape).to(result.dtype)
+
+        # Conv and other layers: run each adapter on the rows that use it
+        for slot, row_indices in groups.items():
+            name = self.adapter_names[slot - 1]
+            if name not in module.lora_A:
+                continue
+            lora_A = module.lora_A[name]
+            lora_B = module.lora_B[name]
+            rows_x = x.index_select(0, row_indices).to(lora_A.weight.dtype)
+            delta = lora_B(lora_A(rows_x)) * module.scaling[name]
+            delta = delta * scales.index_select(0, row_indices).to(delta.dtype).view(-1, *([1] * (delta.dim() - 1)))
+            result = result.index_add(0, row_indices, delta.to(result.dtype))
+        return result
@@ -0,0 +1,167 @@
+"""
+Speed Presets Module
+Server-side bundles of sampling settings that callers pick by name
+
+A preset sets the step count, the scheduler, an optional token merging (ToMe)
+ratio and whether attention slicing stays on, so clients choose between
+"draft", "standard" and "final" instead of tuning raw step counts. The
+built-in presets can be
+overridden and extended with a JSON file (SPEED_PRESETS_FILE) mapping preset
+names to settings, e.g.
+
+    {"draft": {"num_inference_steps": 10, "tome_ratio": 0.6},
+     "poster": {"num_inference_steps": 40, "scheduler": "dpmpp_2m_karras"}}
+
+Settings missing from a file entry keep their built-in value (or the
+"standard" preset's for new names).
+"""
+
+import copy
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from diffusers import DiffusionPipeline
+
+from schedulers import SCHEDULERS
+
+logger = logging.getLogger(__name__)
+
+SPEED_PRESETS_FILE = os.getenv("SPEED_PRESETS_FILE", "")
+
+DEFAULT_SPEED_PRESETS: Dict[str, Dict[str, Any]] = {
+    # Fast previews: few steps of a solver that converges quickly, ToMe on
+    # (merges ~half the redundant tokens in self-attention), attention slicing
+    # off (slicing trades speed for memory)
+    "draft": {
+        "num_inference_steps": 12,
+        "scheduler": "unipc",
+        "tome_ratio": 0.5,
+        "attention_slicing": False,
+    },
+    "standard": {
+        "num_inference_steps": 25,
+        "scheduler": "dpmpp_2m",
+        "tome_ratio": 0.0,
+        "attention_slicing": True,
+    },
+    "final": {
+        "num_inference_steps": 50,
+        "scheduler": "dpmpp_2m_karras",
+        "tome_ratio": 0.0,
+        "attention_slicing": True,
+    },
+}
+
+
+def _validate_preset(name: str, preset: Dict[str, Any]):
+    steps = preset.get("num_inference_steps")
+    if not isinstance(steps, int) or not 1 <= steps <= 100:
+        raise ValueError(f"Preset {name}: num_inference_steps must be an integer between 1 and 100")
+    if preset.get("scheduler") not in SCHEDULERS:
+        raise ValueError(f"Preset {name}: unknown scheduler {preset.get('scheduler')!r} (available: {', '.join(SCHEDULERS)})")
+    if not 0.0 <= float(preset.get("tome_ratio", 0.0)) < 1.0:
+        raise ValueError(f"Preset {name}: tome_ratio must be between 0.0 and 1.0")
+
+
+def load_speed_presets(path: str = SPEED_PRESETS_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Built-in presets, overridden and extended by a JSON file if one is given
+
+    Invalid file entries are skipped with a warning; a missing or unreadable
+    file leaves the built-in presets.
+    """
+    presets = copy.deepcopy(DEFAULT_SPEED_PRESETS)
+    if not path:
+        return presets
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"[PRESETS] Failed to read {path}, using built-in presets: {str(e)}")
+        return presets
+
+    for name, settings in overrides.items():
+        if not isinstance(settings, dict):
+            logger.warning(f"[PRESETS] Skipping preset {name}: settings must be an object")
+            continue
+        preset = dict(presets.get(name, DEFAULT_SPEED_PRESETS["standard"]), **settings)
+        try:
+            _validate_preset(name, preset)
+        except ValueError as e:
+            logger.warning(f"[PRESETS] Skipping {str(e)}")
+            continue
+        presets[name] = preset
+    logger.info(f"[PRESETS] Loaded presets from {path}: {', '.join(presets)}")
+    return presets
+
+
+SPEED_PRESETS = load_speed_presets()
+
+
+def get_speed_preset(name: str) -> Dict[str, Any]:
+    """
+    Settings of a preset, including its name
+
+    Raises:
+        ValueError: If there is no preset with that name
+    """
+    preset = SPEED_PRESETS.get(name)
+    if preset is None:
+        raise ValueError(f"Unknown preset {name!r} (available: {', '.join(SPEED_PRESETS)})")
+    return {"name": name, **preset}
+
+
+class SpeedPreset:
+    """
+    Context manager that applies a preset's ToMe and attention settings to a pipeline
+
+    Everything is restored on exit. The preset's step count and scheduler are
+    request settings (a per-job scheduler from schedulers.job_pipeline()).
+    ToMe needs the optional tomesd package; without it the ratio is ignored.
+    The pipeline must not be used by another job while the preset is active:
+    ToMe and the attention processors are set on the shared UNet (main.py
+    applies presets under pipeline_lock).
+
+    Usage:
+        with SpeedPreset(pipe, get_speed_preset("draft")):
+            images = job_pipe(prompt, num_inference_steps=12).images
+    """
+
+    def __init__(self, pipe: DiffusionPipeline, preset: Optional[Dict[str, Any]]):
+        self.pipe = pipe
+        self.preset = preset or {}
+        self._tome_applied = False
+        self._attn_processors = None
+
+    def _attention_slicing_enabled(self) -> bool:
+        processors = self.pipe.unet.attn_processors
+        return any(type(p).__name__ == "SlicedAttnProcessor" for p in processors.values())
+
+    def __enter__(self) -> "SpeedPreset":
+        tome_ratio = float(self.preset.get("tome_ratio", 0.0))
+        if tome_ratio > 0.0:
+            try:
+                import tomesd
+                tomesd.apply_patch(self.pipe, ratio=tome_ratio)
+                self._tome_applied = True
+            except ImportError:
+                logger.warning("[PRESETS] tomesd not installed, running without token merging")
+
+        # attention_slicing=False turns the startup slicing off for this call;
+        # True keeps the startup attention setup (slicing, xformers) as is
+        if self.preset.get("attention_slicing") is False and self._attention_slicing_enabled():
+            self._attn_processors = self.pipe.unet.attn_processors
+            self.pipe.disable_attention_slicing()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._attn_processors is not None:
+            self.pipe.unet.set_attn_processor(self._attn_processors)
+            self._attn_processors = None
+        if self._tome_applied:
+            import tomesd
+            tomesd.remove_patch(self.pipe)
+            self._tome_applied = False
+        return False
@@ -0,0 +1,93 @@
+"""
+Prompt Embedding Cache Module
+LRU cache of text encoder outputs, keyed by text, text encoder state and model
+
+Nearly every request carries the same long default negative prompt, and many
+repeat their positive prompt, yet each one ran the CLIP text encoder twice.
+Cached embeddings are passed to the pipeline as prompt_embeds /
+negative_prompt_embeds, which skips the encoder entirely.
+
+The text encoder state (lora_manager.get_text_encoder_state) is part of the
+key, because a LoRA that targets the text encoder or a reloaded style
+embedding changes the output for the same text. UNet-only LoRAs share entries
+with the base model.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Tuple
+
+import torch
+from diffusers import StableDiffusionPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class PromptEmbeddingCache:
+    """Thread-safe LRU of prompt embeddings ([1, tokens, dim] tensors on the pipeline's device)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable, str], torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _encode(self, pipe: StableDiffusionPipeline, text: str) -> torch.Tensor:
+        device = getattr(pipe, "_execution_device", pipe.device)
+        with torch.no_grad():
+            prompt_embeds, _ = pipe.encode_prompt(
+                text, device, num_images_per_prompt=1, do_classifier_free_guidance=False
+            )
+        return prompt_embeds
+
+    def get(self, pipe: StableDiffusionPipeline, text: str, state: Hashable, model: str) -> torch.Tensor:
+        """
+        Get the embeddings of a prompt, encoding it on a miss
+
+        Args:
+            pipe: The Stable Diffusion pipeline
+            text: Prompt text (after enhancement)
+            state: Text encoder state from get_text_encoder_state()
+            model: Base model name
+
+        Returns:
+            Prompt embeddings, shared between callers: don't modify in place
+        """
+        key = (model, state, text)
+        with self._lock:
+            embeds = self._entries.get(key)
+            if embeds is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return embeds
+            self._stats["misses"] += 1
+
+        # Encode outside the lock; a concurrent miss on the same key just encodes twice
+        embeds = self._encode(pipe, text)
+        with self._lock:
+            self._entries[key] = embeds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return embeds
+
+    def warm(self, pipe: StableDiffusionPipeline, texts: Iterable[str], state: Hashable, model: str):
+        """Encode prompts ahead of the first request (e.g. the default negative prompts at startup)"""
+        for text in texts:
+            self.get(pipe, text, state, model)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups > 0 else 0.0,
+            }
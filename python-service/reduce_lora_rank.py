@@ -0,0 +1,272 @@
+"""
+LoRA Rank Reduction Tool
+
+Shrinks an adapter to a lower rank by truncating the SVD of each layer's
+delta (B @ A * alpha / rank). Style adapters trained at rank 64-128 usually
+keep nearly all of their energy in a handful of singular values, so most of
+the memory and per-step LoRA compute can go with little visible change.
+
+The factorization never builds the full delta matrix from scratch: with
+B = Qb Rb and A^T = Qa Ra (QR), B @ A = Qb (Rb Ra^T) Qa^T, so only an
+r x r SVD is needed per layer.
+
+Key names and dtypes of the input are kept (kohya, diffusers or canonical);
+the alpha/rank scale is folded into the new up/B matrices and any .alpha keys
+are rewritten to the new rank, so the effective scale stays the same.
+
+Usage:
+    python reduce_lora_rank.py --lora-file loras/apple/style.safetensors --rank 16
+    python reduce_lora_rank.py --lora-file big.safetensors --energy 0.99 --max-rank 32 --output small.safetensors
+    python reduce_lora_rank.py --lora-file big.safetensors --rank 8 --csv report.csv
+
+Then deploy the result with deploy_lora.py as usual.
+"""
+
+import argparse
+import csv
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+from lora_inspect import split_lora_key
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _truncation_rank(singular_values: torch.Tensor, rank: Optional[int], energy: Optional[float], max_rank: Optional[int]) -> int:
+    """Number of singular values to keep for a fixed rank or an energy threshold"""
+    if rank is not None:
+        keep = rank
+    else:
+        cumulative = torch.cumsum(singular_values ** 2, dim=0)
+        total = cumulative[-1]
+        if total <= 0:
+            keep = 1
+        else:
+            keep = int(torch.searchsorted(cumulative / total, energy).item()) + 1
+    if max_rank is not None:
+        keep = min(keep, max_rank)
+    return max(1, min(keep, singular_values.shape[0]))
+
+
+def reduce_layer(
+    down: torch.Tensor,
+    up: torch.Tensor,
+    scale: float,
+    rank: Optional[int] = None,
+    energy: Optional[float] = None,
+    max_rank: Optional[int] = None
+) -> Tuple[torch.Tensor, torch.Tensor, Dict[str, Any]]:
+    """
+    Reduce one LoRA layer to a lower rank.
+
+    Args:
+        down: Down/A matrix, [r, in] (Linear) or [r, in, kh, kw] (Conv)
+        up: Up/B matrix, [out, r] or [out, r, 1, 1]
+        scale: alpha / rank of the layer (folded into the new up matrix)
+        rank: Target rank (exclusive with energy)
+        energy: Fraction of squared singular value mass to keep (0-1)
+        max_rank: Upper bound for the kept rank
+
+    Returns:
+        Tuple of (new down, new up, stats); stats has old_rank, new_rank,
+        rel_error (relative Frobenius error of the delta) and in/out features
+    """
+    old_rank = down.shape[0]
+    down_2d = down.reshape(old_rank, -1).float()
+    up_2d = up.reshape(up.shape[0], old_rank).float() * scale
+
+    q_up, r_up = torch.linalg.qr(up_2d)
+    q_down, r_down = torch.linalg.qr(down_2d.T)
+    u, singular_values, vh = torch.linalg.svd(r_up @ r_down.T)
+
+    new_rank = _truncation_rank(singular_values, rank, energy, max_rank)
+    sqrt_s = singular_values[:new_rank].sqrt()
+    new_up = (q_up @ u[:, :new_rank]) * sqrt_s
+    new_down = sqrt_s[:, None] * (vh[:new_rank] @ q_down.T)
+
+    total_energy = (singular_values ** 2).sum()
+    dropped_energy = (singular_values[new_rank:] ** 2).sum()
+    rel_error = (dropped_energy / total_energy).sqrt().item() if total_energy > 0 else 0.0
+
+    new_down = new_down.reshape(new_rank, *down.shape[1:]).to(down.dtype).contiguous()
+    new_up = new_up.reshape(up.shape[0], new_rank, *up.shape[2:]).to(up.dtype).contiguous()
+    stats = {
+        "old_rank": old_rank,
+        "new_rank": new_rank,
+        "rel_error": rel_error,
+        "in_features": down_2d.shape[1],
+        "out_features": up_2d.shape[0],
+    }
+    return new_down, new_up, stats
+
+
+def _layer_keys(names: List[str]) -> Dict[str, Dict[str, str]]:
+    """Group tensor names by LoRA layer: module path -> {"down", "up", "alpha"} -> tensor name"""
+    layers: Dict[str, Dict[str, str]] = {}
+    for name in names:
+        module_path, role = split_lora_key(name)
+        if role is not None:
+            layers.setdefault(module_path, {})[role] = name
+    return {module_path: keys for module_path, keys in layers.items() if "down" in keys and "up" in keys}
+
+
+def reduce_lora_file(
+    lora_file: Path,
+    output_file: Path,
+    rank: Optional[int] = None,
+    energy: Optional[float] = None,
+    max_rank: Optional[int] = None,
+    device: str = "cpu"
+) -> List[Dict[str, Any]]:
+    """
+    Write a rank-reduced copy of an adapter file.
+
+    Layers already at or below the target rank are copied unchanged.
+
+    Returns:
+        Per-layer report: layer, old/new rank, rel_error, bytes_saved and
+        flops_saved (multiply-adds x 2 per token/pixel, per denoising step)
+    """
+    with safe_open(str(lora_file), framework="pt", device=device) as f:
+        metadata = dict(f.metadata() or {})
+        tensors = {name: f.get_tensor(name) for name in f.keys()}
+
+    report = []
+    for module_path, keys in sorted(_layer_keys(list(tensors)).items()):
+        down, up = tensors[keys["down"]], tensors[keys["up"]]
+        old_rank = down.shape[0]
+        if rank is not None and old_rank <= rank:
+            continue
+        alpha = tensors[keys["alpha"]].item() if "alpha" in keys else old_rank
+        new_down, new_up, stats = reduce_layer(down, up, alpha / old_rank, rank, energy, max_rank)
+
+        tensors[keys["down"]] = new_down.cpu()
+        tensors[keys["up"]] = new_up.cpu()
+        if "alpha" in keys:
+            # Scale is folded into the new up matrix: alpha == rank means 1.0
+            tensors[keys["alpha"]] = torch.tensor(float(stats["new_rank"]), dtype=tensors[keys["alpha"]].dtype)
+
+        removed = stats["old_rank"] - stats["new_rank"]
+        params_saved = removed * (stats["in_features"] + stats["out_features"])
+        report.append({
+            "layer": module_path,
+            **stats,
+            "bytes_saved": params_saved * down.element_size(),
+            "flops_saved": 2 * params_saved,
+        })
+
+    metadata.update({
+        "format": metadata.get("format", "pt"),
+        "rank_reduced_from": str(max((r["old_rank"] for r in report), default=0)),
+        "rank_reduction": f"rank={rank}" if rank is not None else f"energy={energy}",
+    })
+    save_file({name: tensor.cpu().contiguous() for name, tensor in tensors.items()}, str(output_file), metadata=metadata)
+    return report
+
+
+def print_report(report: List[Dict[str, Any]], lora_file: Path, output_file: Path):
+    """Print per-layer and total savings"""
+    if not report:
+        logger.info("Nothing to reduce: every layer is already at or below the target rank")
+        return
+    logger.info(f"\n{'layer':<72} {'rank':>9} {'rel err':>8} {'KB saved':>9} {'MFLOP saved':>12}")
+    logger.info("=" * 114)
+    for row in report:
+        layer = row["layer"] if len(row["layer"]) <= 72 else "..." + row["layer"][-69:]
+        logger.info(
+            f"{layer:<72} {row['old_rank']:>4}→{row['new_rank']:<4} {row['rel_error']:>8.4f} "
+            f"{row['bytes_saved'] / 1024:>9.1f} {row['flops_saved'] / 1e6:>12.3f}"
+        )
+    logger.info("=" * 114)
+
+    errors = [row["rel_error"] for row in report]
+    total_bytes = sum(row["bytes_saved"] for row in report)
+    total_flops = sum(row["flops_saved"] for row in report)
+    old_size = lora_file.stat().st_size
+    new_size = output_file.stat().st_size
+    logger.info(f"Layers reduced:        {len(report)}")
+    logger.info(f"Relative error:        mean {sum(errors) / len(errors):.4f}, max {max(errors):.4f}")
+    logger.info(f"Adapter size:          {old_size / 1024 / 1024:.2f} MB → {new_size / 1024 / 1024:.2f} MB "
+                f"({total_bytes / 1024 / 1024:.2f} MB saved)")
+    logger.info(f"LoRA compute saved:    {total_flops / 1e6:.2f} MFLOP per token/pixel per step")
+    logger.info(f"✅ Wrote {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reduce the rank of a LoRA adapter by truncated SVD of each layer's delta"
+    )
+    parser.add_argument(
+        "--lora-file",
+        type=str,
+        required=True,
+        help="Path to the LoRA file (.safetensors)"
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
+        "--rank",
+        type=int,
+        help="Target rank for every layer"
+    )
+    target.add_argument(
+        "--energy",
+        type=float,
+        help="Keep the smallest per-layer rank that retains this fraction of the delta's energy (e.g. 0.99)"
+    )
+    parser.add_argument(
+        "--max-rank",
+        type=int,
+        help="Upper bound for the per-layer rank with --energy"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Output file (default: <input>_r<rank>.safetensors or <input>_e<energy>.safetensors)"
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cpu",
+        help="Device for the factorization (default: cpu)"
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        help="Optional path to write the per-layer report as CSV"
+    )
+
+    args = parser.parse_args()
+
+    lora_file = Path(args.lora_file)
+    if not lora_file.exists():
+        logger.error(f"❌ LoRA file not found: {lora_file}")
+        return 1
+    if args.rank is not None and args.rank < 1:
+        parser.error("--rank must be at least 1")
+    if args.energy is not None and not 0 < args.energy <= 1:
+        parser.error("--energy must be in (0, 1]")
+
+    suffix = f"_r{args.rank}" if args.rank is not None else f"_e{args.energy:g}"
+    output_file = Path(args.output) if args.output else lora_file.with_name(f"{lora_file.stem}{suffix}.safetensors")
+
+    report = reduce_lora_file(lora_file, output_file, args.rank, args.energy, args.max_rank, args.device)
+    print_report(report, lora_file, output_file)
+
+    if args.csv and report:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(report[0].keys()))
+            writer.writeheader()
+            writer.writerows(report)
+        logger.info(f"✅ Wrote {len(report)} rows to {args.csv}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
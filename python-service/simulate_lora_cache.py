@@ -0,0 +1,214 @@
+"""
+LoRA Cache Simulator
+
+Replays a recorded LoRA access trace through the adapter cache eviction
+policies (lora_cache_policies.py) offline, to size LORA_CACHE_MAX_SIZE and pick
+LORA_CACHE_POLICY from data instead of guesses.
+
+Record a trace by starting the service with LORA_ACCESS_TRACE_FILE set; each
+line is {"timestamp", "brand_id", "weight", "size_bytes"}. CSV files with the
+same column names work too.
+
+Usage:
+    python simulate_lora_cache.py --trace lora_trace.jsonl
+    python simulate_lora_cache.py --trace lora_trace.jsonl --policies lru,wtinylfu --capacities 2,4,8,16
+    python simulate_lora_cache.py --trace lora_trace.jsonl --csv curve.csv --disk-mb-per-sec 150
+"""
+
+import argparse
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from lora_cache_policies import POLICIES, create_policy
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITIES = [1, 2, 3, 5, 8, 13, 21]
+
+
+def load_trace(trace_file: Path) -> List[Dict[str, Any]]:
+    """
+    Load an access trace from JSON lines or CSV, sorted by timestamp.
+
+    Args:
+        trace_file: Path to the trace (.jsonl/.json or .csv)
+
+    Returns:
+        List of accesses with timestamp, brand_id, weight and size_bytes
+    """
+    accesses = []
+    with open(trace_file, 'r', encoding='utf-8') as f:
+        if trace_file.suffix.lower() == '.csv':
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for row in rows:
+        accesses.append({
+            "timestamp": float(row.get("timestamp") or 0),
+            "brand_id": str(row["brand_id"]),
+            "weight": float(row.get("weight") or 0.8),
+            "size_bytes": int(float(row.get("size_bytes") or 0)),
+        })
+
+    accesses.sort(key=lambda access: access["timestamp"])
+    return accesses
+
+
+def simulate(
+    accesses: List[Dict[str, Any]],
+    policy_name: str,
+    capacity: int,
+    disk_mb_per_sec: float,
+    load_overhead_ms: float
+) -> Dict[str, Any]:
+    """
+    Replay a trace through one policy at one capacity.
+
+    Keys are (brand_id, weight) like lora_manager's cache. As in the service,
+    a miss only reads the adapter from disk when no weight variant of the
+    brand is still cached (the adapter itself is resident then).
+
+    Args:
+        accesses: Trace from load_trace()
+        policy_name: Eviction policy name
+        capacity: Cache capacity (LORA_CACHE_MAX_SIZE)
+        disk_mb_per_sec: Assumed adapter read throughput
+        load_overhead_ms: Assumed fixed cost per adapter load (parse + inject)
+
+    Returns:
+        Dictionary with hit rate, disk loads, bytes loaded and estimated load time
+    """
+    policy = create_policy(policy_name, capacity)
+    hits = 0
+    disk_loads = 0
+    bytes_loaded = 0
+
+    for access in accesses:
+        key: Tuple[str, float] = (access["brand_id"], access["weight"])
+        if policy.access(key):
+            hits += 1
+            continue
+
+        resident_brands = {cached_key[0] for cached_key in policy.keys()}
+        if key[0] not in resident_brands:
+            disk_loads += 1
+            bytes_loaded += access["size_bytes"]
+        policy.admit(key)
+
+    total = len(accesses)
+    load_time = bytes_loaded / (disk_mb_per_sec * 1024 * 1024) + disk_loads * load_overhead_ms / 1000
+    return {
+        "policy": policy_name,
+        "capacity": capacity,
+        "requests": total,
+        "hits": hits,
+        "hit_rate": hits / total if total else 0.0,
+        "disk_loads": disk_loads,
+        "bytes_loaded": bytes_loaded,
+        "est_load_time_s": load_time,
+    }
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print the capacity/hit-rate curve per policy"""
+    logger.info(f"\n{'policy':<10} {'capacity':>8} {'hit rate':>9} {'disk loads':>11} {'MB loaded':>10} {'load time':>10}")
+    logger.info("=" * 80)
+    current_policy = None
+    for result in results:
+        if current_policy and result["policy"] != current_policy:
+            logger.info("-" * 80)
+        current_policy = result["policy"]
+        bar = "#" * int(round(result["hit_rate"] * 20))
+        logger.info(
+            f"{result['policy']:<10} {result['capacity']:>8} {result['hit_rate']:>8.1%} "
+            f"{result['disk_loads']:>11} {result['bytes_loaded'] / (1024 * 1024):>10.1f} "
+            f"{result['est_load_time_s']:>9.1f}s  {bar}"
+        )
+    logger.info("=" * 80)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded LoRA access trace through the adapter cache policies"
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        required=True,
+        help="Path to the access trace (JSON lines from LORA_ACCESS_TRACE_FILE, or CSV)"
+    )
+    parser.add_argument(
+        "--policies",
+        type=str,
+        default=",".join(POLICIES),
+        help=f"Comma-separated policies to compare (default: {','.join(POLICIES)})"
+    )
+    parser.add_argument(
+        "--capacities",
+        type=str,
+        default=",".join(str(c) for c in DEFAULT_CAPACITIES),
+        help="Comma-separated cache capacities to simulate (default: 1,2,3,5,8,13,21)"
+    )
+    parser.add_argument(
+        "--disk-mb-per-sec",
+        type=float,
+        default=200.0,
+        help="Assumed adapter read throughput in MB/s (default: 200)"
+    )
+    parser.add_argument(
+        "--load-overhead-ms",
+        type=float,
+        default=500.0,
+        help="Assumed fixed cost per adapter load in ms (default: 500)"
+    )
+    parser.add_argument(
+        "--csv",
+        type=str,
+        help="Optional path to write the results as CSV"
+    )
+
+    args = parser.parse_args()
+
+    trace_file = Path(args.trace)
+    if not trace_file.exists():
+        logger.error(f"❌ Trace file not found: {trace_file}")
+        return 1
+
+    accesses = load_trace(trace_file)
+    if not accesses:
+        logger.error(f"❌ Trace file is empty: {trace_file}")
+        return 1
+
+    brands = {access["brand_id"] for access in accesses}
+    logger.info(f"📋 Loaded {len(accesses)} accesses for {len(brands)} brands from {trace_file}")
+
+    policies = [p.strip() for p in args.policies.split(",") if p.strip()]
+    capacities = sorted({int(c) for c in args.capacities.split(",") if c.strip()})
+
+    results = []
+    for policy_name in policies:
+        if policy_name.lower().replace("-", "") not in POLICIES:
+            logger.error(f"❌ Unknown policy '{policy_name}'. Available: {', '.join(POLICIES)}")
+            return 1
+        for capacity in capacities:
+            results.append(simulate(accesses, policy_name, capacity, args.disk_mb_per_sec, args.load_overhead_ms))
+
+    print_report(results)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        logger.info(f"✅ Wrote {len(results)} rows to {args.csv}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,192 @@
+"""
+Denoising Step Callbacks Module
+callback_on_step_end hooks that change how the remaining denoising steps run
+
+diffusers calls callback_on_step_end(pipe, step_index, timestep, kwargs) after
+every step; the tensors named in callback_on_step_end_tensor_inputs are passed
+in kwargs, and the returned values replace them for the following steps.
+Several hooks are combined into one callback with StepCallbacks.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import torch
+from diffusers import StableDiffusionPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class CFGTruncation:
+    """
+    Apply classifier-free guidance only for the first fraction of the steps
+
+    The global layout and composition are decided in the early, high-noise
+    steps; later steps mostly refine detail, where guidance matters much less.
+    After the cutoff step the unconditional half of prompt_embeds is dropped
+    and the guidance scale set to 0, so the pipeline's do_classifier_free_guidance
+    turns false and every remaining step runs the UNet on the conditional
+    batch only (half the rows). With cfg_fraction=0.6 that saves ~40% of the
+    UNet FLOPs in the denoising loop.
+
+    Usage:
+        callback = CFGTruncation(0.6)
+        pipe(..., callback_on_step_end=callback,
+             callback_on_step_end_tensor_inputs=callback.tensor_inputs)
+    """
+
+    tensor_inputs: List[str] = ["prompt_embeds"]
+
+    def __init__(self, cfg_fraction: float):
+        if not 0.0 < cfg_fraction <= 1.0:
+            raise ValueError("cfg_fraction must be in (0, 1]")
+        self.cfg_fraction = cfg_fraction
+        # Number of steps that ran with guidance, once the cutoff was applied
+        self.cfg_steps = None
+
+    def __call__(self, pipe: StableDiffusionPipeline, step_index: int, timestep, callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        cfg_steps = max(1, round(pipe.num_timesteps * self.cfg_fraction))
+        # Called at the end of a step, so this switches from step cfg_steps onwards
+        if step_index == cfg_steps - 1 and cfg_steps < pipe.num_timesteps and pipe.do_classifier_free_guidance:
+            # prompt_embeds is [negative; positive] while guidance is on
+            callback_kwargs["prompt_embeds"] = callback_kwargs["prompt_embeds"].chunk(2)[-1]
+            pipe._guidance_scale = 0.0
+            self.cfg_steps = cfg_steps
+            logger.debug(f"[CFG] Guidance off after {cfg_steps}/{pipe.num_timesteps} steps")
+        return callback_kwargs
+
+
+class ConvergenceStop:
+    """
+    End the denoising loop once the predicted clean latent stops changing
+
+    After each step the scheduler's prediction of the final latent (x0) is
+    compared with the previous step's. Once the relative change of every
+    sample stays below `threshold` for `patience` steps in a row (and at least
+    `min_fraction` of the steps ran), the latents are replaced by that x0
+    prediction, which is where the scheduler's last step would land, and the
+    pipeline is interrupted so the remaining steps are skipped.
+
+    The x0 prediction is read from the scheduler state of DPM-Solver/UniPC
+    style multistep schedulers (model_outputs), and from the
+    pred_original_sample of step() for the others (DDIM, Euler, ...).
+    Schedulers that expose neither always run all steps.
+    """
+
+    tensor_inputs: List[str] = ["latents"]
+
+    def __init__(self, threshold: float, min_fraction: float = 0.4, patience: int = 2):
+        if threshold <= 0.0:
+            raise ValueError("threshold must be positive")
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.patience = patience
+        # Steps run by the last pipeline call, when it stopped early
+        self.steps_used: Optional[int] = None
+        self._reset()
+
+    def _reset(self):
+        self._previous: Optional[torch.Tensor] = None
+        self._converged_steps = 0
+        self._captured: Optional[torch.Tensor] = None
+        self.steps_used = None
+
+    def _capture_step(self, scheduler):
+        """Record pred_original_sample of each scheduler step (the pipeline discards it)"""
+        if "step" in scheduler.__dict__:
+            return
+        step = scheduler.step
+
+        def recording_step(*args, **kwargs):
+            output = step(*args, **kwargs)
+            self._captured = getattr(output, "pred_original_sample", None)
+            return output
+        scheduler.step = recording_step
+
+    def _release_step(self, scheduler):
+        if "step" in scheduler.__dict__:
+            # Drop the instance attribute so the class step is used again
+            del scheduler.step
+
+    def _predicted_clean_latent(self, scheduler) -> Optional[torch.Tensor]:
+        model_outputs = getattr(scheduler, "model_outputs", None)
+        config = scheduler.config
+        predicts_x0 = (
+            config.get("algorithm_type", "") in ("dpmsolver++", "sde-dpmsolver++")
+            or config.get("predict_x0", False)
+        )
+        if model_outputs and predicts_x0 and model_outputs[-1] is not None:
+            return model_outputs[-1]
+        return self._captured
+
+    def __call__(self, pipe: StableDiffusionPipeline, step_index: int, timestep, callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        scheduler = pipe.scheduler
+        if step_index == 0:
+            self._reset()
+            if not hasattr(scheduler, "model_outputs"):
+                self._capture_step(scheduler)
+        last_step = step_index >= pipe.num_timesteps - 1
+
+        predicted = self._predicted_clean_latent(scheduler)
+        if predicted is not None and not last_step:
+            predicted = predicted.detach()
+            if self._previous is not None and self._previous.shape == predicted.shape:
+                dims = tuple(range(1, predicted.dim()))
+                change = (predicted - self._previous).float().norm(dim=dims) / self._previous.float().norm(dim=dims).clamp_min(1e-6)
+                if change.max().item() < self.threshold:
+                    self._converged_steps += 1
+                else:
+                    self._converged_steps = 0
+            self._previous = predicted.clone()
+
+            if self._converged_steps >= self.patience and step_index + 1 >= pipe.num_timesteps * self.min_fraction:
+                callback_kwargs["latents"] = predicted.to(callback_kwargs["latents"].dtype)
+                pipe._interrupt = True
+                self.steps_used = step_index + 1
+                last_step = True
+                logger.info(f"[EARLY-STOP] Converged after {self.steps_used}/{pipe.num_timesteps} steps")
+
+        if last_step:
+            self._release_step(scheduler)
+        return callback_kwargs
+
+
+class StepCallbacks:
+    """
+    Several step callbacks run as one callback_on_step_end, in order
+
+    Usage:
+        callbacks = StepCallbacks([CFGTruncation(0.6), ConvergenceStop(0.01)])
+        pipe(..., **callbacks.pipe_kwargs())
+        steps = callbacks.steps_used or num_inference_steps
+    """
+
+    def __init__(self, callbacks: List[Any]):
+        self.callbacks = list(callbacks)
+
+    @property
+    def tensor_inputs(self) -> List[str]:
+        names = []
+        for callback in self.callbacks:
+            names.extend(name for name in callback.tensor_inputs if name not in names)
+        return names
+
+    @property
+    def steps_used(self) -> Optional[int]:
+        """Steps run by the last pipeline call if a callback ended it early, else None"""
+        steps = [callback.steps_used for callback in self.callbacks if getattr(callback, "steps_used", None) is not None]
+        return min(steps) if steps else None
+
+    def pipe_kwargs(self) -> Dict[str, Any]:
+        """Pipeline arguments that install the callbacks (none when there are none)"""
+        if not self.callbacks:
+            return {}
+        return {
+            "callback_on_step_end": self,
+            "callback_on_step_end_tensor_inputs": self.tensor_inputs,
+        }
+
+    def __call__(self, pipe: StableDiffusionPipeline, step_index: int, timestep, callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        for callback in self.callbacks:
+            callback_kwargs = callback(pipe, step_index, timestep, callback_kwargs)
+        return callback_kwargs